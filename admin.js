@@ -7,6 +7,7 @@ const Admin = {
     // State
     token: null,
     data: { categories: [], venues: [] },
+    version: null,
     currentVenue: null,
     currentMap: null,
     selectedLocation: null,
@@ -14,12 +15,14 @@ const Admin = {
     dragOffset: { x: 0, y: 0 },
     hasDraft: false,
     DRAFT_KEY: 'mapsDraft',
+    RESUMABLE_UPLOAD_THRESHOLD: 4 * 1024 * 1024, // Bigger map images are sent in resumable chunks
 
     // API Base URL
     apiBase: '',
 
-    // Photo requests
+    // Photo requests (the first page of pending ones, and how many are pending)
     photoRequests: [],
+    photoRequestTotal: 0,
 
     // Initialize
     init() {
@@ -241,11 +244,48 @@ const Admin = {
         return response.json();
     },
 
+    // Send a file in chunks through /api/upload/resumable. A failed chunk is
+    // retried from wherever the server says the upload got to.
+    async apiResumableUpload(file, kind) {
+        const upload = await this.api('/api/upload/resumable', 'POST', { filename: file.name, size: file.size, kind });
+        if (!upload.uploadId) return upload;
+        const base = `${this.apiBase}/api/upload/resumable/${upload.uploadId}`;
+        const headers = { 'Authorization': `Bearer ${this.token}` };
+
+        let received = upload.received;
+        let failures = 0;
+        while (received < file.size) {
+            try {
+                if (failures) {
+                    // Part of the failed chunk may have arrived; ask where to resume
+                    const status = await (await fetch(base, { headers })).json();
+                    if (status.received === undefined) return status;
+                    received = status.received;
+                }
+                const response = await fetch(`${base}?offset=${received}`, {
+                    method: 'PUT',
+                    headers,
+                    body: file.slice(received, received + upload.chunkSize)
+                });
+                const result = await response.json();
+                if (!response.ok && response.status !== 409) return result;
+                received = result.received;
+                failures = 0;
+            } catch (error) {
+                if (++failures > 5) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * failures));
+            }
+        }
+        return this.api(`/api/upload/resumable/${upload.uploadId}/finalize`, 'POST');
+    },
+
     // Data Loading
     async loadData() {
         try {
-            const response = await this.api('/api/data');
-            this.data = response;
+            // Without a version the change feed returns the whole document
+            const response = await this.api('/api/changes');
+            this.data = response.data;
+            this.version = response.version;
 
             // Ensure categories array exists
             if (!this.data.categories) {
@@ -271,6 +311,97 @@ const Admin = {
         }
     },
 
+    // Fetch only what changed since the last load or sync
+    async syncChanges() {
+        if (!this.version) {
+            return this.loadData();
+        }
+
+        const response = await this.api(`/api/changes?since=${encodeURIComponent(this.version)}`);
+        if (response.reset) {
+            this.data = response.data;
+        } else {
+            response.changes.forEach(change => this.applyChange(change));
+        }
+        this.version = response.version;
+
+        if (!this.data.categories) {
+            this.data.categories = [];
+        }
+        if (!this.data.landingPage) {
+            this.data.landingPage = { title: 'Athletics Information Hub', cards: [] };
+        }
+
+        // Entities may have been replaced; point the editor at the new objects
+        if (this.currentVenue) {
+            this.currentVenue = this.data.venues.find(v => v.id === this.currentVenue.id) || null;
+            this.currentMap = this.currentMap && this.currentVenue
+                ? this.currentVenue.maps.find(m => m.id === this.currentMap.id) || null
+                : null;
+        }
+
+        this.renderNavTree();
+        this.renderLandingPageCards();
+        this.updateVenueCategoryCheckboxes();
+    },
+
+    // Lists holding each entity kind, keyed by the parent id chain
+    entityLists(kind) {
+        const venues = this.data.venues || (this.data.venues = []);
+        switch (kind) {
+            case 'category':
+                return [[[], this.data.categories || (this.data.categories = [])]];
+            case 'venue':
+                return [[[], venues]];
+            case 'map':
+                return venues.map(v => [[v.id], v.maps || (v.maps = [])]);
+            case 'location':
+                return venues.flatMap(v => (v.maps || []).map(m => [[v.id, m.id], m.locations || (m.locations = [])]));
+            default:
+                return [];
+        }
+    },
+
+    applyChange(change) {
+        if (change.kind === 'document') {
+            this.data[change.id] = change.value;
+            return;
+        }
+
+        const lists = this.entityLists(change.kind);
+        let placed = false;
+        for (const [parents, list] of lists) {
+            const index = list.findIndex(e => e.id === change.id);
+            if (index === -1) continue;
+            if (change.op === 'upsert' && parents.join('/') === change.parents.join('/')) {
+                list[index] = change.entity;
+                placed = true;
+            } else {
+                list.splice(index, 1);
+            }
+        }
+
+        if (change.op === 'upsert' && !placed) {
+            const target = this.entityLists(change.kind).find(([parents]) => parents.join('/') === change.parents.join('/'));
+            if (target) {
+                target[1].push(change.entity);
+            }
+        }
+    },
+
+    // Save the landing page config without sending the rest of the data
+    async saveLandingPage() {
+        const response = await this.api('/api/data', 'PATCH', {
+            ops: [{ op: 'set', key: 'landingPage', value: this.data.landingPage, version: this.version }]
+        });
+        if (response.error) {
+            throw new Error(response.error);
+        }
+        // Catch up through the change feed: adopting response.version would
+        // skip changes other clients made before this save
+        await this.syncChanges();
+    },
+
     // Draft Mode Functions
     checkForDraft() {
         const draft = localStorage.getItem(this.DRAFT_KEY);
@@ -510,7 +641,7 @@ const Admin = {
         }
 
         try {
-            await this.api('/api/data', 'POST', this.data);
+            await this.saveLandingPage();
             this.saveDraft(); // Save draft after changes
             this.closeModals();
             this.renderLandingPageCards();
@@ -525,7 +656,7 @@ const Admin = {
         if (card) {
             card.visible = card.visible === false ? true : false;
             try {
-                await this.api('/api/data', 'POST', this.data);
+                await this.saveLandingPage();
                 this.saveDraft();
                 this.renderLandingPageCards();
             } catch (error) {
@@ -544,7 +675,7 @@ const Admin = {
     async deleteCard(cardId) {
         this.data.landingPage.cards = this.data.landingPage.cards.filter(c => c.id !== cardId);
         try {
-            await this.api('/api/data', 'POST', this.data);
+            await this.saveLandingPage();
             this.saveDraft();
             this.renderLandingPageCards();
             this.toast('Card deleted', 'success');
@@ -566,7 +697,7 @@ const Admin = {
         });
 
         try {
-            await this.api('/api/data', 'POST', this.data);
+            await this.saveLandingPage();
             this.saveDraft();
             this.toast('Cards reordered', 'success');
         } catch (error) {
@@ -879,36 +1010,35 @@ const Admin = {
 
         // Get current order from the list
         const listItems = document.querySelectorAll('.location-list-item');
-        const updates = [];
+        const order = [];
+        let changed = 0;
 
         listItems.forEach((item, index) => {
-            const locationId = item.dataset.locationId;
-            const location = this.currentMap.locations.find(l => l.id === locationId);
+            const location = this.currentMap.locations.find(l => l.id === item.dataset.locationId);
             if (location) {
-                const newNumber = index + 1;
-                if (location.number !== newNumber) {
-                    location.number = newNumber;
-                    updates.push({ id: locationId, number: newNumber });
-                }
+                order.push(location.id);
+                if (location.number !== index + 1) changed++;
             }
         });
 
-        if (updates.length === 0) {
+        if (changed === 0) {
             this.toast('Locations already numbered correctly', 'info');
             return;
         }
 
-        // Save all updates
+        // Reorder and renumber in one request
         try {
-            for (const update of updates) {
-                await this.api(
-                    `/api/venues/${this.currentVenue.id}/maps/${this.currentMap.id}/locations/${update.id}`,
-                    'PUT',
-                    { number: update.number }
-                );
+            const response = await this.api(
+                `/api/venues/${this.currentVenue.id}/maps/${this.currentMap.id}/locations`,
+                'PATCH',
+                { order, renumber: true }
+            );
+            if (!response.success) {
+                throw new Error(response.error);
             }
+            this.currentMap.locations = response.locations;
             this.renderMarkers();
-            this.toast(`Renumbered ${updates.length} locations`, 'success');
+            this.toast(`Renumbered ${changed} locations`, 'success');
         } catch (error) {
             this.toast('Failed to renumber locations', 'error');
         }
@@ -1271,7 +1401,9 @@ const Admin = {
         if (!file) return;
 
         try {
-            const response = await this.apiUpload('/api/upload/map', file);
+            const response = file.size > this.RESUMABLE_UPLOAD_THRESHOLD
+                ? await this.apiResumableUpload(file, 'map')
+                : await this.apiUpload('/api/upload/map', file);
             if (response.success) {
                 document.getElementById('map-image-preview').innerHTML = `<img src="${response.filename}" alt="Map image">`;
                 document.getElementById('map-image-filename').textContent = response.filename;
@@ -1324,7 +1456,7 @@ const Admin = {
             }
 
             this.closeModals();
-            await this.loadData();
+            await this.syncChanges();
             this.toast(id ? 'Category updated' : 'Category created', 'success');
         } catch (error) {
             this.toast('Failed to save category', 'error');
@@ -1341,7 +1473,7 @@ const Admin = {
     async deleteCategory(categoryId) {
         try {
             await this.api(`/api/categories/${categoryId}`, 'DELETE');
-            await this.loadData();
+            await this.syncChanges();
             this.toast('Category deleted', 'success');
             // Auto-regenerate HTML pages
             await this.generateHTML();
@@ -1420,7 +1552,7 @@ const Admin = {
             }
 
             this.closeModals();
-            await this.loadData();
+            await this.syncChanges();
             this.toast(id ? 'Venue updated' : 'Venue created', 'success');
         } catch (error) {
             this.toast('Failed to save venue', 'error');
@@ -1446,7 +1578,7 @@ const Admin = {
                 document.getElementById('map-editor').classList.add('hidden');
             }
 
-            await this.loadData();
+            await this.syncChanges();
             this.toast('Venue deleted', 'success');
             // Auto-regenerate HTML pages
             await this.generateHTML();
@@ -1508,7 +1640,7 @@ const Admin = {
             }
 
             this.closeModals();
-            await this.loadData();
+            await this.syncChanges();
 
             // Re-select current map if editing
             if (this.currentVenue && this.currentMap) {
@@ -1541,7 +1673,7 @@ const Admin = {
             document.getElementById('empty-state').classList.remove('hidden');
             document.getElementById('map-editor').classList.add('hidden');
 
-            await this.loadData();
+            await this.syncChanges();
             this.toast('Map deleted', 'success');
             // Auto-regenerate HTML pages
             await this.generateHTML();
@@ -1553,11 +1685,19 @@ const Admin = {
     // HTML Generation (Publish)
     async generateHTML() {
         try {
-            const response = await this.api('/api/generate-html', 'POST');
+            let response = await this.api('/api/generate-html', 'POST', { async: true });
+            if (response.jobId) {
+                const job = await this.waitForJob(response.jobId);
+                response = job.status === 'done' ? job.result : { error: job.error };
+            }
             if (response.success) {
                 // Clear draft after successful publish
                 this.clearDraft();
-                this.toast(`Published: ${response.files.join(', ')}`, 'success');
+                const skipped = response.skipped && response.skipped.length
+                    ? ` (${response.skipped.length} unchanged)`
+                    : '';
+                const files = response.files.length ? response.files.join(', ') : 'no changes';
+                this.toast(`Published: ${files}${skipped}`, 'success');
             } else {
                 this.toast(response.error || 'Generation failed', 'error');
             }
@@ -1566,6 +1706,17 @@ const Admin = {
         }
     },
 
+    // Poll a background job until it finishes
+    async waitForJob(jobId, interval = 500) {
+        while (true) {
+            const job = await this.api(`/api/jobs/${jobId}`);
+            if (job.status !== 'running' && job.status !== 'queued') {
+                return job;
+            }
+            await new Promise(resolve => setTimeout(resolve, interval));
+        }
+    },
+
     // Utility Functions
     generateSlug(text) {
         return text
@@ -1600,8 +1751,9 @@ const Admin = {
     // Photo Request Functions
     async loadPhotoRequests() {
         try {
-            const response = await this.api('/api/photo-requests');
-            this.photoRequests = response || [];
+            const response = await this.api('/api/photo-requests?status=pending&perPage=200');
+            this.photoRequests = response.requests || [];
+            this.photoRequestTotal = response.total || 0;
             this.updateNotificationBadge();
             this.renderNotificationList();
         } catch (error) {
@@ -1612,7 +1764,7 @@ const Admin = {
     updateNotificationBadge() {
         const badge = document.getElementById('notification-badge');
         const bell = document.getElementById('notification-bell');
-        const count = this.photoRequests.length;
+        const count = this.photoRequestTotal;
 
         if (count > 0) {
             badge.textContent = count > 9 ? '9+' : count;
@@ -1701,7 +1853,7 @@ const Admin = {
             if (response.success) {
                 this.toast('Photo added to location!', 'success');
                 await this.loadPhotoRequests();
-                await this.loadData(); // Reload to get updated location image
+                await this.syncChanges(); // Sync to get updated location image
                 // Regenerate HTML
                 await this.generateHTML();
             } else {
@@ -1,7 +1,7 @@
 /**
  * Shared Header Component
  * Injects consistent header across all pages
- * Dynamically loads categories from data.json
+ * Dynamically loads categories from the public data manifest
  */
 
 const HeaderComponent = {
@@ -14,17 +14,17 @@ const HeaderComponent = {
     adminLink: 'admin.html'
   },
 
-  // Categories loaded from data.json
+  // Categories (with their data shard) from public-data/manifest.json
   categories: [],
 
-  // Load categories from data.json
+  // Load categories from the public data manifest
   async loadCategories() {
     try {
-      const response = await fetch('data.json');
-      const data = await response.json();
-      this.categories = data.categories || [];
+      const response = await fetch('public-data/manifest.json');
+      const manifest = await response.json();
+      this.categories = manifest.categories || [];
     } catch (error) {
-      console.warn('Could not load categories from data.json:', error);
+      console.warn('Could not load categories from public-data/manifest.json:', error);
       // Fallback to empty - header will still work, just no nav items
       this.categories = [];
     }
@@ -193,7 +193,9 @@ document.addEventListener('DOMContentLoaded', () => {
       overlayImage.style.display = 'block';
       photoPlaceholder.style.display = 'none';
       overlayImage.classList.add('img-loading');
-      overlayImage.src = locationData.image;
+      // Show the resized copy in the overlay; the lightbox opens the original
+      overlayImage.dataset.full = locationData.image;
+      overlayImage.src = locationData.imageMedium || locationData.image;
     } else {
       overlayImage.style.display = 'none';
       photoPlaceholder.style.display = 'flex';
@@ -222,7 +224,7 @@ document.addEventListener('DOMContentLoaded', () => {
   // Click image in overlay to open in image modal
   overlayImage.addEventListener('click', (e) => {
     e.stopPropagation();
-    imageModalContent.src = overlayImage.src;
+    imageModalContent.src = overlayImage.dataset.full || overlayImage.src;
     imageModalOverlay.style.display = 'flex';
     locationOverlay.style.visibility = 'hidden';
   });
@@ -242,7 +244,7 @@ document.addEventListener('DOMContentLoaded', () => {
   });
 
   // === LOCATION MARKER CLICK HANDLERS ===
-  document.querySelectorAll('.location-marker').forEach(marker => {
+  function bindMarker(marker) {
     marker.addEventListener('click', (e) => {
       e.stopPropagation();
       const locationData = {
@@ -251,6 +253,7 @@ document.addEventListener('DOMContentLoaded', () => {
         description: marker.dataset.description || '',
         fiber: marker.dataset.fiber || '',
         image: marker.dataset.image || '',
+        imageMedium: marker.dataset.imageMedium || '',
         // New fields for photo requests
         locationId: marker.dataset.locationId || '',
         venueId: marker.dataset.venueId || '',
@@ -260,7 +263,163 @@ document.addEventListener('DOMContentLoaded', () => {
       };
       showLocationOverlay(locationData);
     });
-  });
+  }
+  document.querySelectorAll('.location-marker').forEach(bindMarker);
+
+  // === LAZY MARKERS ===
+  // Maps with many locations are generated without markers; fetch the ones
+  // in the visible part of the map (in map percentages) as it scrolls into view.
+  function loadVisibleMarkers(container) {
+    if (!container.offsetParent) return; // Inactive tab
+    const rect = container.getBoundingClientRect();
+    const top = Math.max(0, -rect.top);
+    const bottom = Math.min(rect.height, window.innerHeight - rect.top);
+    if (bottom <= top || rect.width === 0) return;
+
+    const y0 = (top / rect.height * 100).toFixed(2);
+    const y1 = (bottom / rect.height * 100).toFixed(2);
+    const bbox = `0,${y0},100,${y1}`;
+    if (container.dataset.loadedBbox === bbox) return;
+    container.dataset.loadedBbox = bbox;
+
+    const venue = container.closest('.venue');
+    const mapPanel = container.closest('.map-panel');
+    const mapId = container.dataset.lazyMarkers;
+    fetch(`/api/maps/${encodeURIComponent(mapId)}/markers?bbox=${bbox}`)
+      .then(response => response.json())
+      .then(({ markers }) => {
+        markers.forEach(loc => {
+          if (container.querySelector(`.location-marker[data-location-id="${CSS.escape(loc.id)}"]`)) return;
+          const marker = document.createElement('div');
+          marker.className = 'location-marker';
+          marker.style.top = `${loc.y}%`;
+          marker.style.left = `${loc.x}%`;
+          Object.assign(marker.dataset, {
+            locationId: loc.id,
+            venueId: venue?.id || '',
+            mapId,
+            name: loc.name || '',
+            description: loc.description || '',
+            fiber: loc.fiber || '',
+            image: loc.image || '',
+            imageMedium: loc.imageMedium || '',
+            thumb: loc.thumb || '',
+            number: loc.number ?? '',
+            venueName: venue?.querySelector('.venue-title')?.textContent || '',
+            mapLabel: venue?.querySelector(`.map-tab[data-map="${CSS.escape(mapPanel?.id || '')}"]`)?.textContent || ''
+          });
+          const number = document.createElement('span');
+          number.className = 'marker-number';
+          number.textContent = loc.number ?? '';
+          marker.appendChild(number);
+          bindMarker(marker);
+          container.appendChild(marker);
+        });
+      })
+      .catch(() => { delete container.dataset.loadedBbox; });
+  }
+
+  const lazyContainers = document.querySelectorAll('.map-container[data-lazy-markers]');
+  if (lazyContainers.length) {
+    let lazyTimer;
+    const refreshLazyMarkers = () => {
+      clearTimeout(lazyTimer);
+      lazyTimer = setTimeout(() => lazyContainers.forEach(loadVisibleMarkers), 150);
+    };
+    window.addEventListener('scroll', refreshLazyMarkers, { passive: true });
+    window.addEventListener('resize', refreshLazyMarkers);
+    document.querySelectorAll('.map-tab').forEach(tab => tab.addEventListener('click', refreshLazyMarkers));
+    refreshLazyMarkers();
+  }
+
+  // === MAP TILES ===
+  // Large map images come as a deep-zoom pyramid: the panel starts with a
+  // one-tile preview, then loads only the tiles in view from the level that
+  // matches the displayed size. The tile layer is laid out like the image's
+  // object-fit: cover, so markers keep their percentage positions.
+  function loadVisibleTiles(container) {
+    if (!container.offsetParent) return; // Inactive tab
+    const rect = container.getBoundingClientRect();
+    if (!rect.width || !rect.height) return;
+    const tiles = container._tiles || (container._tiles = JSON.parse(container.dataset.tiles));
+
+    let layer = container.querySelector('.map-tiles-layer');
+    if (!layer) {
+      const clip = document.createElement('div');
+      clip.className = 'map-tiles';
+      layer = document.createElement('div');
+      layer.className = 'map-tiles-layer';
+      clip.appendChild(layer);
+      container.querySelector('.map-image').after(clip);
+    }
+    const scale = Math.max(rect.width / tiles.width, rect.height / tiles.height);
+    const layerWidth = tiles.width * scale;
+    const layerHeight = tiles.height * scale;
+    const offsetX = (rect.width - layerWidth) / 2;
+    const offsetY = (rect.height - layerHeight) / 2;
+    Object.assign(layer.style, {
+      width: `${layerWidth}px`,
+      height: `${layerHeight}px`,
+      left: `${offsetX}px`,
+      top: `${offsetY}px`
+    });
+
+    // Smallest level at least as sharp as the screen
+    const wanted = layerWidth * (window.devicePixelRatio || 1);
+    const level = tiles.levels.find(l => l.width >= wanted) || tiles.levels[tiles.levels.length - 1];
+    layer.querySelectorAll(`img:not([data-level="${level.level}"])`).forEach(img => img.remove());
+
+    // Visible part of the container, in layer pixels
+    const left = Math.max(0, -rect.left) - offsetX;
+    const right = Math.min(rect.width, window.innerWidth - rect.left) - offsetX;
+    const top = Math.max(0, -rect.top) - offsetY;
+    const bottom = Math.min(rect.height, window.innerHeight - rect.top) - offsetY;
+    if (right <= left || bottom <= top) return;
+
+    const tileWidth = tiles.tileSize * layerWidth / level.width;
+    const tileHeight = tiles.tileSize * layerHeight / level.height;
+    const x0 = Math.max(0, Math.floor(left / tileWidth));
+    const x1 = Math.min(level.columns - 1, Math.floor(right / tileWidth));
+    const y0 = Math.max(0, Math.floor(top / tileHeight));
+    const y1 = Math.min(level.rows - 1, Math.floor(bottom / tileHeight));
+    for (let x = x0; x <= x1; x++) {
+      for (let y = y0; y <= y1; y++) {
+        const key = `${level.level}/${x}_${y}`;
+        if (layer.querySelector(`img[data-key="${key}"]`)) continue;
+        const img = document.createElement('img');
+        img.alt = '';
+        img.decoding = 'async';
+        img.dataset.key = key;
+        img.dataset.level = level.level;
+        Object.assign(img.style, {
+          left: `${x * tiles.tileSize / level.width * 100}%`,
+          top: `${y * tiles.tileSize / level.height * 100}%`,
+          width: `${Math.min(tiles.tileSize, level.width - x * tiles.tileSize) / level.width * 100}%`,
+          height: `${Math.min(tiles.tileSize, level.height - y * tiles.tileSize) / level.height * 100}%`
+        });
+        img.src = tiles.url.replace('{z}', level.level).replace('{x}', x).replace('{y}', y);
+        layer.appendChild(img);
+      }
+    }
+  }
+
+  const tiledContainers = document.querySelectorAll('.map-container[data-tiles]');
+  if (tiledContainers.length) {
+    let tileTimer;
+    const refreshTiles = () => {
+      clearTimeout(tileTimer);
+      tileTimer = setTimeout(() => tiledContainers.forEach(loadVisibleTiles), 100);
+    };
+    window.addEventListener('scroll', refreshTiles, { passive: true });
+    window.addEventListener('resize', refreshTiles);
+    document.querySelectorAll('.map-tab').forEach(tab => tab.addEventListener('click', refreshTiles));
+    // Expanding a map to fullscreen resizes it without resizing the window
+    if ('ResizeObserver' in window) {
+      const observer = new ResizeObserver(refreshTiles);
+      tiledContainers.forEach(container => observer.observe(container));
+    }
+    refreshTiles();
+  }
 
   // === IMAGE PRELOADING ===
   function preloadMapImages(container) {
@@ -272,7 +431,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const imageUrls = [];
     container.querySelectorAll('.location-marker[data-image]').forEach(marker => {
-      const src = marker.dataset.image;
+      const src = marker.dataset.imageMedium || marker.dataset.image;
       if (src && !src.startsWith('data:')) {
         imageUrls.push(src);
         const preloadImg = new Image();
@@ -534,6 +693,7 @@ document.addEventListener('DOMContentLoaded', () => {
           description: marker.dataset.description || '',
           fiber: marker.dataset.fiber || '',
           image: marker.dataset.image || '',
+          imageMedium: marker.dataset.imageMedium || '',
           locationId: marker.dataset.locationId || '',
           venueId: marker.dataset.venueId || '',
           mapId: marker.dataset.mapId || '',
@@ -4,11 +4,13 @@
  */
 
 const SearchModule = {
-  data: null,
   searchIndex: [],
   searchInput: null,
   resultsContainer: null,
   selectedIndex: -1,
+  requestSeq: 0,
+  useServer: true,
+  hits: {}, // location id -> displayed result, for opening unrendered markers
 
   // Initialize search
   async init() {
@@ -20,33 +22,37 @@ const SearchModule = {
       return;
     }
 
-    // Load data
-    await this.loadData();
-
-    // Build search index
-    this.buildIndex();
-
     // Setup event listeners
     this.setupListeners();
   },
 
-  // Load venue data
-  async loadData() {
+  // Query the server's search index
+  async fetchResults(query) {
+    const response = await fetch(`/api/search?q=${encodeURIComponent(query)}&limit=50`);
+    if (!response.ok) {
+      throw new Error(`Search failed: ${response.status}`);
+    }
+    return (await response.json()).results;
+  },
+
+  // Build the local index from the current category's shard, or the page markup
+  async buildLocalIndex() {
     try {
-      const response = await fetch('data.json');
-      this.data = await response.json();
+      const page = window.location.pathname.split('/').pop().replace(/\.html$/, '');
+      const manifest = await (await fetch('public-data/manifest.json')).json();
+      const category = manifest.categories.find(c => c.slug === page);
+      if (!category) throw new Error(`No data shard for page "${page}"`);
+      const shard = await (await fetch(category.shard)).json();
+      this.buildIndex(shard.venues);
     } catch (error) {
-      console.error('Failed to load data.json:', error);
-      // Fallback: build index from DOM
+      console.warn('Could not load data shard, indexing the page:', error);
       this.buildIndexFromDOM();
     }
   },
 
-  // Build search index from data.json
-  buildIndex() {
-    if (!this.data) return;
-
-    this.data.venues.forEach(venue => {
+  // Build search index from a list of venues
+  buildIndex(venues) {
+    venues.forEach(venue => {
       venue.maps.forEach(map => {
         map.locations.forEach(location => {
           this.searchIndex.push({
@@ -58,8 +64,11 @@ const SearchModule = {
             name: location.name,
             locationId: location.id,
             number: location.number,
-            description: location.description,
+            description: location.description || '',
             fiber: location.fiber || '',
+            image: location.image || '',
+            x: parseFloat(location.position?.left) || 0,
+            y: parseFloat(location.position?.top) || 0,
             searchText: [
               venue.name,
               map.label,
@@ -155,16 +164,33 @@ const SearchModule = {
   },
 
   // Perform search
-  search(query) {
+  async search(query) {
     if (query.length < 2) {
       this.resultsContainer.classList.remove('visible');
       return;
     }
 
-    const searchTerms = query.toLowerCase().split(' ').filter(t => t.length > 0);
-    const results = this.searchIndex.filter(item => {
-      return searchTerms.every(term => item.searchText.includes(term));
-    });
+    const seq = ++this.requestSeq;
+    let results;
+    if (this.useServer) {
+      try {
+        results = await this.fetchResults(query);
+      } catch (error) {
+        // Offline or statically hosted: search this page's data shard from now on
+        console.warn('Server search unavailable, searching locally:', error);
+        this.useServer = false;
+        await this.buildLocalIndex();
+      }
+    }
+    if (!this.useServer) {
+      const searchTerms = query.toLowerCase().split(' ').filter(t => t.length > 0);
+      results = this.searchIndex.filter(item => {
+        return searchTerms.every(term => item.searchText.includes(term));
+      });
+    }
+
+    // A newer query was typed while this one was in flight
+    if (seq !== this.requestSeq) return;
 
     this.displayResults(results, query);
     this.selectedIndex = -1;
@@ -184,7 +210,9 @@ const SearchModule = {
 
     // Group by venue
     const grouped = {};
+    this.hits = {};
     results.forEach(result => {
+      if (result.locationId) this.hits[result.locationId] = result;
       if (!grouped[result.venue]) {
         grouped[result.venue] = [];
       }
@@ -258,6 +286,7 @@ const SearchModule = {
 
     // Find the location marker and show overlay
     const marker = mapPanel.querySelector(`[data-location-id="${locationId}"]`);
+    const hit = this.hits[locationId];
     if (marker && window.showLocationOverlay) {
       setTimeout(() => {
         const locationData = {
@@ -266,6 +295,7 @@ const SearchModule = {
           description: marker.dataset.description || '',
           fiber: marker.dataset.fiber || '',
           image: marker.dataset.image || '',
+          imageMedium: marker.dataset.imageMedium || '',
           locationId: marker.dataset.locationId || '',
           venueId: marker.dataset.venueId || '',
           mapId: marker.dataset.mapId || '',
@@ -274,11 +304,40 @@ const SearchModule = {
         };
         window.showLocationOverlay(locationData);
       }, 400);
+    } else if (hit && window.showLocationOverlay) {
+      // Lazy maps only render the markers in view; open the overlay from the hit
+      this.showHitOverlay(hit, venue);
     }
 
     // Hide search results
     this.resultsContainer.classList.remove('visible');
     this.searchInput.value = '';
+  },
+
+  // Show the overlay for a search hit whose marker isn't on the page
+  async showHitOverlay(hit, venue) {
+    let loc = {};
+    try {
+      // The nearest marker to the hit's position is the hit itself, with its image
+      const response = await fetch(`/api/maps/${encodeURIComponent(hit.mapId)}/markers/nearest?x=${hit.x}&y=${hit.y}&k=1`);
+      const { markers } = await response.json();
+      loc = markers.find(m => m.id === hit.locationId) || {};
+    } catch (error) {
+      // Statically hosted: make do with what the hit carries
+    }
+    window.showLocationOverlay({
+      number: loc.number ?? hit.number ?? '',
+      name: loc.name || hit.name || 'Location',
+      description: loc.description || hit.description || '',
+      fiber: loc.fiber || hit.fiber || '',
+      image: loc.image || hit.image || '',
+      imageMedium: loc.imageMedium || '',
+      locationId: hit.locationId,
+      venueId: hit.venueId || venue.id || '',
+      mapId: hit.mapId,
+      venueName: hit.venue || '',
+      mapLabel: hit.map || ''
+    });
   }
 };
 
@@ -5,114 +5,1561 @@ Provides API endpoints for the admin editor
 """
 
 import os
+import re
 import json
+import gzip
+import mimetypes
+import abc
+import atexit
+import time
 import uuid
 import hashlib
 import secrets
+import shutil
+import stat
+import tempfile
+import threading
+import math
+import sqlite3
 from html import escape as html_escape
+from collections import ChainMap, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from functools import wraps
-from flask import Flask, request, jsonify, send_from_directory, session
+from functools import partial, wraps
+import click
+from flask import Flask, Response, abort, request, jsonify, send_from_directory, session
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-
-app = Flask(__name__, static_folder='.', static_url_path='')
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import safe_join, secure_filename
+
+try:
+    from PIL import Image, ImageOps, features as pil_features
+except ImportError:  # Without Pillow uploads are served as-is, with no derivatives
+    Image = None
+
+try:
+    import brotli
+except ImportError:  # Without brotli only gzip is offered
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:  # Windows - visitor files are then only safe with a single worker
+    fcntl = None
+
+# Static files are served by serve_static() so it can set caching headers
+app = Flask(__name__, static_folder=None)
 app.secret_key = secrets.token_hex(32)
 CORS(app, supports_credentials=True)
 
 # Configuration
 DATA_FILE = 'data.json'
 UPLOAD_FOLDER = 'uploads'
+VARIANTS_FOLDER = os.path.join(UPLOAD_FOLDER, 'variants')  # Resized/re-encoded image derivatives
+BLOB_FOLDER = os.path.join(UPLOAD_FOLDER, 'blobs')  # Uploads stored by content hash
+PARTIAL_UPLOAD_FOLDER = os.path.join(UPLOAD_FOLDER, '.partial')  # Resumable uploads in progress (never served)
+TEMPLATE_FOLDER = 'templates'
+ASSET_EXTENSIONS = {'css', 'js', 'png', 'jpg', 'jpeg', 'webp', 'gif', 'svg', 'ico'}  # Top-level files that get fingerprints
+ASSET_FINGERPRINTS = True  # Rewrite asset references in served pages to fingerprinted URLs
+ASSET_SCAN_INTERVAL = 2.0  # Seconds between checks for changed assets
+ASSET_MAX_AGE = 365 * 24 * 60 * 60  # Cache lifetime of fingerprinted assets
+COMPRESSIBLE_EXTENSIONS = {'html', 'css', 'js', 'json', 'svg', 'txt'}  # Served gzip/brotli encoded when accepted
+COMPRESS_MIN_SIZE = 1024  # Smaller files aren't worth compressing
+COMPRESSION_CACHE_BYTES = 16 * 1024 * 1024  # Memory for on-the-fly compressed bodies
+SERVICE_WORKER = 'sw.js'  # Served with the asset manifest filled in
+PRECACHE_PAGES = ['/', '/index.html', '/camera_positions.html', '/public-data/manifest.json', '/manifest.json']  # Precached besides the generated pages
 ANALYTICS_FILE = 'analytics.json'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'gif'}
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read at a time when storing uploads
+MAX_RESUMABLE_UPLOAD_SIZE = 100 * 1024 * 1024  # Largest map image accepted through resumable uploads
+UPLOAD_PART_SIZE = 4 * 1024 * 1024  # Chunk size suggested to resumable upload clients (below MAX_CONTENT_LENGTH)
+UPLOAD_SESSION_TTL = 24 * 60 * 60  # Seconds before an unfinished resumable upload is discarded
+UPLOAD_PIN_SECONDS = 60 * 60  # Seconds a stored upload is kept from deletion until something references it
+IMAGE_VARIANT_WIDTHS = {'thumb': 320, 'medium': 1024, 'full': 2048}  # Max width of each derivative
+IMAGE_QUALITY = 80  # Encoder quality for JPEG/WebP/AVIF derivatives
+TILE_SIZE = 256  # Edge of deep-zoom map tiles
+TILE_MIN_DIMENSION = 1536  # Map images smaller than this on both sides aren't tiled
+DATA_RELOAD_INTERVAL = 2.0  # Seconds between checks for external edits to data.json
+STORAGE_BACKEND = 'json'  # 'json' (data.json plus a journal) or 'sqlite' (SQLITE_FILE, one row per entity)
+SQLITE_FILE = 'data.sqlite3'  # Venue database of the sqlite backend; seeded from data.json when first created
+JOURNAL_FILE = 'data.journal'  # Append-only log of mutations not yet folded into data.json
+JOURNAL_COMPACT_BYTES = 256 * 1024  # Compact the journal into data.json past this size
+PRIVATE_FOLDER = 'private'  # Server-side records holding visitor details (never served)
+PHOTO_REQUESTS_FILE = os.path.join(PRIVATE_FOLDER, 'photo-requests.jsonl')  # Append-only log of visitor photo requests
+LEGACY_PHOTO_REQUESTS_FILE = 'photo-requests.jsonl'  # Where the log used to live; moved on first load
+PHOTO_REQUEST_STATUSES = ('pending', 'approved', 'dismissed')
+PHOTO_REQUEST_RETENTION_DAYS = 90  # Resolved requests older than this are dropped when the log is compacted
+PHOTO_REQUEST_PAGE_SIZE = 50  # Default GET /api/photo-requests page size (max 200)
+CHANGE_LOG_SIZE = 5000  # Recent changes kept for /api/changes; older clients resync fully
+SEARCH_FIELD_WEIGHTS = {'name': 3.0, 'fiber': 2.0, 'venue': 1.0, 'map': 1.0, 'description': 1.0}  # Score per matching field
+SEARCH_MAX_PREFIX = 20  # Longest word prefix indexed for type-ahead
+SEARCH_PAGE_SIZE = 20  # Default /api/search page size (max 100)
+SPATIAL_GRID_SIZE = 16  # Cells per side of each map's marker grid
+MARKER_LAZY_THRESHOLD = 150  # Maps with more locations load their markers from /api/maps/<id>/markers
+GENERATION_MANIFEST = '.generated.json'  # Input hashes of the last generated pages
+GENERATION_WORKERS = min(4, os.cpu_count() or 1)  # Processes used to render category pages
+PUBLIC_EXPORT_FOLDER = 'public-data'  # Viewer-only data shards written with the pages
+JOBS_FILE = 'jobs.json'  # Persistent background job records
+JOB_WORKERS = 2  # Background jobs that may run at once
+JOB_HISTORY = 200  # Finished job records kept
+JOB_PROGRESS_SAVE_INTERVAL = 1.0  # Seconds between saves of a running job's progress
+ANALYTICS_FLUSH_INTERVAL = 10  # Seconds between background analytics flushes
+ANALYTICS_FLUSH_EVENTS = 200  # Flush early once this many hits are buffered
+ANALYTICS_HOURLY_RETENTION_DAYS = 14  # Hourly buckets older than this are dropped
+ANALYTICS_DAILY_RETENTION_DAYS = 400  # Daily buckets older than this are dropped (monthly are kept)
+ANALYTICS_MAX_PAGES = 200  # Distinct pages tracked per bucket; the rest count as '(other)'
+ANALYTICS_MAX_BUCKETS = 2000  # Largest range /api/analytics will return
+VISITORS_FOLDER = 'visitors'  # Per-day unique visitor files
+VISITOR_COUNTER = 'exact'  # 'exact' (8 bytes per visitor) or 'hll' (fixed 4KB per day, ~1.6% error)
+SESSION_STORE = 'memory'  # 'memory' (single worker) or 'sqlite' (SESSIONS_FILE, shared by all workers)
+SESSIONS_FILE = 'sessions.sqlite3'  # Admin sessions of the sqlite session store
+SESSION_LIFETIME = 24 * 60 * 60  # Seconds an admin login stays valid
+SESSION_SWEEP_INTERVAL = 10 * 60  # Seconds between background sweeps of expired sessions
+PRIVATE_FILES = {ANALYTICS_FILE, JOBS_FILE, GENERATION_MANIFEST, JOURNAL_FILE, SQLITE_FILE, SESSIONS_FILE}  # App-root state serve_static() refuses
+PRIVATE_SUFFIXES = ('.jsonl', '.journal', '.lock', '.tmp', '.sqlite3', '.sqlite3-wal', '.sqlite3-shm')  # Likewise, by extension
+
+# Werkzeug rejects larger request bodies with a 413 before they are read
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+
+# Set in page rendering pool workers (see mark_pool_worker)
+_pool_worker = False
 
 # Admin password (hashed)
 ADMIN_PASSWORD_HASH = hashlib.sha256('VideoProd2020!'.encode()).hexdigest()
 
-# Session storage (in-memory for simplicity)
-sessions = {}
-
-# Analytics - track unique sessions per day
-visitor_sessions = set()  # Track session IDs seen today
-last_analytics_date = None
-
 # Ensure upload folder exists
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'maps'), exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'photo-requests'), exist_ok=True)
+os.makedirs(VISITORS_FOLDER, exist_ok=True)
+os.makedirs(PRIVATE_FOLDER, exist_ok=True)
+
+# Files created by the server get the usual permissions (mkstemp makes them 0600)
+_umask = os.umask(0)
+os.umask(_umask)
+NEW_FILE_MODE = 0o644 & ~_umask
+
+def make_temp_file(path):
+    """Create a temp file next to path, with path's current mode (or NEW_FILE_MODE)
+
+    Returns (fd, temp path); rename it over path once written.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=directory)
+    try:
+        os.chmod(tmp_path, mode)
+    except OSError:
+        os.close(fd)
+        os.remove(tmp_path)
+        raise
+    return fd, tmp_path
+
+def write_temp_file(path, text):
+    """Write text (or bytes) to an fsynced temp file next to path and return the temp path"""
+    fd, tmp_path = make_temp_file(path)
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+def write_text_atomic(path, text):
+    """Write text (or bytes) to a temp file next to path, then rename it into place"""
+    os.replace(write_temp_file(path, text), path)
+
+def write_json_atomic(path, data, indent=2):
+    """Write JSON to a temp file next to path, then rename it into place"""
+    write_text_atomic(path, json.dumps(data, indent=indent))
+
+_held_file_locks = threading.local()
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path + '.lock', shared by all server processes
+
+    A thread already holding it may take it again; other threads of the
+    same process wait like other processes do.
+    """
+    held = _held_file_locks.__dict__.setdefault('paths', set())
+    if path in held:
+        yield
+        return
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        held.add(path)
+        yield
+    finally:
+        held.discard(path)
+        os.close(fd)
+
+# Analytics time series
+# analytics.json holds counters bucketed by hour ('2025-12-02T14'), with
+# daily ('2025-12-02') and monthly ('2025-12') rollups maintained on every
+# flush so any granularity is answered by direct bucket lookups. Each
+# bucket is {'sessions': n, 'pageviews': n, 'pages': {page: pageviews}}.
+ANALYTICS_GRANULARITIES = {
+    'hour': ('hourly', '%Y-%m-%dT%H'),
+    'day': ('daily', '%Y-%m-%d'),
+    'month': ('monthly', '%Y-%m'),
+}
+
+def empty_analytics():
+    return {"version": 2, "hourly": {}, "daily": {}, "monthly": {}, "total_sessions": 0, "total_pageviews": 0}
 
 def load_analytics():
     """Load analytics data from JSON file"""
     try:
         with open(ANALYTICS_FILE, 'r') as f:
-            return json.load(f)
+            analytics = json.load(f)
     except FileNotFoundError:
-        return {"daily": {}, "total_sessions": 0, "total_pageviews": 0}
+        return empty_analytics()
+
+    if analytics.get('version') != 2:
+        # Older files only had the daily map; derive the monthly rollup
+        analytics['version'] = 2
+        analytics.setdefault('hourly', {})
+        analytics['monthly'] = {}
+        for day, stats in analytics.get('daily', {}).items():
+            add_to_bucket(analytics['monthly'], day[:7], stats)
+    return analytics
 
 def save_analytics(data):
     """Save analytics data to JSON file"""
-    with open(ANALYTICS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def track_visit(session_id):
-    """Track a page visit"""
-    global visitor_sessions, last_analytics_date
-
-    today = datetime.now().strftime('%Y-%m-%d')
-    analytics = load_analytics()
-
-    # Reset daily sessions if it's a new day
-    if last_analytics_date != today:
-        visitor_sessions = set()
-        last_analytics_date = today
-
-    # Initialize today's stats if needed
-    if today not in analytics['daily']:
-        analytics['daily'][today] = {'sessions': 0, 'pageviews': 0}
-
-    # Track pageview
-    analytics['daily'][today]['pageviews'] += 1
-    analytics['total_pageviews'] += 1
+    write_json_atomic(ANALYTICS_FILE, data, indent=None)
+
+def normalize_page(page):
+    """Reduce a client-reported page to a bounded bucket key"""
+    if not isinstance(page, str) or not page:
+        return '/'
+    return page.split('?', 1)[0].split('#', 1)[0][:200] or '/'
+
+def add_to_bucket(series, key, stats):
+    """Add a bucket's counters into series[key] (in place)"""
+    bucket = series.setdefault(key, {'sessions': 0, 'pageviews': 0})
+    bucket['sessions'] += stats.get('sessions', 0)
+    bucket['pageviews'] += stats.get('pageviews', 0)
+    if stats.get('pages'):
+        pages = bucket.setdefault('pages', {})
+        for page, views in stats['pages'].items():
+            if page not in pages and len(pages) >= ANALYTICS_MAX_PAGES:
+                page = '(other)'
+            pages[page] = pages.get(page, 0) + views
+    return bucket
+
+def merge_analytics(analytics, pending):
+    """Add buffered hourly counters into analytics and its rollups (in place)"""
+    for hour, stats in pending['hourly'].items():
+        add_to_bucket(analytics['hourly'], hour, stats)
+        add_to_bucket(analytics['daily'], hour[:10], stats)
+        add_to_bucket(analytics['monthly'], hour[:7], stats)
+        analytics['total_sessions'] += stats.get('sessions', 0)
+        analytics['total_pageviews'] += stats.get('pageviews', 0)
+    return analytics
 
-    # Track unique session
-    if session_id and session_id not in visitor_sessions:
-        visitor_sessions.add(session_id)
-        analytics['daily'][today]['sessions'] += 1
-        analytics['total_sessions'] += 1
+def apply_session_counts(analytics, counts, hours):
+    """Raise each day's session count to the visitor counter's figure (in place)
+
+    The increase is credited to the day's month and to hours[day], the
+    latest hour with traffic in the batch being flushed.
+    """
+    for day, count in counts.items():
+        current = analytics['daily'].get(day, {}).get('sessions', 0)
+        if count > current:
+            delta = {'sessions': count - current}
+            add_to_bucket(analytics['daily'], day, delta)
+            add_to_bucket(analytics['monthly'], day[:7], delta)
+            add_to_bucket(analytics['hourly'], hours[day], delta)
+            analytics['total_sessions'] += count - current
+    return analytics
 
-    save_analytics(analytics)
+def prune_analytics(analytics, now):
+    """Drop hourly and daily buckets past their retention window (in place)"""
+    hour_cutoff = (now - timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS)).strftime('%Y-%m-%dT%H')
+    day_cutoff = (now - timedelta(days=ANALYTICS_DAILY_RETENTION_DAYS)).strftime('%Y-%m-%d')
+    for series, cutoff in (('hourly', hour_cutoff), ('daily', day_cutoff)):
+        for key in [k for k in analytics[series] if k < cutoff]:
+            del analytics[series][key]
     return analytics
 
+def bucket_keys(start, end, granularity):
+    """Yield the bucket keys from start to end inclusive, oldest first"""
+    fmt = ANALYTICS_GRANULARITIES[granularity][1]
+    if granularity == 'hour':
+        current = start.replace(minute=0, second=0, microsecond=0)
+    elif granularity == 'day':
+        current = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        current = start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while current <= end:
+        yield current.strftime(fmt)
+        if granularity == 'hour':
+            current += timedelta(hours=1)
+        elif granularity == 'day':
+            current += timedelta(days=1)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+
+def query_analytics(analytics, start, end, granularity):
+    """Return the buckets in [start, end] plus per-page totals for the range, busiest first"""
+    series = analytics[ANALYTICS_GRANULARITIES[granularity][0]]
+    buckets = []
+    pages = {}
+    for key in bucket_keys(start, end, granularity):
+        stats = series.get(key, {})
+        buckets.append({
+            'bucket': key,
+            'sessions': stats.get('sessions', 0),
+            'pageviews': stats.get('pageviews', 0),
+            'pages': stats.get('pages', {}),
+        })
+        for page, views in stats.get('pages', {}).items():
+            pages[page] = pages.get(page, 0) + views
+    return {
+        'granularity': granularity,
+        'buckets': buckets,
+        'sessions': sum(b['sessions'] for b in buckets),
+        'pageviews': sum(b['pageviews'] for b in buckets),
+        'pages': [{'page': page, 'pageviews': views}
+                  for page, views in sorted(pages.items(), key=lambda item: -item[1])],
+    }
+
+def visitor_digest(session_id):
+    """Compact fixed-size fingerprint of a visitor id"""
+    return hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+
+# Unique visitor counters
+class VisitorCounter(abc.ABC):
+    """Counts unique visitors per day
+
+    add() only touches memory so it is safe on the request path. sync()
+    does the file I/O: it merges in what other workers (or a previous
+    run of this process) recorded for the day and persists what this
+    process has seen. count() is exact after a sync.
+    """
+
+    # Days kept in memory; older ones are dropped after a sync
+    KEEP_DAYS = 2
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self._days = {}
+
+    def _path(self, day, suffix):
+        return os.path.join(self.folder, f"{day}.{suffix}")
+
+    @abc.abstractmethod
+    def add(self, day, session_id):
+        """Record a visitor for day (in memory only)"""
+
+    @abc.abstractmethod
+    def count(self, day):
+        """Unique visitors seen on day"""
+
+    @abc.abstractmethod
+    def sync(self, days):
+        """Merge in and persist the counts for days"""
+
+    def _prune(self):
+        for day in sorted(self._days)[:-self.KEEP_DAYS]:
+            del self._days[day]
+
+class ExactVisitorCounter(VisitorCounter):
+    """Exact counts from an append-only file of 8-byte visitor digests per day
+
+    Every worker appends its new digests with O_APPEND and reads the other
+    workers' appends back from the file, so the set converges across
+    processes and restarts.
+    """
+
+    SUFFIX = 'ids'
+
+    def _state(self, day):
+        if day not in self._days:
+            self._days[day] = {'known': set(), 'unsynced': [], 'offset': 0}
+        return self._days[day]
+
+    def add(self, day, session_id):
+        digest = visitor_digest(session_id)
+        with self.lock:
+            state = self._state(day)
+            if digest not in state['known']:
+                state['known'].add(digest)
+                state['unsynced'].append(digest)
+
+    def count(self, day):
+        with self.lock:
+            if day not in self._days:
+                self._read_tail(day, self._state(day))
+            return len(self._days[day]['known'])
+
+    def _read_tail(self, day, state):
+        """Read digests appended since the last sync; returns them as a set"""
+        seen = set()
+        try:
+            with open(self._path(day, self.SUFFIX), 'rb') as f:
+                f.seek(state['offset'])
+                chunk = f.read()
+        except FileNotFoundError:
+            return seen
+        usable = len(chunk) - len(chunk) % 8
+        for i in range(0, usable, 8):
+            seen.add(chunk[i:i + 8])
+        state['offset'] += usable
+        state['known'] |= seen
+        return seen
+
+    def sync(self, days):
+        with self.lock:
+            for day in days:
+                state = self._state(day)
+                on_disk = self._read_tail(day, state)
+                fresh = [d for d in state['unsynced'] if d not in on_disk]
+                state['unsynced'] = []
+                if fresh:
+                    fd = os.open(self._path(day, self.SUFFIX), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    try:
+                        os.write(fd, b''.join(fresh))
+                    finally:
+                        os.close(fd)
+                    # Our own appends are read back (and ignored) next sync,
+                    # so appends from other workers in between aren't skipped
+            self._prune()
+
+class HyperLogLogVisitorCounter(VisitorCounter):
+    """Approximate counts from a HyperLogLog sketch per day
+
+    Uses 2^HLL_PRECISION one-byte registers (4KB per day) no matter how
+    many visitors there are. Sketches from different workers merge by
+    taking the register-wise maximum, done under a file lock on sync.
+    """
+
+    SUFFIX = 'hll'
+    HLL_PRECISION = 12
+    REGISTERS = 1 << HLL_PRECISION
+
+    def _state(self, day):
+        if day not in self._days:
+            self._days[day] = {'registers': bytearray(self.REGISTERS), 'loaded': False}
+        return self._days[day]
+
+    def add(self, day, session_id):
+        value = int.from_bytes(visitor_digest(session_id), 'big')
+        index = value >> (64 - self.HLL_PRECISION)
+        rest = value & ((1 << (64 - self.HLL_PRECISION)) - 1)
+        rank = (64 - self.HLL_PRECISION) - rest.bit_length() + 1
+        with self.lock:
+            registers = self._state(day)['registers']
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def count(self, day):
+        with self.lock:
+            state = self._state(day)
+            if not state['loaded']:
+                self._merge_file(day, state, write=False)
+            registers = state['registers']
+        m = self.REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def _merge_file(self, day, state, write=True):
+        path = self._path(day, self.SUFFIX)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            on_disk = os.read(fd, self.REGISTERS)
+            registers = state['registers']
+            for i, r in enumerate(on_disk):
+                if r > registers[i]:
+                    registers[i] = r
+            if write and bytes(registers) != on_disk:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.write(fd, bytes(registers))
+            state['loaded'] = True
+        finally:
+            os.close(fd)
+
+    def sync(self, days):
+        with self.lock:
+            for day in days:
+                self._merge_file(day, self._state(day))
+            self._prune()
+
+VISITOR_COUNTERS = {
+    'exact': ExactVisitorCounter,
+    'hll': HyperLogLogVisitorCounter,
+}
+
+visitor_counter = VISITOR_COUNTERS[VISITOR_COUNTER](VISITORS_FOLDER)
+
+class AnalyticsBuffer:
+    """Aggregates page views in memory and flushes them to analytics.json
+
+    record() only touches in-memory counters. A background thread merges
+    the buffered counts into the file every ANALYTICS_FLUSH_INTERVAL
+    seconds, or sooner once ANALYTICS_FLUSH_EVENTS hits are waiting, and
+    a final flush runs at shutdown. Each worker has its own buffer; the
+    merge into the file is done under its file lock so flushes from
+    different workers don't overwrite each other's counts.
+
+    Unique sessions are not counted here: on flush each touched day's
+    session count is taken from the visitor counter, which is shared
+    across workers and restarts.
+    """
+
+    def __init__(self, counter):
+        self.counter = counter
+        self.lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = self._empty()
+        self._events = 0
+        self._wake = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _empty():
+        return {'hourly': {}}
+
+    def record(self, now, session_id, page='/'):
+        if session_id:
+            self.counter.add(now.strftime('%Y-%m-%d'), session_id)
+        with self.lock:
+            add_to_bucket(self._pending['hourly'], now.strftime('%Y-%m-%dT%H'),
+                          {'pageviews': 1, 'pages': {page: 1}})
+            self._events += 1
+            if self._events >= ANALYTICS_FLUSH_EVENTS:
+                self._wake.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(ANALYTICS_FLUSH_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def _apply_pending(self, analytics, pending):
+        # Latest hour per day, to credit new sessions to
+        hours = {}
+        for hour in sorted(pending['hourly']):
+            hours[hour[:10]] = hour
+        merge_analytics(analytics, pending)
+        apply_session_counts(analytics, {day: self.counter.count(day) for day in hours}, hours)
+        return analytics
+
+    def flush(self):
+        """Merge buffered counts into analytics.json"""
+        with self._flush_lock:
+            with self.lock:
+                pending = self._pending
+                self._pending = self._empty()
+                self._events = 0
+            if not pending['hourly']:
+                return
+            try:
+                with file_lock(ANALYTICS_FILE):
+                    self.counter.sync({hour[:10] for hour in pending['hourly']})
+                    analytics = self._apply_pending(load_analytics(), pending)
+                    save_analytics(prune_analytics(analytics, datetime.now()))
+            except Exception as e:
+                print(f"[Analytics] Flush failed, keeping counts buffered: {e}")
+                with self.lock:
+                    for hour, stats in pending['hourly'].items():
+                        add_to_bucket(self._pending['hourly'], hour, stats)
+
+    def snapshot(self):
+        """Return the stored analytics plus anything not yet flushed"""
+        # Hold the flush lock so counts that are mid-flush aren't missed
+        with self._flush_lock:
+            analytics = load_analytics()
+            with self.lock:
+                pending = {'hourly': {hour: dict(stats) for hour, stats in self._pending['hourly'].items()}}
+            return self._apply_pending(analytics, pending)
+
+analytics_buffer = AnalyticsBuffer(visitor_counter)
+atexit.register(analytics_buffer.flush)
+
+def track_visit(session_id, page='/'):
+    """Track a page visit"""
+    analytics_buffer.record(datetime.now(), session_id, normalize_page(page))
+
 # Helper functions
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Entity kinds and where each one lives in the document:
+# kind -> (parent kind, key of the list that holds it)
+ENTITY_LAYOUT = {
+    'category': (None, 'categories'),
+    'venue': (None, 'venues'),
+    'map': ('venue', 'maps'),
+    'location': ('map', 'locations'),
+}
+# kind -> child kind stored inside it
+ENTITY_CHILDREN = {'venue': 'map', 'map': 'location'}
+# Top-level document keys that hold entity lists
+ENTITY_ROOT_KEYS = {key for parent_kind, key in ENTITY_LAYOUT.values() if parent_kind is None}
+
+def parent_kinds(kind):
+    """Kinds of an entity's parents, outermost first"""
+    chain = []
+    parent_kind = ENTITY_LAYOUT[kind][0]
+    while parent_kind is not None:
+        chain.insert(0, parent_kind)
+        parent_kind = ENTITY_LAYOUT[parent_kind][0]
+    return chain
+
+# Storage backends
+class Storage(abc.ABC):
+    """Where the DataStore keeps the venue document between runs
+
+    All calls are made under the store lock. load() returns the stored
+    document plus any mutation records to replay over it. write() persists
+    one mutation once the store has applied it, given the entity as it is
+    afterwards and its [parents, position] entry (as it was before, for a
+    delete; None for a 'set'); for a 'batch' of records both are lists,
+    one item per record. replace() stores a whole new document.
+    changed() tells whether another process changed the stored data since
+    it was loaded or written here. A mutation holds transaction() across
+    changed(), any reload and write(), so no other process writes in
+    between.
+    """
+
+    @contextmanager
+    def transaction(self):
+        yield
+
+    @abc.abstractmethod
+    def load(self):
+        """(document, records to replay over it)"""
+
+    @abc.abstractmethod
+    def changed(self):
+        """Whether another process wrote since this one loaded or wrote"""
+
+    @abc.abstractmethod
+    def write(self, record, result, entry):
+        """Persist one applied mutation record"""
+
+    @abc.abstractmethod
+    def replace(self, data):
+        """Store a whole new document"""
+
+    def compact(self, store):
+        """Fold pending writes into the main copy (optional housekeeping)"""
+
+class JsonStorage(Storage):
+    """data.json plus an append-only journal of mutation records
+
+    Mutations are not written back to data.json one by one. Each is
+    appended as a compact record to the journal file, which is replayed
+    over data.json on load. Once the journal grows past
+    JOURNAL_COMPACT_BYTES a background thread folds it into a fresh
+    data.json snapshot (temp file + rename) and truncates it. Replaying
+    a record that is already part of the snapshot is harmless, so a
+    crash mid-compaction doesn't corrupt anything.
+
+    Appends, compaction and the trimming of a torn final line (a crash
+    mid-append) happen under an exclusive lock on data.journal.lock, so
+    several server processes can share the files. Each process tracks
+    how much of which journal file it has applied; data.json changing
+    (e.g. a hand edit) or the journal holding more than that means
+    another process wrote, and the document is reloaded.
+    """
+
+    def __init__(self, path, journal_path):
+        self.path = path
+        self.journal_path = journal_path
+        self.store = None
+        self._signature = None
+        self._last_good = None
+        self._journal_ino = None  # Journal file whose first _journal_size bytes are applied
+        self._journal_size = 0
+        self._lock_depth = 0
+        self._lock_cm = None
+        self._compacting = False
+
+    def __str__(self):
+        return self.path
+
+    def _file_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _journal_signature(self):
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    @contextmanager
+    def _locked(self):
+        """Hold the journal lock against other processes (reentrant; callers hold the store lock)"""
+        if self._lock_depth == 0:
+            self._lock_cm = file_lock(self.journal_path)
+            self._lock_cm.__enter__()
+        self._lock_depth += 1
+        try:
+            yield
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0:
+                self._lock_cm.__exit__(None, None, None)
+                self._lock_cm = None
+
+    def _read_file(self):
+        try:
+            with open(self.path, 'r') as f:
+                self._last_good = json.load(f)
+        except FileNotFoundError:
+            self._last_good = {"categories": [], "venues": []}
+        except json.JSONDecodeError:
+            # Keep serving the last good copy if the file is mid-edit
+            if self._last_good is None:
+                return {"categories": [], "venues": []}
+        return self._last_good
+
+    def transaction(self):
+        return self._locked()
+
+    def load(self):
+        with self._locked():
+            data = self._read_file()
+            self._signature = self._file_signature()
+            self._journal_ino, self._journal_size = None, 0
+            records = []
+            try:
+                with open(self.journal_path, 'r+b') as f:
+                    self._journal_ino = os.fstat(f.fileno()).st_ino
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            # A torn final line (crash mid-append) is cut off, so the
+                            # next append doesn't get glued onto it and lost too
+                            f.truncate(self._journal_size)
+                            print(f"[Store] Dropped a torn record at the end of {self.journal_path}")
+                            break
+                        self._journal_size += len(line)
+                        try:
+                            records.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+            except FileNotFoundError:
+                pass
+        return data, records
+
+    def changed(self):
+        return (self._file_signature() != self._signature
+                or self._journal_signature() != (self._journal_ino, self._journal_size))
+
+    def write(self, record, result, entry):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with self._locked():
+            fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+                self._journal_ino = os.fstat(fd).st_ino
+            finally:
+                os.close(fd)
+            self._journal_size += len(line)
+        if self._journal_size > JOURNAL_COMPACT_BYTES and not self._compacting and self.store:
+            self._compacting = True
+            threading.Thread(target=self.compact, args=(self.store,), daemon=True).start()
+
+    def replace(self, data):
+        with self._locked():
+            self._write_snapshot(json.dumps(data, indent=2))
+            self._truncate_journal()
+
+    def _truncate_journal(self, keep=b'', applied=0):
+        """Start the journal over with keep, of which the first applied bytes are in the document"""
+        if keep:
+            os.replace(write_temp_file(self.journal_path, keep), self.journal_path)
+        elif os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        # changed() then reports any kept records beyond those, and they are replayed
+        self._journal_ino, self._journal_size = self._journal_signature()[0], applied
+
+    def _write_snapshot(self, text):
+        os.replace(write_temp_file(self.path, text), self.path)
+        self._signature = self._file_signature()
+
+    def compact(self, store):
+        """Fold the journal into a fresh data.json snapshot"""
+        try:
+            # Serialize under the lock so the snapshot is consistent, then
+            # write it out without blocking writers
+            with store.lock:
+                if store._data is None or self._journal_size == 0:
+                    return
+                # The document holds data.json plus exactly the first
+                # folded bytes of this journal file
+                snapshot = json.dumps(store._data, indent=2)
+                signature, journal, folded = self._signature, self._journal_ino, self._journal_size
+
+            tmp_path = write_temp_file(self.path, snapshot)
+
+            with store.lock, self._locked():
+                if self._file_signature() != signature or self._journal_signature()[0] != journal:
+                    # Another process compacted or replaced the data meanwhile
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.path)
+                self._signature = self._file_signature()
+                # Keep whatever was appended (here or elsewhere) since the snapshot
+                with open(self.journal_path, 'rb') as f:
+                    f.seek(folded)
+                    tail = f.read()
+                self._truncate_journal(tail, self._journal_size - folded)
+            print(f"[Store] Compacted journal into {self.path}")
+        except Exception as e:
+            print(f"[Store] Journal compaction failed: {e}")
+        finally:
+            self._compacting = False
+
+class SqliteStorage(Storage):
+    """SQLite database in WAL mode, one row per entity
+
+    Each entity kind has its own table (named like its document key, e.g.
+    'maps') with the entity's id, its parent's id, its position among its
+    siblings and its remaining fields as JSON; child lists live in their
+    own table instead. Other top-level keys (e.g. landingPage) are rows
+    of the 'document' table. Every mutation is one transaction touching
+    only the rows of the entity concerned (and its children), so a
+    location edit no longer rewrites the whole document.
+
+    A new database is seeded from seed_path (data.json) if it exists.
+    Commits by other processes are noticed through PRAGMA data_version.
+    """
+
+    def __init__(self, path, seed_path=None):
+        self.path = path
+        self.seed_path = seed_path
+        self._db = None
+        self._data_version = None
+        self._transaction_depth = 0
+
+    def __str__(self):
+        return self.path
+
+    @contextmanager
+    def transaction(self):
+        """One write transaction (BEGIN IMMEDIATE), joined by nested calls"""
+        db = self._connect()
+        if self._transaction_depth == 0:
+            db.execute('BEGIN IMMEDIATE')
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                db.rollback()
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            db.commit()
+
+    def _connect(self):
+        if self._db is not None:
+            return self._db
+        created = not os.path.exists(self.path)
+        db = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+        db.execute('PRAGMA journal_mode=WAL')
+        with db:
+            for kind, (parent_kind, table) in ENTITY_LAYOUT.items():
+                db.execute(f'CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, parent_id TEXT, '
+                           f'position INTEGER NOT NULL, body TEXT NOT NULL)')
+                db.execute(f'CREATE INDEX IF NOT EXISTS {table}_parent ON {table} (parent_id, position)')
+            db.execute('CREATE TABLE IF NOT EXISTS document (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        self._db = db
+        if created and self.seed_path and os.path.exists(self.seed_path):
+            with open(self.seed_path, 'r') as f:
+                self.replace(json.load(f))
+            print(f"[Store] Created {self.path} from {self.seed_path}")
+        return db
+
+    def _version(self):
+        return self._db.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self):
+        db = self._connect()
+        data = {}
+        by_parent = {}  # (kind, parent id) -> children in order
+        for kind, (parent_kind, table) in ENTITY_LAYOUT.items():
+            rows = db.execute(f'SELECT id, parent_id, body FROM {table} ORDER BY parent_id, position')
+            for entity_id, parent_id, body in rows:
+                entity = {**json.loads(body), 'id': entity_id}
+                by_parent.setdefault((kind, parent_id), []).append(entity)
+            if parent_kind is None:
+                data[table] = by_parent.get((kind, None), [])
+        # Hang every child list under its parent
+        for kind, child_kind in ENTITY_CHILDREN.items():
+            key = ENTITY_LAYOUT[child_kind][1]
+            for (entity_kind, _), entities in by_parent.items():
+                if entity_kind == kind:
+                    for entity in entities:
+                        entity[key] = by_parent.get((child_kind, entity['id']), [])
+        for key, value in db.execute('SELECT key, value FROM document'):
+            data[key] = json.loads(value)
+        self._data_version = self._version()
+        return data, []
+
+    def changed(self):
+        return self._db is not None and self._version() != self._data_version
+
+    def _insert(self, kind, entity, parent_id, position):
+        """Insert the rows of an entity and its children"""
+        if 'id' not in entity:
+            raise ValueError(f"Every {kind} needs an id")
+        child_kind = ENTITY_CHILDREN.get(kind)
+        child_key = ENTITY_LAYOUT[child_kind][1] if child_kind else None
+        body = {key: value for key, value in entity.items() if key not in ('id', child_key)}
+        self._db.execute(f'INSERT INTO {ENTITY_LAYOUT[kind][1]} (id, parent_id, position, body) VALUES (?, ?, ?, ?)',
+                         (entity['id'], parent_id, position, json.dumps(body, separators=(',', ':'))))
+        if child_kind:
+            for child_position, child in enumerate(entity.get(child_key, [])):
+                self._insert(child_kind, child, entity['id'], child_position)
+
+    def _remove(self, kind, entity_id):
+        """Delete the rows of an entity and its children, closing the gap it leaves"""
+        table = ENTITY_LAYOUT[kind][1]
+        row = self._db.execute(f'SELECT parent_id, position FROM {table} WHERE id = ?', (entity_id,)).fetchone()
+        if row is None:
+            return
+        child_kind = ENTITY_CHILDREN.get(kind)
+        if child_kind:
+            children = self._db.execute(f'SELECT id FROM {ENTITY_LAYOUT[child_kind][1]} WHERE parent_id = ?',
+                                        (entity_id,)).fetchall()
+            for (child_id,) in children:
+                self._remove(child_kind, child_id)
+        self._db.execute(f'DELETE FROM {table} WHERE id = ?', (entity_id,))
+        self._db.execute(f'UPDATE {table} SET position = position - 1 WHERE parent_id IS ? AND position > ?', row)
+
+    def write(self, record, result, entry):
+        db = self._connect()
+        with self.transaction():
+            if record['op'] == 'batch':
+                for sub, sub_result, sub_entry in zip(record['records'], result, entry):
+                    if sub_result is not None:
+                        self.write(sub, sub_result, sub_entry)
+            elif record['op'] == 'set':
+                db.execute('INSERT OR REPLACE INTO document (key, value) VALUES (?, ?)',
+                           (record['key'], json.dumps(record['value'], separators=(',', ':'))))
+            elif record['op'] == 'delete':
+                self._remove(record['kind'], record['id'])
+            else:
+                # Inserts and updates rewrite the entity's rows in place
+                kind = record['kind']
+                parents, position = entry
+                parent_id = parents[-1] if parents else None
+                self._remove(kind, result['id'])
+                db.execute(f'UPDATE {ENTITY_LAYOUT[kind][1]} SET position = position + 1 '
+                           f'WHERE parent_id IS ? AND position >= ?', (parent_id, position))
+                self._insert(kind, result, parent_id, position)
+        self._data_version = self._version()
+
+    def replace(self, data):
+        db = self._connect()
+        with self.transaction():
+            for parent_kind, table in ENTITY_LAYOUT.values():
+                db.execute(f'DELETE FROM {table}')
+            db.execute('DELETE FROM document')
+            for kind, (parent_kind, key) in ENTITY_LAYOUT.items():
+                if parent_kind is None:
+                    for position, entity in enumerate(data.get(key, [])):
+                        self._insert(kind, entity, None, position)
+            for key, value in data.items():
+                if key not in ENTITY_ROOT_KEYS:
+                    db.execute('INSERT INTO document (key, value) VALUES (?, ?)',
+                               (key, json.dumps(value, separators=(',', ':'))))
+        self._data_version = self._version()
+
+    def compact(self, store):
+        """Checkpoint the WAL back into the database file"""
+        with store.lock:
+            if self._db is not None:
+                self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+STORAGE_BACKENDS = {
+    'json': lambda: JsonStorage(DATA_FILE, JOURNAL_FILE),
+    'sqlite': lambda: SqliteStorage(SQLITE_FILE, DATA_FILE),
+}
+
+class DataStore:
+    """Process-resident copy of the venue document
+
+    Reads are served from memory. The storage backend is only asked
+    whether the stored copy changed elsewhere at most every
+    DATA_RELOAD_INTERVAL seconds, and the document reloaded if so.
+
+    An index maps every entity id to its parent id chain and its position
+    in the containing list, so nested lookups don't walk the document.
+    Use insert()/update()/delete() to mutate entities; they keep the
+    index in sync, and each is handed to the storage backend as a compact
+    mutation record.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        storage.store = self
+        self.lock = threading.RLock()
+        self._data = None
+        self._checked_at = 0.0
+        self._index = {kind: {} for kind in ENTITY_LAYOUT}
+        self._listeners = []
+        self._compact_at_exit = False
+        # Bumped on every change; epoch tells versions of different runs apart
+        self.version = 0
+        self.modified_at = time.time()
+        self.epoch = secrets.token_hex(4)
+
+    def _set_data(self, data):
+        self._data = data
+        self._rebuild_index()
+
+    def _load(self):
+        """Load the stored document and replay any pending records over it"""
+        if _pool_worker:
+            raise RuntimeError("The data store is only available in the server process")
+        if not self._compact_at_exit:
+            # Registered here rather than at import, so only a process that
+            # actually uses the store (never a pool worker) compacts it
+            atexit.register(self.compact)
+            self._compact_at_exit = True
+        data, records = self.storage.load()
+        self._set_data(data)
+        for record in records:
+            self._apply(record)
+        if records:
+            print(f"[Store] Replayed {len(records)} journal records")
+        self._notify({'op': 'reset', 'kind': None, 'id': None, 'before': None, 'after': self._data})
+
+    def get(self):
+        """Return the in-memory document, reloading it if the stored copy changed elsewhere"""
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < DATA_RELOAD_INTERVAL:
+            return self._data
+
+        with self.lock:
+            self._checked_at = now
+            if self._data is None:
+                self._load()
+            elif self.storage.changed():
+                print(f"[Store] {self.storage} changed elsewhere, reloading")
+                self._load()
+            return self._data
+
+    def snapshot(self):
+        """Return a deep copy of the document, safe to use outside the lock"""
+        with self.lock:
+            return json.loads(json.dumps(self.get()))
+
+    def save(self, data):
+        """Replace the whole document and store it"""
+        with self.lock:
+            self.storage.replace(data)
+            self._set_data(data)
+            self._checked_at = time.monotonic()
+            self._notify({'op': 'reset', 'kind': None, 'id': None, 'before': None, 'after': data})
+
+    # Versions
+    def version_token(self, version=None):
+        """A data version as sent to clients, e.g. '1a2b3c4d-42'"""
+        return f"{self.epoch}-{self.version if version is None else version}"
+
+    def parse_version(self, token):
+        """The version number in a token from this run, or None"""
+        epoch, _, number = (token or '').rpartition('-')
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+    # Change listeners
+    def subscribe(self, listener):
+        """Call listener(event) after every change, under the store lock
+
+        event has op ('insert', 'update', 'delete', 'set' or 'reset'), kind,
+        id, and the entity before and after the change (None where it
+        didn't exist). A 'set' has kind 'document' and the key as id. A
+        'reset' carries the whole new document as 'after' and is sent
+        whenever the document is (re)loaded or replaced.
+        """
+        with self.lock:
+            self._listeners.append(listener)
+            if self._data is not None:
+                listener({'op': 'reset', 'kind': None, 'id': None, 'before': None, 'after': self._data})
+
+    def _notify(self, *events):
+        """Send the events of one change (one new version) to every listener"""
+        self.version += 1
+        self.modified_at = time.time()
+        for listener in self._listeners:
+            for event in events:
+                try:
+                    listener(event)
+                except Exception as e:
+                    print(f"[Store] Change listener failed: {e}")
+
+    # Index maintenance
+    def _rebuild_index(self):
+        self._index = {kind: {} for kind in ENTITY_LAYOUT}
+        for kind, (parent_kind, key) in ENTITY_LAYOUT.items():
+            if parent_kind is None:
+                self._index_list(kind, self._data.get(key, []), ())
+
+    def _index_list(self, kind, items, parents):
+        for position, item in enumerate(items):
+            self._index_entity(kind, item, parents, position)
+
+    def _index_entity(self, kind, entity, parents, position):
+        if 'id' not in entity:
+            return
+        self._index[kind][entity['id']] = [parents, position]
+        child_kind = ENTITY_CHILDREN.get(kind)
+        if child_kind:
+            key = ENTITY_LAYOUT[child_kind][1]
+            self._index_list(child_kind, entity.get(key, []), parents + (entity['id'],))
+
+    def _unindex_entity(self, kind, entity):
+        self._index[kind].pop(entity.get('id'), None)
+        child_kind = ENTITY_CHILDREN.get(kind)
+        if child_kind:
+            for child in entity.get(ENTITY_LAYOUT[child_kind][1], []):
+                self._unindex_entity(child_kind, child)
+
+    def _container(self, kind, parents, create=False):
+        """Return the list that holds entities of kind under the given parents"""
+        parent_kind, key = ENTITY_LAYOUT[kind]
+        if parent_kind is None:
+            owner = self._data
+        else:
+            owner = self._lookup(parent_kind, parents[-1], parents[:-1])
+            if owner is None:
+                return None
+        if create and key not in owner:
+            owner[key] = []
+        return owner.get(key)
+
+    def _lookup(self, kind, entity_id, parents=None):
+        entry = self._index[kind].get(entity_id)
+        if entry is None or (parents is not None and tuple(parents) != entry[0]):
+            return None
+        container = self._container(kind, entry[0])
+        return container[entry[1]]
+
+    # Lookups
+    def find(self, kind, entity_id, parents=None):
+        """Return the entity with this id, or None
+
+        If parents is given (e.g. (venue_id, map_id) for a location), the
+        entity must live under exactly those parents.
+        """
+        with self.lock:
+            self.get()
+            return self._lookup(kind, entity_id, parents)
+
+    def parents_of(self, kind, entity_id):
+        """Return the parent id chain of an entity, or None if it doesn't exist"""
+        with self.lock:
+            self.get()
+            entry = self._index[kind].get(entity_id)
+            return entry[0] if entry else None
+
+    # Mutations
+    def insert(self, kind, entity, parents=()):
+        """Append an entity under its parents. Returns None if a parent is missing."""
+        return self._mutate({'op': 'insert', 'kind': kind, 'parents': list(parents), 'entity': entity})
+
+    def update(self, kind, entity_id, fields, parents=None):
+        """Merge fields into an entity. Returns the updated entity or None."""
+        with self.lock:
+            self.get()
+            entry = self._index[kind].get(entity_id)
+            if entry is None or (parents is not None and tuple(parents) != entry[0]):
+                return None
+            return self._mutate({'op': 'update', 'kind': kind, 'id': entity_id, 'fields': fields})
+
+    def set(self, key, value):
+        """Replace a top-level document key that doesn't hold entities (e.g. 'landingPage')"""
+        if key in ENTITY_ROOT_KEYS:
+            raise ValueError(f"{key} holds entities; change them individually")
+        return self._mutate({'op': 'set', 'key': key, 'value': value})
+
+    def delete(self, kind, entity_id, parents=None):
+        """Remove an entity (and its children). Returns the removed entity or None."""
+        with self.lock:
+            self.get()
+            entry = self._index[kind].get(entity_id)
+            if entry is None or (parents is not None and tuple(parents) != entry[0]):
+                return None
+            return self._mutate({'op': 'delete', 'kind': kind, 'id': entity_id})
+
+    def batch(self, records):
+        """Apply several insert/update/delete/set records as one mutation
+
+        They are stored together (one journal line, one SQLite transaction)
+        as one new version; listeners get an event per record. Returns each
+        record's result, as insert(), update(), delete() and set() would.
+        """
+        return self._mutate({'op': 'batch', 'records': records})
+
+    def _mutate(self, record):
+        with self.lock, self.storage.transaction():
+            # Apply on top of whatever other processes stored, with no
+            # write of theirs able to slip in before ours
+            if self._data is None or self.storage.changed():
+                if self._data is not None:
+                    print(f"[Store] {self.storage} changed elsewhere, reloading")
+                self._load()
+            self._checked_at = time.monotonic()
+            if record['op'] == 'batch':
+                changes = [self._change(sub) for sub in record['records']]
+                results = [result for _, result, _ in changes]
+                events = [event for event, result, _ in changes if result is not None]
+                if events:
+                    self.storage.write(record, results, [entry for _, _, entry in changes])
+                    self._notify(*events)
+                return results
+            event, result, entry = self._change(record)
+            if result is not None:
+                self.storage.write(record, result, entry)
+                self._notify(event)
+            return result
+
+    def _change(self, record):
+        """Apply one record; returns its change event, its result and the
+        [parents, position] entry the storage backend needs"""
+        if record['op'] == 'set':
+            kind, entity_id = 'document', record['key']
+            before = self._data.get(entity_id)
+        else:
+            kind = record['kind']
+            entity_id = record['entity']['id'] if record['op'] == 'insert' else record['id']
+            before = self._lookup(kind, entity_id)
+        entry = self._index[kind].get(entity_id) if record['op'] == 'delete' else None
+        entry = entry and [entry[0], entry[1]]
+        result = self._apply(record)
+        if result is not None and record['op'] in ('insert', 'update'):
+            entry = self._index[kind].get(entity_id)
+            entry = [entry[0], entry[1]]
+        event = {
+            'op': record['op'],
+            'kind': kind,
+            'id': entity_id,
+            'before': before,
+            'after': None if record['op'] == 'delete' else result,
+        }
+        return event, result, entry
+
+    def _apply(self, record):
+        """Apply a mutation record to the in-memory document
+
+        Records are idempotent: inserting an id that already exists
+        replaces it in place, and updating or deleting a missing id is
+        a no-op. That's what makes replaying the journal over a snapshot
+        that already contains some of it safe.
+        """
+        op = record['op']
+        if op == 'batch':
+            return [self._apply(sub) for sub in record['records']]
+        if op == 'set':
+            self._data[record['key']] = record['value']
+            return record['value']
+        kind = record['kind']
+        if op == 'insert':
+            entity = record['entity']
+            parents = tuple(record.get('parents', []))
+            entry = self._index[kind].get(entity['id'])
+            if entry is not None and entry[0] == parents:
+                container = self._container(kind, parents)
+                self._unindex_entity(kind, container[entry[1]])
+                container[entry[1]] = entity
+                self._index_entity(kind, entity, parents, entry[1])
+                return entity
+            if entry is not None:
+                self._apply({'op': 'delete', 'kind': kind, 'id': entity['id']})
+            container = self._container(kind, parents, create=True)
+            if container is None:
+                return None
+            container.append(entity)
+            self._index_entity(kind, entity, parents, len(container) - 1)
+            return entity
+
+        entry = self._index[kind].get(record['id'])
+        if entry is None:
+            return None
+        container = self._container(kind, entry[0])
+        if op == 'update':
+            old = container[entry[1]]
+            updated = {**old, **record['fields'], 'id': record['id']}
+            container[entry[1]] = updated
+            # Children may have been replaced wholesale by the update
+            self._unindex_entity(kind, old)
+            self._index_entity(kind, updated, entry[0], entry[1])
+            return updated
+        if op == 'delete':
+            removed = container.pop(entry[1])
+            self._unindex_entity(kind, removed)
+            # Shift the positions of later siblings
+            for sibling in container[entry[1]:]:
+                if 'id' in sibling:
+                    self._index[kind][sibling['id']][1] -= 1
+            return removed
+        return None
+
+    def compact(self):
+        """Let the storage backend fold pending writes into its main copy"""
+        self.storage.compact(self)
+
+data_store = DataStore(STORAGE_BACKENDS[STORAGE_BACKEND]())
+
 def load_data():
-    """Load data from JSON file"""
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {"categories": [], "venues": []}
-    except json.JSONDecodeError:
-        return {"categories": [], "venues": []}
+    """Load data (served from the in-memory store)"""
+    return data_store.get()
 
 def save_data(data):
-    """Save data to JSON file"""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Replace the whole document (written through the storage backend)"""
+    data_store.save(data)
+
+@app.cli.command('export-data')
+@click.argument('path', default=DATA_FILE)
+def export_data_command(path):
+    """Write the venue document to PATH in data.json format."""
+    write_json_atomic(path, data_store.snapshot())
+    click.echo(f"Exported {data_store.storage} to {path}")
+
+@app.cli.command('import-data')
+@click.argument('path', default=DATA_FILE)
+def import_data_command(path):
+    """Replace the venue document with the contents of a data.json-format file."""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        save_data(data)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {path} into {data_store.storage}")
+
+_json_cache = {'version': None, 'bodies': {}}  # Serialized read responses for one data version
+
+def versioned_json(key, build):
+    """JSON response for the current data version, serialized once per version
+
+    The version is sent as the ETag (with Last-Modified), so a client
+    polling with If-None-Match gets a 304 until something changes.
+    """
+    with data_store.lock:
+        data_store.get()
+        version = data_store.version
+        if _json_cache['version'] != version:
+            _json_cache['version'] = version
+            _json_cache['bodies'] = {}
+        body = _json_cache['bodies'].get(key)
+        if body is None:
+            body = app.json.response(build()).get_data()
+            _json_cache['bodies'][key] = body
+        etag = data_store.version_token(version)
+        modified_at = data_store.modified_at
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.last_modified = modified_at
+    response.cache_control.no_cache = True
+    return encode_response(response, (key, etag)).make_conditional(request)
+
+# Admin sessions
+class SessionStore(abc.ABC):
+    """Admin login sessions
+
+    Sessions are keyed by the SHA-256 digest of their token, so lookups
+    compare digests rather than the secret itself (their timing tells an
+    attacker nothing about the token) and the store holds no usable
+    tokens. Expired sessions are refused by check() and deleted by
+    sweep(), which a background thread runs every SESSION_SWEEP_INTERVAL
+    seconds once the store is in use.
+    """
+
+    def __init__(self):
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def create(self):
+        """Start a session and return its token"""
+        self._start_sweeper()
+        token = secrets.token_hex(32)
+        now = time.time()
+        self._put(self._key(token), now, now + SESSION_LIFETIME)
+        return token
+
+    def check(self, token):
+        """'valid', 'expired' or None for an unknown token"""
+        if not token:
+            return None
+        self._start_sweeper()
+        expires = self._expires(self._key(token))
+        if expires is None:
+            return None
+        return 'valid' if expires > time.time() else 'expired'
+
+    def revoke(self, token):
+        if token:
+            self._delete(self._key(token))
+
+    def sweep(self):
+        """Delete expired sessions; returns how many"""
+        return self._delete_expired(time.time())
+
+    def _start_sweeper(self):
+        # Started on first use rather than at import, so it runs in each worker
+        if self._sweeper is not None:
+            return
+        with self._sweeper_lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._run_sweeper, daemon=True)
+                self._sweeper.start()
+
+    def _run_sweeper(self):
+        while True:
+            time.sleep(SESSION_SWEEP_INTERVAL)
+            try:
+                removed = self.sweep()
+                if removed:
+                    print(f"[Sessions] Swept {removed} expired sessions")
+            except Exception as e:
+                print(f"[Sessions] Sweep failed: {e}")
+
+    @abc.abstractmethod
+    def _put(self, key, created, expires):
+        """Store a session"""
+
+    @abc.abstractmethod
+    def _expires(self, key):
+        """A session's expiry time, or None if there is no such session"""
+
+    @abc.abstractmethod
+    def _delete(self, key):
+        """Remove a session if it exists"""
+
+    @abc.abstractmethod
+    def _delete_expired(self, now):
+        """Remove sessions expired by now; returns how many"""
+
+class MemorySessionStore(SessionStore):
+    """Sessions in a dict; only valid within one worker process"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self._sessions = {}  # key -> (created, expires)
+
+    def _put(self, key, created, expires):
+        with self.lock:
+            self._sessions[key] = (created, expires)
+
+    def _expires(self, key):
+        session = self._sessions.get(key)
+        return session[1] if session else None
+
+    def _delete(self, key):
+        with self.lock:
+            self._sessions.pop(key, None)
+
+    def _delete_expired(self, now):
+        with self.lock:
+            expired = [key for key, (created, expires) in self._sessions.items() if expires <= now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+class SqliteSessionStore(SessionStore):
+    """Sessions in a SQLite database (WAL mode) shared by all workers
+
+    Each thread gets its own connection. A check is one primary key
+    lookup, and WAL keeps readers from waiting on a login being written.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute('PRAGMA journal_mode=WAL')
+            with db:
+                db.execute('CREATE TABLE IF NOT EXISTS sessions '
+                           '(key TEXT PRIMARY KEY, created REAL NOT NULL, expires REAL NOT NULL)')
+                db.execute('CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)')
+            self._local.db = db
+        return db
+
+    def _put(self, key, created, expires):
+        with self._db() as db:
+            db.execute('INSERT OR REPLACE INTO sessions (key, created, expires) VALUES (?, ?, ?)',
+                       (key, created, expires))
+
+    def _expires(self, key):
+        row = self._db().execute('SELECT expires FROM sessions WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _delete(self, key):
+        with self._db() as db:
+            db.execute('DELETE FROM sessions WHERE key = ?', (key,))
+
+    def _delete_expired(self, now):
+        with self._db() as db:
+            return db.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+
+SESSION_STORES = {
+    'memory': MemorySessionStore,
+    'sqlite': lambda: SqliteSessionStore(SESSIONS_FILE),
+}
+
+sessions = SESSION_STORES[SESSION_STORE]()
+
+def request_token():
+    """Bearer token of the current request ('' if none)"""
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
 
 def require_auth(f):
     """Decorator to require authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token or token not in sessions:
+        status = sessions.check(request_token())
+        if status is None:
             return jsonify({"error": "Unauthorized"}), 401
-        # Check if session is expired (24 hours)
-        if sessions[token]['expires'] < datetime.now():
-            del sessions[token]
+        if status == 'expired':
             return jsonify({"error": "Session expired"}), 401
         return f(*args, **kwargs)
     return decorated
@@ -131,26 +1578,774 @@ def delete_image_file(image_path):
     else:
         filepath = image_path
 
-    # Make sure we're only deleting from uploads folder
-    if os.path.exists(filepath) and 'uploads' in filepath:
+    # Content may be shared, so keep it while anything still references it
+    photo_requests.load()  # Pending requests' photos count too
+    # Checked and removed under the lock new references and uploads take,
+    # so an identical upload can't be handed this file as it goes
+    with image_refs.lock:
+        if image_refs.in_use(image_path):
+            print(f"[Cleanup] Kept (still referenced): {filepath}")
+            return
+
+        # Make sure we're only deleting from uploads folder
+        if os.path.exists(filepath) and 'uploads' in filepath:
+            try:
+                os.remove(filepath)
+                shutil.rmtree(variant_dir(filepath), ignore_errors=True)
+                print(f"[Cleanup] Deleted: {filepath}")
+            except Exception as e:
+                print(f"[Cleanup] Failed to delete {filepath}: {e}")
+
+def entity_image_paths(kind, entity):
+    """Image paths used by an entity and its children"""
+    if kind == 'venue':
+        return [path for m in entity.get('maps', []) for path in entity_image_paths('map', m)]
+    if kind == 'photoRequest':
+        # Once resolved, a request's photo is either on its location or deleted
+        pending = entity.get('status', 'pending') == 'pending'
+        return [entity['uploadedPhoto']] if pending and entity.get('uploadedPhoto') else []
+    if kind not in ('map', 'location'):
+        return []
+    paths = [entity.get('image', '')]
+    if kind == 'map':
+        paths += [loc.get('image', '') for loc in entity.get('locations', [])]
+    return [path for path in paths if path]
+
+def referenced_image_paths(data, unique=True):
+    """Every image path referenced by maps, locations and photo requests"""
+    paths = []
+    for venue in data.get('venues', []):
+        paths += entity_image_paths('venue', venue)
+    for photo_request in data.get('photoRequests', []):
+        paths += entity_image_paths('photoRequest', photo_request)
+    return list(dict.fromkeys(paths)) if unique else paths
+
+def delete_entity_images(kind, entity):
+    """Delete the images of a removed venue, map or location and its children"""
+    for path in entity_image_paths(kind, entity):
+        delete_image_file(path)
+
+# Content-addressed upload storage
+def blob_path(digest, ext):
+    """Upload path for content with this sha256 digest"""
+    return f"uploads/blobs/{digest[:2]}/{digest[2:4]}/{digest}.{ext}"
+
+class UploadRejected(ValueError):
+    """An uploaded file that isn't one of the accepted image types"""
+
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+IMAGE_HEADER_SIZE = 12  # Bytes sniff_image_type() needs to see (WebP's RIFF....WEBP)
+
+def sniff_image_type(head):
+    """Extension of the image type a file's first bytes belong to, or None"""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def store_upload(file, max_size=MAX_CONTENT_LENGTH):
+    """Save an uploaded file under its content hash and return its path"""
+    return store_stream(file.stream, max_size)
+
+def store_stream(stream, max_size):
+    """Stream an upload into blob storage and return its path
+
+    The content is hashed while it is copied to a temp file in
+    UPLOAD_CHUNK_SIZE pieces. Its type comes from its magic bytes, not the
+    client's filename; anything but PNG, JPEG, GIF or WebP raises
+    UploadRejected and more than max_size bytes RequestEntityTooLarge. If
+    a blob with the same content already exists, the copy is discarded
+    and the existing path returned, so identical images are stored once.
+    """
+    os.makedirs(BLOB_FOLDER, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload-', dir=BLOB_FOLDER)
+    digest = hashlib.sha256()
+    ext = None
+    head = b''
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if ext is None:
+                    # Reads can come back short; sniff once the whole header is in
+                    head += chunk[:IMAGE_HEADER_SIZE - len(head)]
+                    if head and (len(head) == IMAGE_HEADER_SIZE or not chunk):
+                        ext = sniff_image_type(head)
+                        if ext is None:
+                            raise UploadRejected("File is not a PNG, JPEG, GIF or WebP image")
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise RequestEntityTooLarge()
+                digest.update(chunk)
+                out.write(chunk)
+        if ext is None:
+            raise UploadRejected("File is empty")
+        path = blob_path(digest.hexdigest(), ext)
+        with image_refs.lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            image_refs.pin(path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+class ImageRefs:
+    """Reference counts of the image paths used in the venue data
+
+    Kept current by listeners on the data store and the photo request
+    store (counted separately, as each resets on its own), so
+    delete_image_file() can tell whether some other map, location or
+    photo request still uses a file. A freshly stored upload is pinned
+    until something references it (or UPLOAD_PIN_SECONDS pass), so the
+    copy an upload was deduplicated against isn't deleted before the
+    client gets to use it.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._counts = {}  # source -> {path: count}
+        self._pinned = {}  # path -> monotonic time the pin runs out
+
+    def count(self, path):
+        return sum(counts.get(path, 0) for counts in self._counts.values())
+
+    def pin(self, path):
+        """Keep a just-stored upload until it is referenced (call under the lock)"""
+        now = time.monotonic()
+        for expired in [p for p, until in self._pinned.items() if until <= now]:
+            del self._pinned[expired]
+        self._pinned[path] = now + UPLOAD_PIN_SECONDS
+
+    def in_use(self, path):
+        """Whether path is referenced or pinned (call under the lock)"""
+        if self.count(path):
+            return True
+        if self._pinned.get(path, 0) > time.monotonic():
+            return True
+        self._pinned.pop(path, None)
+        return False
+
+    def _add(self, counts, paths, delta):
+        for path in paths:
+            count = counts.get(path, 0) + delta
+            if count > 0:
+                counts[path] = count
+                self._pinned.pop(path, None)
+            else:
+                counts.pop(path, None)
+
+    def handle(self, source, event):
+        with self.lock:
+            counts = self._counts.setdefault(source, {})
+            if event['op'] == 'reset':
+                counts.clear()
+                self._add(counts, referenced_image_paths(event['after'], unique=False), 1)
+                return
+            if event['before'] is not None:
+                self._add(counts, entity_image_paths(event['kind'], event['before']), -1)
+            if event['after'] is not None:
+                self._add(counts, entity_image_paths(event['kind'], event['after']), 1)
+
+image_refs = ImageRefs()
+data_store.subscribe(partial(image_refs.handle, 'document'))
+
+# Photo requests
+class PhotoRequestStore:
+    """Visitor photo requests, kept out of data.json
+
+    Anyone can submit a request, so they don't go through the venue
+    document and its journal. Each request is a line in an append-only
+    JSON-lines log: 'put' records hold a whole request and 'update'
+    records a change of fields (e.g. its status). The log is replayed
+    into memory on first use and indexed by id and by status. When
+    superseded lines outnumber live requests the log is rewritten from
+    memory, leaving out requests resolved more than
+    PHOTO_REQUEST_RETENTION_DAYS ago.
+
+    Every server process appends to the same log, under a file lock.
+    Like JsonStorage's journal, each process tracks which log file
+    (inode) it has applied and how much of it: lines appended elsewhere
+    are applied before every write and, at most every
+    DATA_RELOAD_INTERVAL seconds, before reads; a log rewritten elsewhere
+    is reloaded.
+
+    Requests still in data.json's photoRequests array are moved into the
+    log on first load, then the key is removed from the document. So is a
+    log still at moved_from, its old place in the served app root.
+    """
+
+    def __init__(self, path, data_store, moved_from=None):
+        self.path = path
+        self.data_store = data_store
+        self.moved_from = moved_from
+        self.lock = threading.RLock()
+        self._requests = None  # id -> request, oldest first
+        self._by_status = {}  # status -> {id: None}, oldest first
+        self._lines = 0
+        self._ino = None  # Log file whose first _size bytes are applied
+        self._size = 0
+        self._checked_at = 0.0
+        self._listeners = []
+        # Bumped on every change, like DataStore's
+        self.version = 0
+        self.modified_at = time.time()
+        self.epoch = secrets.token_hex(4)
+
+    def _locked(self):
+        """The log's file lock (its folder is made first)"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        return file_lock(self.path)
+
+    def _log_signature(self):
         try:
-            os.remove(filepath)
-            print(f"[Cleanup] Deleted: {filepath}")
-        except Exception as e:
-            print(f"[Cleanup] Failed to delete {filepath}: {e}")
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, 0
+        return st.st_ino, st.st_size
+
+    def _read(self, offset):
+        """Records in the log after offset (call under the file lock)"""
+        records = []
+        try:
+            with open(self.path, 'r+b') as f:
+                self._ino = os.fstat(f.fileno()).st_ino
+                f.seek(offset)
+                size = offset
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # A torn final line (crash mid-append) is cut off so the
+                        # next append starts on a line of its own
+                        f.truncate(size)
+                        print(f"[PhotoRequests] Dropped a torn record at the end of {self.path}")
+                        break
+                    size += len(line)
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        continue
+        except FileNotFoundError:
+            self._ino, size = None, 0
+        self._size = size
+        return records
+
+    def _load(self):
+        if _pool_worker:
+            raise RuntimeError("Photo requests are only available in the server process")
+        with self._locked():
+            if self.moved_from and os.path.exists(self.moved_from) and not os.path.exists(self.path):
+                os.replace(self.moved_from, self.path)
+                print(f"[PhotoRequests] Moved {self.moved_from} to {self.path}")
+            self._requests = {}
+            self._by_status = {status: {} for status in PHOTO_REQUEST_STATUSES}
+            records = self._read(0)
+            self._lines = len(records)
+            for record in records:
+                try:
+                    self._apply(record)
+                except KeyError:
+                    continue
+            self._migrate()
+        self._checked_at = time.monotonic()
+
+    def _migrate(self):
+        with self.data_store.lock:
+            data = self.data_store.get()
+            legacy = data.get('photoRequests')
+            if legacy is None:
+                return
+            moved = [r for r in legacy if r.get('id') and r['id'] not in self._requests]
+            for photo_request in moved:
+                self._write({'op': 'put', 'request': photo_request})
+            # The log is durable before the document loses its copy
+            self.data_store.save({key: value for key, value in data.items() if key != 'photoRequests'})
+        print(f"[PhotoRequests] Moved {len(moved)} requests out of {self.data_store.storage}")
+
+    def _refresh(self, force=False):
+        """Load the log on first use, then catch up with other processes' writes
+
+        Without force, the log is only looked at every DATA_RELOAD_INTERVAL.
+        """
+        if self._requests is None:
+            self._load()
+            self._notify(self._reset_event())
+            return
+        now = time.monotonic()
+        if not force and now - self._checked_at < DATA_RELOAD_INTERVAL:
+            return
+        self._checked_at = now
+        if self._log_signature() == (self._ino, self._size):
+            return
+        with self._locked():
+            ino, size = self._log_signature()
+            if ino is not None and ino == self._ino and size >= self._size:
+                # Appended elsewhere: apply just the new lines
+                for record in self._read(self._size):
+                    self._lines += 1
+                    try:
+                        before, after = self._apply(record)
+                    except KeyError:
+                        continue
+                    if after is not None:
+                        self._notify({'op': 'update' if before else 'insert', 'kind': 'photoRequest',
+                                      'id': after['id'], 'before': before, 'after': after})
+                return
+            # Rewritten (compacted) elsewhere
+            self._load()
+        self._notify(self._reset_event())
+
+    def load(self):
+        """Load the log now rather than on first use"""
+        with self.lock:
+            self._refresh()
+
+    def _reset_event(self):
+        return {'op': 'reset', 'kind': None, 'id': None, 'before': None,
+                'after': {'photoRequests': list(self._requests.values())}}
+
+    def _apply(self, record):
+        """Apply a log record; returns the request before and after it"""
+        if record['op'] == 'put':
+            after = record['request']
+            before = self._requests.get(after['id'])
+        else:
+            before = self._requests.get(record['id'])
+            if before is None:
+                return None, None
+            after = {**before, **record['fields'], 'id': record['id']}
+        if before is not None:
+            self._by_status.get(before.get('status'), {}).pop(before['id'], None)
+        self._requests[after['id']] = after
+        self._by_status.setdefault(after.get('status'), {})[after['id']] = None
+        return before, after
+
+    def _write(self, record):
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with self._locked():
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                os.fsync(fd)
+                self._ino = os.fstat(fd).st_ino
+            finally:
+                os.close(fd)
+            self._size += len(line)
+        self._lines += 1
+        return self._apply(record)
+
+    def _mutate(self, record):
+        with self.lock, self._locked():
+            self._refresh(force=True)
+            before, after = self._write(record)
+            if after is not None:
+                self._notify({'op': 'update' if before else 'insert', 'kind': 'photoRequest',
+                              'id': after['id'], 'before': before, 'after': after})
+            if self._lines > 2 * len(self._requests) + 100:
+                self.compact()
+            return after
+
+    def compact(self):
+        """Rewrite the log with one line per live request"""
+        with self.lock, self._locked():
+            self._refresh(force=True)
+            cutoff = (datetime.now() - timedelta(days=PHOTO_REQUEST_RETENTION_DAYS)).isoformat()
+            expired = [r['id'] for r in self._requests.values()
+                       if r.get('status') != 'pending' and (r.get('resolvedAt') or r.get('requestedAt', '')) < cutoff]
+            for request_id in expired:
+                removed = self._requests.pop(request_id)
+                self._by_status.get(removed.get('status'), {}).pop(request_id, None)
+            lines = [json.dumps({'op': 'put', 'request': r}, separators=(',', ':')) + '\n'
+                     for r in self._requests.values()]
+            os.replace(write_temp_file(self.path, ''.join(lines)), self.path)
+            self._lines = len(lines)
+            self._ino, self._size = self._log_signature()
+            if expired:
+                self.version += 1
+                self.modified_at = time.time()
+        print(f"[PhotoRequests] Compacted log ({len(expired)} expired requests dropped)")
+
+    # Change listeners
+    def subscribe(self, listener):
+        """Call listener(event) after every change, like DataStore.subscribe()
+
+        The 'reset' event sent once the log is loaded carries the requests
+        as a {'photoRequests': [...]} document.
+        """
+        with self.lock:
+            self._listeners.append(listener)
+            if self._requests is not None:
+                listener(self._reset_event())
+
+    def _notify(self, event):
+        self.version += 1
+        self.modified_at = time.time()
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                print(f"[PhotoRequests] Change listener failed: {e}")
+
+    def version_token(self):
+        """The current version as sent to clients in the ETag"""
+        return f"{self.epoch}-{self.version}"
+
+    # Reads
+    def find(self, request_id):
+        with self.lock:
+            self._refresh()
+            return self._requests.get(request_id)
+
+    def all(self):
+        with self.lock:
+            self._refresh()
+            return list(self._requests.values())
+
+    def query(self, status=None, filters=None, offset=0, limit=PHOTO_REQUEST_PAGE_SIZE):
+        """One page of requests, oldest first, and the total matching
+
+        status limits the results to one status (None for any); filters
+        maps request fields (e.g. venueId) to required values.
+        """
+        with self.lock:
+            self._refresh()
+            ids = self._by_status.get(status, {}) if status else self._requests
+            matches = (self._requests[request_id] for request_id in ids)
+            if filters:
+                matches = (r for r in matches if all(r.get(key) == value for key, value in filters.items()))
+            matches = list(matches)
+        return len(matches), matches[offset:offset + limit]
+
+    # Mutations
+    def insert(self, photo_request):
+        return self._mutate({'op': 'put', 'request': photo_request})
+
+    def update(self, request_id, fields):
+        """Merge fields into a request. Returns the updated request or None."""
+        with self.lock:
+            if self.find(request_id) is None:
+                return None
+            return self._mutate({'op': 'update', 'id': request_id, 'fields': fields})
+
+photo_requests = PhotoRequestStore(PHOTO_REQUESTS_FILE, data_store, LEGACY_PHOTO_REQUESTS_FILE)
+photo_requests.subscribe(partial(image_refs.handle, 'photoRequests'))
+
+# Compression
+# Text files are served gzip or brotli encoded when the client accepts it.
+# Generated pages get precompressed .gz/.br siblings when they are written;
+# anything else is compressed on the fly and kept in an LRU cache.
+CONTENT_ENCODINGS = {'br': '.br', 'gzip': '.gz'}  # In order of preference
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def available_encodings():
+    return [encoding for encoding in CONTENT_ENCODINGS if encoding != 'br' or brotli is not None]
+
+def is_compressible(filename):
+    return filename.rsplit('.', 1)[-1].lower() in COMPRESSIBLE_EXTENSIONS
+
+def write_compressed_siblings(path):
+    """Write path.gz and path.br next to a text file (or remove stale ones)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    for encoding, suffix in CONTENT_ENCODINGS.items():
+        if len(data) >= COMPRESS_MIN_SIZE and encoding in available_encodings():
+            write_text_atomic(path + suffix, compress(data, encoding))
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def negotiate_encoding():
+    """Best content encoding the client accepts, or None for identity"""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = request.accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class CompressionCache:
+    """Byte-bounded LRU of compressed response bodies"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.size = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, encoding, load):
+        """Compressed body for key, calling load() for the raw bytes on a miss"""
+        with self.lock:
+            body = self._entries.get((key, encoding))
+            if body is not None:
+                self._entries.move_to_end((key, encoding))
+                return body
+        body = compress(load(), encoding)
+        if len(body) <= self.capacity:
+            with self.lock:
+                if (key, encoding) not in self._entries:
+                    self._entries[(key, encoding)] = body
+                    self.size += len(body)
+                while self.size > self.capacity:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.size -= len(evicted)
+        return body
+
+compression_cache = CompressionCache(COMPRESSION_CACHE_BYTES)
+
+def encode_response(response, key):
+    """Compress an in-memory response body for the client, cached under key"""
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    encoding = negotiate_encoding()
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compression_cache.get(key, encoding, lambda: body))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def send_static_file(filename, etag=True):
+    """send_from_directory, encoded per Accept-Encoding for text files
+
+    A .gz/.br sibling at least as new as the file is sent as-is;
+    otherwise the file is compressed through the compression cache.
+    """
+    path = safe_join('.', filename)
+    if path is None or not is_compressible(filename) or not os.path.isfile(path):
+        return send_from_directory('.', filename, etag=etag)
+    stat = os.stat(path)
+    encoding = negotiate_encoding() if stat.st_size >= COMPRESS_MIN_SIZE else None
+    if encoding is None:
+        response = send_from_directory('.', filename, etag=etag)
+        response.vary.add('Accept-Encoding')
+        return response
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    tag = etag if isinstance(etag, str) else f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    sibling = path + CONTENT_ENCODINGS[encoding]
+    if os.path.isfile(sibling) and os.stat(sibling).st_mtime_ns >= stat.st_mtime_ns:
+        response = send_from_directory('.', filename + CONTENT_ENCODINGS[encoding],
+                                       mimetype=mimetype, etag=f"{tag}-{encoding}")
+    else:
+        def load():
+            with open(path, 'rb') as f:
+                return f.read()
+        body = compression_cache.get((path, stat.st_mtime_ns, stat.st_size), encoding, load)
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(f"{tag}-{encoding}")
+        response.last_modified = stat.st_mtime
+        response.cache_control.no_cache = True
+        response = response.make_conditional(request)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.cli.command('compress-static')
+def compress_static_command():
+    """Write .gz/.br siblings for the top-level text files"""
+    count = 0
+    for name in sorted(os.listdir('.')):
+        if os.path.isfile(name) and is_compressible(name) and not name.startswith('.'):
+            write_compressed_siblings(name)
+            count += 1
+    click.echo(f"Compressed {count} files ({', '.join(available_encodings())})")
+
+# Static assets
+# Top-level css/js/images are fingerprinted by content. Served pages have
+# their references rewritten to name.ext?v=<fingerprint>, and a request
+# carrying the current fingerprint is cached as immutable for a year.
+def file_digest(path):
+    """sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class AssetManifest:
+    """Content fingerprints of the top-level static assets
+
+    The directory is re-scanned at most every ASSET_SCAN_INTERVAL seconds
+    and only files whose size or mtime changed are hashed again.
+    """
+
+    def __init__(self, root='.'):
+        self.root = root
+        self.lock = threading.Lock()
+        self.version = ''
+        self._files = {}  # name -> ((mtime_ns, size), fingerprint)
+        self._checked = 0.0
+
+    def refresh(self):
+        with self.lock:
+            if time.time() - self._checked < ASSET_SCAN_INTERVAL:
+                return
+            files = {}
+            for entry in os.scandir(self.root):
+                name = entry.name
+                if name == SERVICE_WORKER or name.startswith('.') or not entry.is_file():
+                    continue
+                if name.rsplit('.', 1)[-1].lower() not in ASSET_EXTENSIONS:
+                    continue
+                stat = entry.stat()
+                signature = (stat.st_mtime_ns, stat.st_size)
+                cached = self._files.get(name)
+                if cached and cached[0] == signature:
+                    files[name] = cached
+                else:
+                    files[name] = (signature, file_digest(entry.path)[:12])
+            self._files = files
+            listing = ''.join(f"{name}:{fingerprint}\n" for name, (_, fingerprint) in sorted(files.items()))
+            self.version = hashlib.sha256(listing.encode()).hexdigest()[:12]
+            self._checked = time.time()
+
+    def fingerprint(self, name):
+        """Current fingerprint of an asset, or None if it isn't one"""
+        self.refresh()
+        entry = self._files.get(name)
+        return entry[1] if entry else None
+
+    def to_dict(self):
+        """The manifest as served to the service worker"""
+        self.refresh()
+        assets = {name: f"/{name}?v={fingerprint}" for name, (_, fingerprint) in sorted(self._files.items())}
+        pages = PRECACHE_PAGES + [f"/{name}" for name in sorted(load_generation_manifest())]
+        precache = list(dict.fromkeys(pages)) + [url for name, url in assets.items() if name.endswith(('.css', '.js'))]
+        return {'version': self.version, 'assets': assets, 'precache': precache}
+
+asset_manifest = AssetManifest()
+
+# A quoted attribute value naming a top-level file, e.g. href="style.css"
+ASSET_REFERENCE = re.compile(r'''(=\s*["'])(/?)([\w.-]+)(["'])''')
+
+def fingerprint_html(html):
+    """Point references to known assets at their fingerprinted URLs"""
+    def replace(match):
+        fingerprint = asset_manifest.fingerprint(match.group(3))
+        if fingerprint is None:
+            return match.group(0)
+        return f"{match.group(1)}{match.group(2)}{match.group(3)}?v={fingerprint}{match.group(4)}"
+    return ASSET_REFERENCE.sub(replace, html)
+
+_page_cache = {}  # filename -> (signature, body, etag)
+
+def send_page(filename):
+    """Serve an HTML page with fingerprinted asset references"""
+    path = safe_join('.', filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    stat = os.stat(path)
+    asset_manifest.refresh()
+    signature = (stat.st_mtime_ns, stat.st_size, asset_manifest.version)
+    cached = _page_cache.get(filename)
+    if cached is None or cached[0] != signature:
+        with open(path, 'r', encoding='utf-8') as f:
+            body = fingerprint_html(f.read()).encode('utf-8')
+        cached = (signature, body, hashlib.sha256(body).hexdigest()[:32])
+        _page_cache[filename] = cached
+    response = Response(cached[1], mimetype='text/html')
+    response.set_etag(cached[2])
+    response.cache_control.no_cache = True
+    return encode_response(response, cached[2]).make_conditional(request)
+
+# The placeholder line in sw.js that send_service_worker() fills in
+SERVICE_WORKER_MANIFEST = re.compile(r'^const ASSET_MANIFEST = .*;$', re.MULTILINE)
+
+def send_service_worker():
+    """Serve sw.js with the current asset manifest inlined
+
+    Any asset change alters the script, so browsers install the new worker
+    and it precaches the new fingerprinted URLs.
+    """
+    with open(SERVICE_WORKER, 'r', encoding='utf-8') as f:
+        source = f.read()
+    manifest = json.dumps(asset_manifest.to_dict())
+    body = SERVICE_WORKER_MANIFEST.sub(lambda _: f"const ASSET_MANIFEST = {manifest};", source, count=1).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    response = Response(body, mimetype='application/javascript')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return encode_response(response, etag).make_conditional(request)
 
 # Static file routes
 @app.route('/')
 def serve_index():
-    return send_from_directory('.', 'index.html')
+    if ASSET_FINGERPRINTS:
+        return send_page('index.html')
+    return send_static_file('index.html')
+
+@app.route('/asset-manifest.json')
+def serve_asset_manifest():
+    response = jsonify(asset_manifest.to_dict())
+    response.cache_control.no_cache = True
+    return response
+
+def is_private_file(filename):
+    """Whether a path under the app root is server state rather than site content"""
+    parts = filename.split('/')
+    return (parts[0] in (PRIVATE_FOLDER, VISITORS_FOLDER) or parts[-1] in PRIVATE_FILES
+            or parts[-1].startswith('.') or parts[-1].endswith(PRIVATE_SUFFIXES))
 
 @app.route('/<path:filename>')
 def serve_static(filename):
-    return send_from_directory('.', filename)
+    if is_private_file(filename):
+        abort(404)
+    if filename == SERVICE_WORKER:
+        return send_service_worker()
+    if filename == DATA_FILE:
+        # The file on disk lags the journal; serve the live document
+        return versioned_json('data', load_data)
+    if ASSET_FINGERPRINTS and filename.endswith('.html') and '/' not in filename:
+        return send_page(filename)
+    if filename.startswith(PUBLIC_EXPORT_FOLDER + '/') and not filename.endswith('/manifest.json'):
+        # Shard names carry their content hash
+        response = send_static_file(filename)
+        if response.status_code == 200:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ASSET_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+    fingerprint = asset_manifest.fingerprint(filename)
+    if fingerprint is None:
+        return send_static_file(filename)
+    response = send_static_file(filename, etag=fingerprint)
+    if request.args.get('v') == fingerprint:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    return response
 
 @app.route('/uploads/<path:filename>')
 def serve_uploads(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    if filename.startswith('.partial/'):
+        abort(404)
+    response = send_from_directory(UPLOAD_FOLDER, filename)
+    if filename.startswith('blobs/'):
+        # Blob names are content hashes, so a URL always means the same bytes
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 60 * 60
+        response.cache_control.immutable = True
+    return response
 
 # Authentication endpoints
 @app.route('/api/auth/login', methods=['POST'])
@@ -159,29 +2354,21 @@ def login():
     data = request.get_json()
     password = data.get('password', '')
 
-    if hashlib.sha256(password.encode()).hexdigest() == ADMIN_PASSWORD_HASH:
-        token = secrets.token_hex(32)
-        sessions[token] = {
-            'created': datetime.now(),
-            'expires': datetime.now() + timedelta(hours=24)
-        }
-        return jsonify({"success": True, "token": token})
+    if secrets.compare_digest(hashlib.sha256(password.encode()).hexdigest(), ADMIN_PASSWORD_HASH):
+        return jsonify({"success": True, "token": sessions.create()})
 
     return jsonify({"success": False, "error": "Invalid password"}), 401
 
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Logout admin user"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token in sessions:
-        del sessions[token]
+    sessions.revoke(request_token())
     return jsonify({"success": True})
 
 @app.route('/api/auth/verify', methods=['GET'])
 def verify_auth():
     """Verify if current session is valid"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token and token in sessions and sessions[token]['expires'] > datetime.now():
+    if sessions.check(request_token()) == 'valid':
         return jsonify({"valid": True})
     return jsonify({"valid": False}), 401
 
@@ -190,7 +2377,7 @@ def verify_auth():
 @require_auth
 def get_data():
     """Get all venue data"""
-    return jsonify(load_data())
+    return versioned_json('data', load_data)
 
 @app.route('/api/data', methods=['POST'])
 @require_auth
@@ -200,51 +2387,600 @@ def save_all_data():
     save_data(data)
     return jsonify({"success": True})
 
+# Change feed
+# Delta sync for the admin editor: GET /api/changes returns what changed
+# since a data version, and PATCH /api/data applies a batch of edits,
+# optionally checked against the version each entity was last seen at.
+class ChangeFeed:
+    """The last CHANGE_LOG_SIZE changes by data version, plus the version
+    at which each entity last changed (fed by a data store listener)"""
+
+    def __init__(self, store, size):
+        self.store = store
+        self._log = deque(maxlen=size)
+        self._floor = 0  # Changes at or before this version are no longer known
+        self._entity_versions = {}
+
+    def handle(self, event):
+        version = self.store.version
+        if event['op'] == 'reset':
+            self._log.clear()
+            self._floor = version
+            self._entity_versions = {}
+            return
+        if len(self._log) == self._log.maxlen:
+            self._floor = self._log[0][0]
+        self._log.append((version, event['kind'], event['id']))
+        if event['op'] == 'delete':
+            self._entity_versions.pop((event['kind'], event['id']), None)
+        else:
+            self._entity_versions[(event['kind'], event['id'])] = version
+        if event['kind'] in ENTITY_CHILDREN:
+            self._version_children(event['kind'], event['before'], event['after'], version)
+
+    def _version_children(self, kind, before, after, version):
+        """Version the children that a change to their parent added, changed or removed
+
+        An update that replaces a map's whole locations list (e.g. a
+        reorder) changes those locations too, and stale edits to them
+        must still be caught as conflicts.
+        """
+        child_kind = ENTITY_CHILDREN[kind]
+        key = ENTITY_LAYOUT[child_kind][1]
+        old = (before or {}).get(key) or []
+        new = (after or {}).get(key) or []
+        if old is new:
+            return
+        old_by_id = {child.get('id'): child for child in old}
+        for child in new:
+            previous = old_by_id.pop(child.get('id'), None)
+            if previous != child:
+                self._entity_versions[(child_kind, child.get('id'))] = version
+                if child_kind in ENTITY_CHILDREN:
+                    self._version_children(child_kind, previous, child, version)
+        for child_id, child in old_by_id.items():
+            self._entity_versions.pop((child_kind, child_id), None)
+            if child_kind in ENTITY_CHILDREN:
+                self._version_children(child_kind, child, None, version)
+
+    def entity_version(self, kind, entity_id):
+        return self._entity_versions.get((kind, entity_id), self._floor)
+
+    def since(self, version):
+        """{(kind, id): version} changed after version, or None if that's too far back"""
+        if version < self._floor or version > self.store.version:
+            return None
+        changed = {}
+        for change_version, kind, entity_id in self._log:
+            if change_version > version:
+                changed.pop((kind, entity_id), None)
+                changed[(kind, entity_id)] = change_version
+        return changed
+
+change_feed = ChangeFeed(data_store, CHANGE_LOG_SIZE)
+data_store.subscribe(change_feed.handle)
+
+def describe_change(kind, entity_id, version):
+    """The current state of a changed entity, as sent by /api/changes"""
+    change = {'kind': kind, 'id': entity_id, 'version': data_store.version_token(version)}
+    if kind == 'document':
+        change.update(op='set', value=data_store.get().get(entity_id))
+        return change
+    parents = data_store.parents_of(kind, entity_id)
+    if parents is None:
+        change['op'] = 'delete'
+    else:
+        change.update(op='upsert', parents=list(parents), entity=data_store.find(kind, entity_id))
+    return change
+
+@app.route('/api/changes', methods=['GET'])
+@require_auth
+def get_changes():
+    """Entities created, updated or deleted since ?since=<version>
+
+    Without a usable since (missing, from an earlier run, or older than
+    the change log) the whole document is returned with reset: true.
+    """
+    with data_store.lock:
+        data_store.get()
+        since = data_store.parse_version(request.args.get('since'))
+        changed = change_feed.since(since) if since is not None else None
+        if changed is None:
+            return jsonify({"version": data_store.version_token(), "reset": True, "data": data_store.get()})
+        changes = [describe_change(kind, entity_id, version) for (kind, entity_id), version in changed.items()]
+        return jsonify({"version": data_store.version_token(), "reset": False, "changes": changes})
+
+def validate_batch(ops):
+    """Check a batch of edits against the current data
+
+    Returns (status, error) for the first problem, or None if every op can
+    be applied. Ops may refer to entities inserted earlier in the batch.
+    Inserting an id that already exists is a conflict, not a replace.
+    """
+    inserted, deleted = set(), set()
+    conflicts = []
+    for index, op in enumerate(ops):
+        if not isinstance(op, dict):
+            return 400, {"error": "Invalid op", "index": index}
+        kind = 'document' if op.get('op') == 'set' else op.get('kind')
+        if op.get('op') not in ('insert', 'update', 'delete', 'set') or (kind != 'document' and kind not in ENTITY_LAYOUT):
+            return 400, {"error": "Invalid op", "index": index}
+        if 'version' in op and not isinstance(op['version'], str):
+            return 400, {"error": "Invalid version", "index": index}
+        if op['op'] == 'insert':
+            entity = op.get('entity')
+            parents = op.get('parents') or []
+            parent_kind = ENTITY_LAYOUT[kind][0]
+            if (not isinstance(entity, dict) or not isinstance(entity.get('id', ''), str)
+                    or not isinstance(parents, list) or not all(isinstance(p, str) for p in parents)
+                    or len(parents) != len(parent_kinds(kind))):
+                return 400, {"error": "Invalid insert", "index": index}
+            if parents and (parent_kind, parents[-1]) not in inserted and data_store.find(parent_kind, parents[-1], parents[:-1]) is None:
+                return 404, {"error": "Parent not found", "index": index}
+            entity.setdefault('id', generate_id())
+            key = (kind, entity['id'])
+            if key in inserted or (key not in deleted and data_store.find(kind, entity['id']) is not None):
+                return 409, {"error": f"{kind} already exists", "index": index, "id": entity['id']}
+            deleted.discard(key)
+            inserted.add(key)
+            continue
+        key = (kind, op.get('key') if kind == 'document' else op.get('id'))
+        if not isinstance(key[1], str) or (op['op'] == 'update' and not isinstance(op.get('fields') or {}, dict)):
+            return 400, {"error": "Invalid op", "index": index}
+        if kind == 'document':
+            if key[1] in ENTITY_ROOT_KEYS:
+                return 400, {"error": "Invalid key", "index": index}
+        elif key in deleted or (key not in inserted and data_store.find(kind, key[1]) is None):
+            return 404, {"error": f"{kind} not found", "index": index, "id": key[1]}
+        if op['op'] == 'delete':
+            deleted.add(key)
+        if 'version' in op and key not in inserted:
+            seen = data_store.parse_version(op['version'])
+            current = change_feed.entity_version(*key)
+            if seen is None or current > seen:
+                conflicts.append({"index": index, "kind": kind, "id": key[1],
+                                  "version": data_store.version_token(current)})
+    if conflicts:
+        return 409, {"error": "Conflict", "conflicts": conflicts}
+    return None
+
+@app.route('/api/data', methods=['PATCH'])
+@require_auth
+def patch_data():
+    """Apply a batch of edits in one request
+
+    Body: {"ops": [...]}, each op one of
+      {"op": "insert", "kind", "parents": [...], "entity": {...}}
+      {"op": "update", "kind", "id", "fields": {...}}
+      {"op": "delete", "kind", "id"}
+      {"op": "set", "key", "value"}   top-level keys such as landingPage
+    An op may carry "version", the data version the client last saw the
+    entity at; if it has changed since, nothing is applied and 409 lists
+    the conflicts. Responds with the new version of each entity.
+    """
+    ops = (request.get_json(silent=True) or {}).get('ops')
+    if not isinstance(ops, list):
+        return jsonify({"error": "ops must be a list"}), 400
+    try:
+        for op in ops:
+            if isinstance(op, dict) and op.get('kind') == 'location':
+                if 'entity' in op:
+                    op['entity'] = normalize_location_fields(op['entity'])
+                if 'fields' in op:
+                    op['fields'] = normalize_location_fields(op['fields'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    removed = []
+    with data_store.lock:
+        data_store.get()
+        problem = validate_batch(ops)
+        if problem is not None:
+            return jsonify(problem[1]), problem[0]
+
+        results = []
+        for op in ops:
+            if op['op'] == 'set':
+                data_store.set(op['key'], op.get('value'))
+                results.append({'kind': 'document', 'id': op['key'], 'version': data_store.version_token()})
+                continue
+            kind = op['kind']
+            if op['op'] == 'insert':
+                entity = op['entity']
+                child_kind = ENTITY_CHILDREN.get(kind)
+                if child_kind:
+                    entity.setdefault(ENTITY_LAYOUT[child_kind][1], [])
+                result = data_store.insert(kind, entity, tuple(op.get('parents') or []))
+                entity_id = entity['id']
+            elif op['op'] == 'update':
+                result = data_store.update(kind, op['id'], op.get('fields') or {})
+                entity_id = op['id']
+            else:
+                result = data_store.delete(kind, op['id'])
+                entity_id = op['id']
+                if result is not None:
+                    removed.append((kind, result))
+            results.append({'kind': kind, 'id': entity_id,
+                            'version': data_store.version_token() if result is not None else None})
+        version = data_store.version_token()
+
+    for kind, entity in removed:
+        if kind in ('venue', 'map'):
+            start_image_cleanup(kind, entity)
+        else:
+            delete_entity_images(kind, entity)
+    return jsonify({"success": True, "version": version, "results": results})
+
+# Search
+# An inverted index over locations, kept current by a data store listener.
+# Every word prefix is indexed so type-ahead queries are dictionary
+# lookups; all query words must match, and whole-word matches score
+# higher than prefix matches.
+SEARCH_TOKEN = re.compile(r'\w+')
+
+def search_tokens(text):
+    return SEARCH_TOKEN.findall((text or '').lower())
+
+class SearchIndex:
+    """Prefix index of locations by name, description, fiber, venue and map"""
+
+    def __init__(self, store):
+        self.store = store
+        self.lock = threading.Lock()
+        self._docs = {}  # location id -> result fields
+        self._doc_keys = {}  # location id -> [(table, key)]
+        self._words = {}  # word -> {location id: weight}
+        self._prefixes = {}  # prefix -> {location id: weight}
+
+    def _add(self, venue, m, loc):
+        x, y = location_point(loc)
+        doc = {
+            'venueId': venue.get('id'), 'venue': venue.get('name') or '',
+            'mapId': m.get('id'), 'map': m.get('label') or '',
+            'locationId': loc['id'], 'name': loc.get('name') or '', 'number': loc.get('number'),
+            'description': loc.get('description') or '', 'fiber': loc.get('fiber') or '',
+            'x': x, 'y': y,
+        }
+        self._remove(loc['id'])
+        weights = {}
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            for word in set(search_tokens(str(doc[field]))):
+                weights[word] = max(weights.get(word, 0), weight)
+        keys = []
+        for word, weight in weights.items():
+            self._words.setdefault(word, {})[loc['id']] = weight
+            keys.append((self._words, word))
+            for end in range(1, min(len(word), SEARCH_MAX_PREFIX) + 1):
+                postings = self._prefixes.setdefault(word[:end], {})
+                postings[loc['id']] = max(postings.get(loc['id'], 0), weight)
+                keys.append((self._prefixes, word[:end]))
+        self._docs[loc['id']] = doc
+        self._doc_keys[loc['id']] = keys
+
+    def _remove(self, location_id):
+        for table, key in self._doc_keys.pop(location_id, []):
+            postings = table.get(key)
+            if postings is not None:
+                postings.pop(location_id, None)
+                if not postings:
+                    del table[key]
+        self._docs.pop(location_id, None)
+
+    def _add_entity(self, kind, entity):
+        """Index the locations in a venue, map or location (looking up its parents)"""
+        if kind == 'venue':
+            for m in entity.get('maps', []):
+                for loc in m.get('locations', []):
+                    self._add(entity, m, loc)
+            return
+        parents = self.store.parents_of(kind, entity['id'])
+        if parents is None:
+            return
+        venue = self.store.find('venue', parents[0])
+        if kind == 'map':
+            for loc in entity.get('locations', []):
+                self._add(venue, entity, loc)
+        else:
+            self._add(venue, self.store.find('map', parents[1], parents[:1]), entity)
+
+    def handle(self, event):
+        with self.lock:
+            if event['op'] == 'reset':
+                self._docs, self._doc_keys, self._words, self._prefixes = {}, {}, {}, {}
+                for venue in event['after'].get('venues', []):
+                    self._add_entity('venue', venue)
+                return
+            kind = event['kind']
+            if kind not in ('venue', 'map', 'location'):
+                return
+            if event['before'] is not None:
+                for loc in entity_locations(kind, event['before']):
+                    self._remove(loc['id'])
+            if event['after'] is not None:
+                self._add_entity(kind, event['after'])
+
+    def search(self, query, offset=0, limit=SEARCH_PAGE_SIZE):
+        """(total, hits) for locations matching every word of query, best first"""
+        words = list(dict.fromkeys(search_tokens(query)))
+        if not words:
+            return 0, []
+        with self.lock:
+            matches = [(self._prefixes.get(word[:SEARCH_MAX_PREFIX], {}), self._words.get(word, {})) for word in words]
+            candidates = min((prefix for prefix, _ in matches), key=len)
+            scores = {}
+            for location_id in candidates:
+                score = 0.0
+                for prefix, exact in matches:
+                    if location_id not in prefix:
+                        break
+                    score += prefix[location_id] + exact.get(location_id, 0)
+                else:
+                    scores[location_id] = score
+            ranked = sorted(scores, key=lambda location_id: (
+                -scores[location_id], self._docs[location_id]['venue'],
+                str(self._docs[location_id]['number'] or ''), self._docs[location_id]['name']))
+            hits = [{**self._docs[location_id], 'score': scores[location_id]}
+                    for location_id in ranked[offset:offset + limit]]
+        return len(ranked), hits
+
+def entity_locations(kind, entity):
+    """The locations held in a venue, map or location"""
+    if kind == 'venue':
+        return [loc for m in entity.get('maps', []) for loc in m.get('locations', [])]
+    if kind == 'map':
+        return entity.get('locations', [])
+    return [entity]
+
+search_index = SearchIndex(data_store)
+data_store.subscribe(search_index.handle)
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Locations matching ?q= (type-ahead friendly), paginated with offset/limit"""
+    query = request.args.get('q', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), 1), 100)
+    data_store.get()
+    total, hits = search_index.search(query, offset, limit)
+    return jsonify({"query": query, "total": total, "offset": offset, "limit": limit, "results": hits})
+
+# Spatial index
+# Marker positions are stored as {'top': '80%', 'left': '47.2%'}, i.e.
+# percentages of the map image. Each map keeps a uniform grid of its
+# markers in those coordinates (x = left, y = top, 0-100) for bounding
+# box, zoom tile and nearest-neighbour queries.
+def parse_percent(value):
+    """'47.2%', '47.2' or 47.2 -> 47.2 (None if it isn't a number)"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        try:
+            number = float(str(value).strip().rstrip('%'))
+        except ValueError:
+            return None
+    return number if math.isfinite(number) else None
+
+def location_point(loc):
+    """(x, y) of a location in percent; unplaced ones sit at the origin like on the page"""
+    position = loc.get('position') or {}
+    return (parse_percent(position.get('left')) or 0.0, parse_percent(position.get('top')) or 0.0)
+
+def normalize_position(position):
+    """Canonical {'top': '80%', 'left': '47.2%'} form of a position, clamped to the map"""
+    if not isinstance(position, dict):
+        raise ValueError("position must be an object with top and left")
+    normalized = {}
+    for key in ('top', 'left'):
+        number = parse_percent(position.get(key, 0))
+        if number is None:
+            raise ValueError(f"position.{key} must be a percentage")
+        normalized[key] = f"{round(min(max(number, 0.0), 100.0), 2):g}%"
+    return normalized
+
+def normalize_location_fields(fields):
+    """Location fields with any position in canonical form (ValueError if invalid)"""
+    if isinstance(fields, dict) and 'position' in fields:
+        return {**fields, 'position': normalize_position(fields['position'])}
+    return fields
+
+class SpatialIndex:
+    """Per-map grids of marker positions, kept current by a data store listener"""
+
+    def __init__(self, store, size):
+        self.store = store
+        self.size = size
+        self.lock = threading.Lock()
+        self._maps = {}  # map id -> {'points': {location id: (x, y)}, 'cells': {(cx, cy): set}}
+
+    def _cell(self, x, y):
+        clamp = lambda v: int(min(max(v * self.size / 100.0, 0), self.size - 1))
+        return clamp(x), clamp(y)
+
+    def _add(self, map_id, loc):
+        grid = self._maps.setdefault(map_id, {'points': {}, 'cells': {}})
+        self._remove(loc['id'])
+        point = location_point(loc)
+        grid['points'][loc['id']] = point
+        grid['cells'].setdefault(self._cell(*point), set()).add(loc['id'])
+
+    def _remove(self, location_id, map_id=None):
+        grids = [self._maps[map_id]] if map_id in self._maps else self._maps.values()
+        for grid in grids:
+            point = grid['points'].pop(location_id, None)
+            if point is not None:
+                cell = grid['cells'][self._cell(*point)]
+                cell.discard(location_id)
+                return
+
+    def _add_entity(self, kind, entity):
+        if kind == 'venue':
+            for m in entity.get('maps', []):
+                self._add_entity('map', m)
+        elif kind == 'map':
+            self._maps[entity['id']] = {'points': {}, 'cells': {}}
+            for loc in entity.get('locations', []):
+                self._add(entity['id'], loc)
+        else:
+            parents = self.store.parents_of('location', entity['id'])
+            if parents is not None:
+                self._add(parents[1], entity)
+
+    def handle(self, event):
+        with self.lock:
+            if event['op'] == 'reset':
+                self._maps = {}
+                for venue in event['after'].get('venues', []):
+                    self._add_entity('venue', venue)
+                return
+            kind = event['kind']
+            if kind not in ('venue', 'map', 'location'):
+                return
+            if event['before'] is not None:
+                if kind == 'location':
+                    self._remove(event['id'])
+                else:
+                    maps = event['before'].get('maps', []) if kind == 'venue' else [event['before']]
+                    for m in maps:
+                        self._maps.pop(m['id'], None)
+            if event['after'] is not None:
+                self._add_entity(kind, event['after'])
+
+    def within(self, map_id, x0, y0, x1, y1):
+        """Ids of the markers inside a box (inclusive), in grid order"""
+        with self.lock:
+            grid = self._maps.get(map_id)
+            if grid is None:
+                return []
+            (cx0, cy0), (cx1, cy1) = self._cell(x0, y0), self._cell(x1, y1)
+            hits = []
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    for location_id in grid['cells'].get((cx, cy), ()):
+                        x, y = grid['points'][location_id]
+                        if x0 <= x <= x1 and y0 <= y <= y1:
+                            hits.append(location_id)
+            return hits
+
+    def nearest(self, map_id, x, y, k):
+        """[(distance, id)] of the k markers closest to (x, y)
+
+        Searches rings of cells outwards from the point's cell and stops
+        once the k-th best is closer than anything in the next ring.
+        """
+        with self.lock:
+            grid = self._maps.get(map_id)
+            if grid is None:
+                return []
+            cell_width = 100.0 / self.size
+            cx, cy = self._cell(x, y)
+            found = []
+            for ring in range(self.size):
+                for gx in range(cx - ring, cx + ring + 1):
+                    for gy in range(cy - ring, cy + ring + 1):
+                        if max(abs(gx - cx), abs(gy - cy)) != ring:
+                            continue
+                        for location_id in grid['cells'].get((gx, gy), ()):
+                            px, py = grid['points'][location_id]
+                            found.append((math.hypot(px - x, py - y), location_id))
+                found.sort()
+                if len(found) >= k and found[k - 1][0] <= ring * cell_width:
+                    break
+            return found[:k]
+
+spatial_index = SpatialIndex(data_store, SPATIAL_GRID_SIZE)
+data_store.subscribe(spatial_index.handle)
+
+def marker_view(loc):
+    """A location as sent to the viewer by the marker endpoints"""
+    descriptor = image_variants(loc.get('image'))
+    x, y = location_point(loc)
+    return {
+        **pick(loc, PUBLIC_LOCATION_FIELDS), 'x': x, 'y': y,
+        'thumb': variant_file(descriptor, 'thumb', ('webp', 'jpg', 'png')),
+        'imageMedium': variant_file(descriptor, 'medium', ('webp', 'jpg', 'png')),
+    }
+
+def parse_marker_box(args):
+    """(x0, y0, x1, y1) from ?bbox=x0,y0,x1,y1 or ?tile=z/x/y, the whole map if neither"""
+    if args.get('tile'):
+        z, tx, ty = (int(part) for part in args['tile'].split('/'))
+        if not 0 <= z <= 20 or not (0 <= tx < 2 ** z and 0 <= ty < 2 ** z):
+            raise ValueError("tile out of range")
+        span = 100.0 / 2 ** z
+        return tx * span, ty * span, (tx + 1) * span, (ty + 1) * span
+    if args.get('bbox'):
+        x0, y0, x1, y1 = (float(part) for part in args['bbox'].split(','))
+        if not all(math.isfinite(v) for v in (x0, y0, x1, y1)):
+            raise ValueError("bbox must be finite")
+        return min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)
+    return 0.0, 0.0, 100.0, 100.0
+
+@app.route('/api/maps/<map_id>/markers', methods=['GET'])
+def get_map_markers(map_id):
+    """Markers of a map inside ?bbox=x0,y0,x1,y1 or zoom ?tile=z/x/y
+
+    Coordinates are percentages of the map image (x = left, y = top).
+    """
+    if data_store.find('map', map_id) is None:
+        return jsonify({"error": "Map not found"}), 404
+    try:
+        box = parse_marker_box(request.args)
+    except ValueError:
+        return jsonify({"error": "Expected bbox=x0,y0,x1,y1 or tile=z/x/y"}), 400
+    ids = spatial_index.within(map_id, *box)
+    markers = [marker_view(loc) for loc in (data_store.find('location', i) for i in ids) if loc is not None]
+    markers.sort(key=lambda marker: (str(marker.get('number', '')).zfill(6), marker['id']))
+    return jsonify({"mapId": map_id, "bbox": list(box), "markers": markers})
+
+@app.route('/api/maps/<map_id>/markers/nearest', methods=['GET'])
+def get_nearest_markers(map_id):
+    """The ?k= (default 5) markers closest to ?x=&y=, nearest first"""
+    if data_store.find('map', map_id) is None:
+        return jsonify({"error": "Map not found"}), 404
+    x = request.args.get('x', type=float)
+    y = request.args.get('y', type=float)
+    if x is None or y is None or not (math.isfinite(x) and math.isfinite(y)):
+        return jsonify({"error": "x and y are required"}), 400
+    k = min(max(request.args.get('k', 5, type=int), 1), 100)
+    markers = []
+    for distance, location_id in spatial_index.nearest(map_id, x, y, k):
+        loc = data_store.find('location', location_id)
+        if loc is not None:
+            markers.append({**marker_view(loc), 'distance': round(distance, 3)})
+    return jsonify({"mapId": map_id, "markers": markers})
+
 # Category endpoints
 @app.route('/api/categories', methods=['GET'])
 @require_auth
 def get_categories():
     """Get all categories"""
-    data = load_data()
-    return jsonify(data.get('categories', []))
+    return versioned_json('categories', lambda: load_data().get('categories', []))
 
 @app.route('/api/categories', methods=['POST'])
 @require_auth
 def create_category():
     """Create a new category"""
-    data = load_data()
     new_category = request.get_json()
     new_category['id'] = generate_id()
-
-    if 'categories' not in data:
-        data['categories'] = []
-
-    data['categories'].append(new_category)
-    save_data(data)
+    data_store.insert('category', new_category)
     return jsonify(new_category), 201
 
 @app.route('/api/categories/<category_id>', methods=['PUT'])
 @require_auth
 def update_category(category_id):
     """Update a category"""
-    data = load_data()
-    updated = request.get_json()
-
-    for i, cat in enumerate(data.get('categories', [])):
-        if cat['id'] == category_id:
-            data['categories'][i] = {**cat, **updated}
-            save_data(data)
-            return jsonify(data['categories'][i])
-
-    return jsonify({"error": "Category not found"}), 404
+    category = data_store.update('category', category_id, request.get_json())
+    if category is None:
+        return jsonify({"error": "Category not found"}), 404
+    return jsonify(category)
 
 @app.route('/api/categories/<category_id>', methods=['DELETE'])
 @require_auth
 def delete_category(category_id):
     """Delete a category"""
-    data = load_data()
-    data['categories'] = [c for c in data.get('categories', []) if c['id'] != category_id]
-    save_data(data)
+    data_store.delete('category', category_id)
     return jsonify({"success": True})
 
 # Venue endpoints
@@ -252,178 +2988,583 @@ def delete_category(category_id):
 @require_auth
 def get_venues():
     """Get all venues"""
-    data = load_data()
-    return jsonify(data.get('venues', []))
+    return versioned_json('venues', lambda: load_data().get('venues', []))
 
 @app.route('/api/venues', methods=['POST'])
 @require_auth
 def create_venue():
     """Create a new venue"""
-    data = load_data()
     new_venue = request.get_json()
     new_venue['id'] = generate_id()
     new_venue['maps'] = []
-
-    data['venues'].append(new_venue)
-    save_data(data)
+    data_store.insert('venue', new_venue)
     return jsonify(new_venue), 201
 
+@app.route('/api/venues/<venue_id>', methods=['GET'])
+@require_auth
+def get_venue(venue_id):
+    """Get a single venue"""
+    venue = data_store.find('venue', venue_id)
+    if venue is None:
+        return jsonify({"error": "Venue not found"}), 404
+    return versioned_json(('venue', venue_id), lambda: data_store.find('venue', venue_id))
+
 @app.route('/api/venues/<venue_id>', methods=['PUT'])
 @require_auth
 def update_venue(venue_id):
     """Update a venue"""
-    data = load_data()
-    updated = request.get_json()
-
-    for i, venue in enumerate(data['venues']):
-        if venue['id'] == venue_id:
-            data['venues'][i] = {**venue, **updated}
-            save_data(data)
-            return jsonify(data['venues'][i])
-
-    return jsonify({"error": "Venue not found"}), 404
+    venue = data_store.update('venue', venue_id, request.get_json())
+    if venue is None:
+        return jsonify({"error": "Venue not found"}), 404
+    return jsonify(venue)
 
 @app.route('/api/venues/<venue_id>', methods=['DELETE'])
 @require_auth
 def delete_venue(venue_id):
     """Delete a venue and all its images"""
-    data = load_data()
-
-    # Find venue and delete all associated images
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            for m in venue.get('maps', []):
-                # Delete map image
-                delete_image_file(m.get('image', ''))
-                # Delete all location images
-                for loc in m.get('locations', []):
-                    delete_image_file(loc.get('image', ''))
-            break
-
-    data['venues'] = [v for v in data['venues'] if v['id'] != venue_id]
-    save_data(data)
-    return jsonify({"success": True})
+    venue = data_store.delete('venue', venue_id)
+    job = start_image_cleanup('venue', venue) if venue is not None else None
+    return jsonify({"success": True, "jobId": job['id'] if job else None})
 
 # Map endpoints
 @app.route('/api/venues/<venue_id>/maps', methods=['POST'])
 @require_auth
 def create_map(venue_id):
     """Create a new map for a venue"""
-    data = load_data()
     new_map = request.get_json()
     new_map['id'] = generate_id()
     new_map['locations'] = []
 
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            venue['maps'].append(new_map)
-            save_data(data)
-            return jsonify(new_map), 201
-
-    return jsonify({"error": "Venue not found"}), 404
+    if data_store.insert('map', new_map, (venue_id,)) is None:
+        return jsonify({"error": "Venue not found"}), 404
+    return jsonify(new_map), 201
 
 @app.route('/api/venues/<venue_id>/maps/<map_id>', methods=['PUT'])
 @require_auth
 def update_map(venue_id, map_id):
     """Update a map"""
-    data = load_data()
-    updated = request.get_json()
-
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            for i, m in enumerate(venue['maps']):
-                if m['id'] == map_id:
-                    venue['maps'][i] = {**m, **updated}
-                    save_data(data)
-                    return jsonify(venue['maps'][i])
-
-    return jsonify({"error": "Map not found"}), 404
+    m = data_store.update('map', map_id, request.get_json(), (venue_id,))
+    if m is None:
+        return jsonify({"error": "Map not found"}), 404
+    return jsonify(m)
 
 @app.route('/api/venues/<venue_id>/maps/<map_id>', methods=['DELETE'])
 @require_auth
 def delete_map(venue_id, map_id):
     """Delete a map and all its images"""
-    data = load_data()
-
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            # Find the map and delete its images
-            for m in venue['maps']:
-                if m['id'] == map_id:
-                    # Delete map image
-                    delete_image_file(m.get('image', ''))
-                    # Delete all location images
-                    for loc in m.get('locations', []):
-                        delete_image_file(loc.get('image', ''))
-                    break
-            venue['maps'] = [m for m in venue['maps'] if m['id'] != map_id]
-            save_data(data)
-            return jsonify({"success": True})
+    if data_store.find('venue', venue_id) is None:
+        return jsonify({"error": "Venue not found"}), 404
 
-    return jsonify({"error": "Venue not found"}), 404
+    m = data_store.delete('map', map_id, (venue_id,))
+    job = start_image_cleanup('map', m) if m is not None else None
+    return jsonify({"success": True, "jobId": job['id'] if job else None})
+
+@app.route('/api/maps/<map_id>', methods=['GET'])
+@require_auth
+def get_map_by_id(map_id):
+    """Get a map by id alone"""
+    m = data_store.find('map', map_id)
+    if m is None:
+        return jsonify({"error": "Map not found"}), 404
+    return versioned_json(('map', map_id), lambda: data_store.find('map', map_id))
+
+@app.route('/api/maps/<map_id>', methods=['PUT'])
+@require_auth
+def update_map_by_id(map_id):
+    """Update a map by id alone"""
+    m = data_store.update('map', map_id, request.get_json())
+    if m is None:
+        return jsonify({"error": "Map not found"}), 404
+    return jsonify(m)
+
+@app.route('/api/maps/<map_id>', methods=['DELETE'])
+@require_auth
+def delete_map_by_id(map_id):
+    """Delete a map by id alone"""
+    m = data_store.delete('map', map_id)
+    if m is None:
+        return jsonify({"error": "Map not found"}), 404
+    job = start_image_cleanup('map', m)
+    return jsonify({"success": True, "jobId": job['id'] if job else None})
 
 # Location endpoints
+def next_location_number(locations):
+    """One past the highest location number (numbers like '7' count; other non-numbers are skipped)"""
+    numbers = []
+    for loc in locations:
+        number = loc.get('number')
+        if isinstance(number, str) and number.strip().isdigit():
+            number = int(number)
+        if isinstance(number, int) and not isinstance(number, bool):
+            numbers.append(number)
+    return max(numbers, default=0) + 1
+
+def apply_location_batch(venue_id, map_id, batch):
+    """Create, update, reorder and delete a map's locations as one change
+
+    batch keys (all optional): create [location], update [{id, ...fields}],
+    delete [id], order [id, ...] for the new order (unlisted locations keep
+    their relative order after the listed ones), and renumber, which sets
+    number to each location's position. New locations without a number
+    are numbered after the highest existing one. Returns (status, body).
+
+    Everything is checked before anything is written, and the batch is
+    then stored as one data store batch (one write, one version). Each
+    change in it is its own location insert, update or delete, so the
+    change feed, search and spatial indexes see just the locations
+    involved; only a change of order rewrites the map's whole list in one
+    map update.
+    """
+    for key in ('create', 'update', 'delete', 'order'):
+        if not isinstance(batch.get(key, []), list):
+            return 400, {"error": f"{key} must be a list"}
+    if not all(isinstance(fields, dict) for fields in batch.get('create', []) + batch.get('update', [])):
+        return 400, {"error": "create and update must list location objects"}
+    if not all(isinstance(fields.get('id'), str) for fields in batch.get('update', [])):
+        return 400, {"error": "Every update needs a location id"}
+    if not all(isinstance(location_id, str) for location_id in batch.get('delete', []) + batch.get('order', [])):
+        return 400, {"error": "delete and order must list location ids"}
+    try:
+        batch = {**batch,
+                 'create': [normalize_location_fields(fields) for fields in batch.get('create', [])],
+                 'update': [normalize_location_fields(fields) for fields in batch.get('update', [])]}
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+    removed = []
+    with data_store.lock:
+        m = data_store.find('map', map_id, (venue_id,))
+        if m is None:
+            return 404, {"error": "Map not found"}
+
+        current = {loc['id']: loc for loc in m.get('locations', [])}
+        locations = dict(current)
+        order = list(locations)
+        for fields in batch.get('update', []):
+            location_id = fields.get('id')
+            if location_id not in locations:
+                return 404, {"error": "Location not found", "id": location_id}
+            locations[location_id] = {**locations[location_id], **fields}
+        for location_id in batch.get('delete', []):
+            if location_id not in locations:
+                return 404, {"error": "Location not found", "id": location_id}
+            removed.append(locations.pop(location_id))
+            order.remove(location_id)
+
+        next_number = next_location_number(locations.values())
+        created = []
+        for fields in batch.get('create', []):
+            new_location = {**fields, 'id': generate_id()}
+            if 'number' not in new_location:
+                new_location['number'] = next_number
+                next_number += 1
+            locations[new_location['id']] = new_location
+            order.append(new_location['id'])
+            created.append(new_location['id'])
+
+        if 'order' in batch:
+            listed = batch['order']
+            if len(set(listed)) != len(listed) or any(location_id not in locations for location_id in listed):
+                return 400, {"error": "order must list existing locations once each"}
+            order = listed + [location_id for location_id in order if location_id not in set(listed)]
+
+        new_locations = [locations[location_id] for location_id in order]
+        if batch.get('renumber'):
+            new_locations = [{**loc, 'number': number} for number, loc in enumerate(new_locations, 1)]
+
+        parents = [venue_id, map_id]
+        kept = [location_id for location_id in current if location_id in locations]
+        if order != kept + created:
+            records = [{'op': 'update', 'kind': 'map', 'id': map_id, 'fields': {'locations': new_locations}}]
+        else:
+            records = [{'op': 'delete', 'kind': 'location', 'id': loc['id']} for loc in removed]
+            for loc in new_locations:
+                before = current.get(loc['id'])
+                if before is None:
+                    records.append({'op': 'insert', 'kind': 'location', 'parents': parents, 'entity': loc})
+                elif loc != before:
+                    changed = {key: value for key, value in loc.items() if key not in before or before[key] != value}
+                    records.append({'op': 'update', 'kind': 'location', 'id': loc['id'], 'fields': changed})
+        if records:
+            data_store.batch(records)
+
+    for loc in removed:
+        delete_entity_images('location', loc)
+    by_id = {loc['id']: loc for loc in new_locations}
+    return 200, {"success": True, "locations": new_locations,
+                 "created": [by_id[location_id] for location_id in created],
+                 "deleted": [loc['id'] for loc in removed]}
+
 @app.route('/api/venues/<venue_id>/maps/<map_id>/locations', methods=['POST'])
 @require_auth
 def create_location(venue_id, map_id):
     """Create a new location on a map"""
-    data = load_data()
-    new_location = request.get_json()
+    try:
+        new_location = normalize_location_fields(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     new_location['id'] = generate_id()
 
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            for m in venue['maps']:
-                if m['id'] == map_id:
-                    # Auto-assign number if not provided
-                    if 'number' not in new_location:
-                        existing_numbers = [loc.get('number', 0) for loc in m['locations']]
-                        new_location['number'] = max(existing_numbers, default=0) + 1
-                    m['locations'].append(new_location)
-                    save_data(data)
-                    return jsonify(new_location), 201
+    with data_store.lock:
+        m = data_store.find('map', map_id, (venue_id,))
+        if m is None:
+            return jsonify({"error": "Map not found"}), 404
 
-    return jsonify({"error": "Map not found"}), 404
+        # Auto-assign number if not provided
+        if 'number' not in new_location:
+            new_location['number'] = next_location_number(m.get('locations', []))
+        data_store.insert('location', new_location, (venue_id, map_id))
+
+    return jsonify(new_location), 201
+
+@app.route('/api/venues/<venue_id>/maps/<map_id>/locations', methods=['PATCH'])
+@require_auth
+def bulk_update_locations(venue_id, map_id):
+    """Create, update, reorder, renumber and delete many locations at once
+
+    Body: {"create": [...], "update": [{"id", ...}], "delete": [ids],
+    "order": [ids], "renumber": true}; see apply_location_batch.
+    """
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    status, body = apply_location_batch(venue_id, map_id, batch)
+    return jsonify(body), status
 
 @app.route('/api/venues/<venue_id>/maps/<map_id>/locations/<location_id>', methods=['PUT'])
 @require_auth
 def update_location(venue_id, map_id, location_id):
     """Update a location"""
-    data = load_data()
-    updated = request.get_json()
-
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            for m in venue['maps']:
-                if m['id'] == map_id:
-                    for i, loc in enumerate(m['locations']):
-                        if loc['id'] == location_id:
-                            m['locations'][i] = {**loc, **updated}
-                            save_data(data)
-                            return jsonify(m['locations'][i])
-
-    return jsonify({"error": "Location not found"}), 404
+    try:
+        fields = normalize_location_fields(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    loc = data_store.update('location', location_id, fields, (venue_id, map_id))
+    if loc is None:
+        return jsonify({"error": "Location not found"}), 404
+    return jsonify(loc)
 
 @app.route('/api/venues/<venue_id>/maps/<map_id>/locations/<location_id>', methods=['DELETE'])
 @require_auth
 def delete_location(venue_id, map_id, location_id):
     """Delete a location and its image"""
-    data = load_data()
-
-    for venue in data['venues']:
-        if venue['id'] == venue_id:
-            for m in venue['maps']:
-                if m['id'] == map_id:
-                    # Find and delete the location's image
-                    for loc in m['locations']:
-                        if loc['id'] == location_id:
-                            delete_image_file(loc.get('image', ''))
-                            break
-                    m['locations'] = [loc for loc in m['locations'] if loc['id'] != location_id]
-                    save_data(data)
-                    return jsonify({"success": True})
+    if data_store.find('map', map_id, (venue_id,)) is None:
+        return jsonify({"error": "Location not found"}), 404
 
-    return jsonify({"error": "Location not found"}), 404
+    loc = data_store.delete('location', location_id, (venue_id, map_id))
+    if loc is not None:
+        delete_entity_images('location', loc)
+    return jsonify({"success": True})
+
+@app.route('/api/locations/<location_id>', methods=['GET'])
+@require_auth
+def get_location_by_id(location_id):
+    """Get a location by id alone"""
+    loc = data_store.find('location', location_id)
+    if loc is None:
+        return jsonify({"error": "Location not found"}), 404
+    return versioned_json(('location', location_id), lambda: data_store.find('location', location_id))
+
+@app.route('/api/locations/<location_id>', methods=['PUT'])
+@require_auth
+def update_location_by_id(location_id):
+    """Update a location by id alone"""
+    try:
+        fields = normalize_location_fields(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    loc = data_store.update('location', location_id, fields)
+    if loc is None:
+        return jsonify({"error": "Location not found"}), 404
+    return jsonify(loc)
+
+@app.route('/api/locations/<location_id>', methods=['DELETE'])
+@require_auth
+def delete_location_by_id(location_id):
+    """Delete a location by id alone"""
+    loc = data_store.delete('location', location_id)
+    if loc is None:
+        return jsonify({"error": "Location not found"}), 404
+    delete_entity_images('location', loc)
+    return jsonify({"success": True})
+
+# Image pipeline
+# Each image gets a folder under VARIANTS_FOLDER (mirroring its path) with
+# one file per size and encoding, e.g. uploads/variants/maps/map-x/medium.webp,
+# plus a variants.json descriptor the page generator reads. Large map images
+# also get a deep-zoom tile pyramid there (tiles/<level>/<x>_<y>.<fmt>,
+# described by tiles.json).
+IMAGE_MIME_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp', 'avif': 'image/avif'}
+PIL_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP', 'avif': 'AVIF'}
+
+def modern_image_formats():
+    """Extra encodings this Pillow build can write, best first"""
+    formats = []
+    for fmt in ('avif', 'webp'):
+        try:
+            if pil_features.check(fmt):
+                formats.append(fmt)
+        except ValueError:  # Feature unknown to this Pillow version
+            pass
+    return formats
+
+def variant_dir(image_path):
+    """Folder holding the derivatives of an image"""
+    relative = image_path[len('uploads/'):] if image_path.startswith('uploads/') else image_path
+    return os.path.join(VARIANTS_FOLDER, os.path.splitext(relative)[0])
+
+def save_image_atomic(image, path, fmt):
+    """Encode image to a temp file next to path, then rename it into place"""
+    options = {'quality': IMAGE_QUALITY}
+    if fmt == 'jpg':
+        options.update(optimize=True, progressive=True)
+    elif fmt == 'png':
+        options = {'optimize': True}
+    elif fmt == 'avif':
+        options['speed'] = 8  # The default is several times slower for little gain
+    fd, tmp_path = make_temp_file(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            image.save(f, format=PIL_FORMATS[fmt], **options)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+def image_variants(image_path):
+    """Return the variants.json descriptor of an image, or None"""
+    if not image_path:
+        return None
+    try:
+        with open(os.path.join(variant_dir(image_path), 'variants.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def build_image_variants(image_path, force=False):
+    """Write resized and re-encoded derivatives of an image
+
+    Sizes wider than the original are skipped (except 'full', which is
+    always written so there is an optimized full-size copy). Returns the
+    descriptor, or None if Pillow is missing or the image can't be read.
+    """
+    if Image is None or not image_path or not os.path.isfile(image_path):
+        return None
+    source_mtime = os.stat(image_path).st_mtime_ns
+    existing = image_variants(image_path)
+    if existing and existing.get('sourceMtime') == source_mtime and not force:
+        return existing
+
+    directory = variant_dir(image_path)
+    os.makedirs(directory, exist_ok=True)
+    with Image.open(image_path) as original:
+        img = ImageOps.exif_transpose(original)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        formats = ['png' if has_alpha else 'jpg'] + modern_image_formats()
+        width, height = img.size
+
+        sizes = {}
+        for name, max_width in sorted(IMAGE_VARIANT_WIDTHS.items(), key=lambda item: item[1]):
+            if max_width >= width and name != 'full':
+                continue
+            target_width = min(width, max_width)
+            target_height = max(1, round(height * target_width / width))
+            resized = img if target_width == width else img.resize((target_width, target_height), Image.LANCZOS)
+            files = {}
+            for fmt in formats:
+                path = os.path.join(directory, f"{name}.{fmt}")
+                save_image_atomic(resized, path, fmt)
+                files[fmt] = path.replace(os.sep, '/')
+            sizes[name] = {'width': target_width, 'height': target_height, 'files': files}
+
+    descriptor = {
+        'source': image_path,
+        'sourceMtime': source_mtime,
+        'width': width,
+        'height': height,
+        'formats': formats,
+        'sizes': sizes,
+    }
+    write_json_atomic(os.path.join(directory, 'variants.json'), descriptor)
+    return descriptor
+
+def queue_image_variants(image_path):
+    """Build an uploaded image's derivatives in a background job"""
+    if Image is None:
+        return None
+
+    def run(progress):
+        descriptor = build_image_variants(image_path)
+        progress(1, 1)
+        return {'image': image_path, 'sizes': sorted(descriptor['sizes']) if descriptor else []}
+
+    return start_job('image-variants', run, {'image': image_path})
+
+
+def map_tiles(image_path):
+    """Return the tiles.json descriptor of a map image, or None"""
+    if not image_path:
+        return None
+    try:
+        with open(os.path.join(variant_dir(image_path), 'tiles.json'), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def build_map_tiles(image_path, force=False):
+    """Cut a map image into a deep-zoom pyramid of TILE_SIZE tiles
+
+    The top level is the image at full resolution and each level below
+    halves it, down to level 0 which fits in a single tile. Edge tiles
+    are cropped, not padded. Returns the descriptor, or None if Pillow is
+    missing, the image can't be read or is too small to need tiles.
+    """
+    if Image is None or not image_path or not os.path.isfile(image_path):
+        return None
+    source_mtime = os.stat(image_path).st_mtime_ns
+    existing = map_tiles(image_path)
+    if existing and existing.get('sourceMtime') == source_mtime and not force:
+        return existing
+
+    directory = variant_dir(image_path)
+    with Image.open(image_path) as original:
+        img = ImageOps.exif_transpose(original)
+        width, height = img.size
+        if max(width, height) < TILE_MIN_DIMENSION:
+            return None
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        fmt = 'webp' if 'webp' in modern_image_formats() else ('png' if has_alpha else 'jpg')
+        max_level = math.ceil(math.log2(max(width, height) / TILE_SIZE))
+
+        # Cut into a staging folder and swap it in, so readers never see a half-built pyramid
+        os.makedirs(directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.tiles-', dir=directory)
+        levels = []
+        level_img = img
+        for level in range(max_level, -1, -1):
+            scale = 2 ** (level - max_level)
+            level_width, level_height = max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+            if level_img.size != (level_width, level_height):
+                level_img = level_img.resize((level_width, level_height), Image.LANCZOS)
+            columns, rows = math.ceil(level_width / TILE_SIZE), math.ceil(level_height / TILE_SIZE)
+            os.makedirs(os.path.join(staging, str(level)))
+            for column in range(columns):
+                for row in range(rows):
+                    box = (column * TILE_SIZE, row * TILE_SIZE,
+                           min((column + 1) * TILE_SIZE, level_width), min((row + 1) * TILE_SIZE, level_height))
+                    save_image_atomic(level_img.crop(box), os.path.join(staging, str(level), f"{column}_{row}.{fmt}"), fmt)
+            levels.insert(0, {'level': level, 'width': level_width, 'height': level_height,
+                              'columns': columns, 'rows': rows})
+
+    tiles_dir = os.path.join(directory, 'tiles')
+    shutil.rmtree(tiles_dir, ignore_errors=True)
+    os.replace(staging, tiles_dir)
+    descriptor = {
+        'source': image_path,
+        'sourceMtime': source_mtime,
+        'width': width,
+        'height': height,
+        'tileSize': TILE_SIZE,
+        'maxLevel': max_level,
+        'format': fmt,
+        'url': tiles_dir.replace(os.sep, '/') + '/{z}/{x}_{y}.' + fmt,
+        'levels': levels,
+    }
+    write_json_atomic(os.path.join(directory, 'tiles.json'), descriptor)
+    return descriptor
+
+def queue_map_tiles(image_path):
+    """Build a map image's tile pyramid in a background job"""
+    if Image is None:
+        return None
+
+    def run(progress):
+        descriptor = build_map_tiles(image_path)
+        progress(1, 1)
+        return {'image': image_path, 'levels': len(descriptor['levels']) if descriptor else 0}
+
+    return start_job('map-tiles', run, {'image': image_path})
+
+def backfill_map_tiles(progress=None, force=False):
+    """Build tile pyramids for every map image that is missing them"""
+    data = data_store.snapshot()
+    paths = list(dict.fromkeys(m['image'] for v in data.get('venues', []) for m in v.get('maps', []) if m.get('image')))
+    built, failed = 0, []
+    for i, path in enumerate(paths):
+        try:
+            if build_map_tiles(path, force):
+                built += 1
+        except Exception as e:
+            print(f"[Images] Failed to tile {path}: {e}")
+            failed.append(path)
+        if progress:
+            progress(i + 1, len(paths))
+    return {'images': len(paths), 'processed': built, 'failed': failed}
+
+def backfill_image_variants(progress=None, force=False):
+    """Build derivatives for every referenced image that is missing them
+
+    Photos still waiting in photo requests are left out; they get theirs
+    when approved.
+    """
+    paths = referenced_image_paths(data_store.snapshot())
+    built, failed = 0, []
+    for i, path in enumerate(paths):
+        try:
+            if build_image_variants(path, force):
+                built += 1
+        except Exception as e:
+            print(f"[Images] Failed to process {path}: {e}")
+            failed.append(path)
+        if progress:
+            progress(i + 1, len(paths))
+    return {'images': len(paths), 'processed': built, 'failed': failed}
+
+@app.cli.command('backfill-images')
+@click.option('--force', is_flag=True, help='Rebuild derivatives that are already up to date.')
+def backfill_images_command(force):
+    """Build image derivatives for all existing map and location images."""
+    if Image is None:
+        raise click.ClickException('Pillow is not installed')
+
+    def report(done, total):
+        click.echo(f"\r{done}/{total}", nl=False)
+
+    result = backfill_image_variants(report, force)
+    click.echo(f"\nProcessed {result['processed']} of {result['images']} images")
+    for path in result['failed']:
+        click.echo(f"Failed: {path}", err=True)
+
+@app.cli.command('backfill-tiles')
+@click.option('--force', is_flag=True, help='Rebuild pyramids that are already up to date.')
+def backfill_tiles_command(force):
+    """Build deep-zoom tile pyramids for all existing map images."""
+    if Image is None:
+        raise click.ClickException('Pillow is not installed')
+
+    def report(done, total):
+        click.echo(f"\r{done}/{total}", nl=False)
+
+    result = backfill_map_tiles(report, force)
+    click.echo(f"\nTiled {result['processed']} of {result['images']} map images")
+    for path in result['failed']:
+        click.echo(f"Failed: {path}", err=True)
+
+@app.route('/api/images/backfill', methods=['POST'])
+@require_auth
+def backfill_images():
+    """Queue a job that builds derivatives (or with {"tiles": true}, map tiles) for all existing images"""
+    if Image is None:
+        return jsonify({"error": "Image processing is not available (Pillow not installed)"}), 501
+    body = request.get_json(silent=True) or {}
+    force = bool(body.get('force'))
+    if body.get('tiles'):
+        job = start_job('tiles-backfill', lambda progress: backfill_map_tiles(progress, force), {'force': force})
+    else:
+        job = start_job('image-backfill', lambda progress: backfill_image_variants(progress, force), {'force': force})
+    return jsonify({"success": True, "jobId": job['id']}), 202
 
 # Image upload endpoints
 @app.route('/api/upload', methods=['POST'])
@@ -440,15 +3581,12 @@ def upload_image():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed"}), 400
 
-    # Generate unique filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    filename = f"location-{timestamp}-{secrets.token_hex(4)}.{ext}"
-
-    filepath = os.path.join(UPLOAD_FOLDER, filename)
-    file.save(filepath)
+    try:
+        path = store_upload(file)
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), 400
 
-    return jsonify({"success": True, "filename": f"uploads/{filename}"})
+    return jsonify(uploaded_image_response(path, 'image'))
 
 @app.route('/api/upload/map', methods=['POST'])
 @require_auth
@@ -464,71 +3602,521 @@ def upload_map_image():
     if not allowed_file(file.filename):
         return jsonify({"error": "File type not allowed"}), 400
 
-    # Generate unique filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    filename = f"map-{timestamp}-{secrets.token_hex(4)}.{ext}"
-
-    filepath = os.path.join(UPLOAD_FOLDER, 'maps', filename)
-    file.save(filepath)
+    try:
+        path = store_upload(file)
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(uploaded_image_response(path, 'map'))
+
+# Resumable uploads
+# Big map images can be sent in pieces: POST /api/upload/resumable starts an
+# upload, each PUT /api/upload/resumable/<id>?offset=N appends one chunk, and
+# POST .../finalize files the result like a normal upload. After a dropped
+# connection, GET /api/upload/resumable/<id> says how much arrived, and the
+# client carries on from there. Parts live in PARTIAL_UPLOAD_FOLDER as
+# <id>.part next to an <id>.json describing the upload.
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+_active_uploads = set()  # Uploads with a chunk being written
+_active_uploads_lock = threading.Lock()
+
+def partial_upload_paths(upload_id):
+    base = os.path.join(PARTIAL_UPLOAD_FOLDER, upload_id)
+    return f"{base}.json", f"{base}.part"
+
+def load_partial_upload(upload_id):
+    """Description of an unfinished upload, with how many bytes arrived, or None"""
+    if not UPLOAD_ID.match(upload_id):
+        return None
+    meta_path, part_path = partial_upload_paths(upload_id)
+    try:
+        with open(meta_path, 'r') as f:
+            upload = json.load(f)
+        upload['received'] = os.path.getsize(part_path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return upload
+
+def discard_partial_upload(upload_id):
+    for path in partial_upload_paths(upload_id):
+        if os.path.exists(path):
+            os.remove(path)
+
+def sweep_partial_uploads():
+    """Drop uploads that were started more than UPLOAD_SESSION_TTL ago"""
+    if not os.path.isdir(PARTIAL_UPLOAD_FOLDER):
+        return
+    cutoff = time.time() - UPLOAD_SESSION_TTL
+    for name in os.listdir(PARTIAL_UPLOAD_FOLDER):
+        path = os.path.join(PARTIAL_UPLOAD_FOLDER, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass  # Finished or discarded meanwhile
+
+def uploaded_image_response(path, kind):
+    """Queue the derivative jobs for a new upload and describe it for the client"""
+    job = queue_image_variants(path)
+    response = {"success": True, "filename": path, "jobId": job['id'] if job else None}
+    if kind == 'map':
+        tiles_job = queue_map_tiles(path)
+        response['tilesJobId'] = tiles_job['id'] if tiles_job else None
+    return response
 
-    return jsonify({"success": True, "filename": f"uploads/maps/{filename}"})
+def partial_upload_view(upload_id, upload):
+    return {"uploadId": upload_id, "size": upload['size'], "received": upload['received'],
+            "chunkSize": UPLOAD_PART_SIZE}
 
-# HTML Generation endpoint
-@app.route('/api/generate-html', methods=['POST'])
+@app.route('/api/upload/resumable', methods=['POST'])
 @require_auth
-def generate_html():
-    """Generate HTML files from data"""
+def start_resumable_upload():
+    """Start a resumable upload: {"filename", "size", "kind": "map"|"image"}"""
+    body = request.get_json(silent=True) or {}
+    filename = body.get('filename', '')
+    size = body.get('size')
+    kind = body.get('kind', 'map')
+    if not allowed_file(filename):
+        return jsonify({"error": "File type not allowed"}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({"error": "size must be a positive integer"}), 400
+    if size > MAX_RESUMABLE_UPLOAD_SIZE:
+        return jsonify({"error": f"File too large. Maximum size is {MAX_RESUMABLE_UPLOAD_SIZE // (1024 * 1024)}MB."}), 413
+    if kind not in ('map', 'image'):
+        return jsonify({"error": "kind must be map or image"}), 400
+
+    sweep_partial_uploads()
+    os.makedirs(PARTIAL_UPLOAD_FOLDER, exist_ok=True)
+    upload_id = secrets.token_hex(16)
+    meta_path, part_path = partial_upload_paths(upload_id)
+    open(part_path, 'wb').close()
+    write_json_atomic(meta_path, {'filename': filename, 'size': size, 'kind': kind,
+                                  'created': datetime.now().isoformat()})
+    return jsonify(partial_upload_view(upload_id, {'size': size, 'received': 0})), 201
+
+@app.route('/api/upload/resumable/<upload_id>', methods=['GET'])
+@require_auth
+def get_resumable_upload(upload_id):
+    """How much of a resumable upload has arrived"""
+    upload = load_partial_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    return jsonify(partial_upload_view(upload_id, upload))
+
+@app.route('/api/upload/resumable/<upload_id>', methods=['PUT'])
+@require_auth
+def put_resumable_chunk(upload_id):
+    """Append the request body to a resumable upload at ?offset="""
+    upload = load_partial_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    offset = request.args.get('offset', type=int)
+    with _active_uploads_lock:
+        if upload_id in _active_uploads:
+            return jsonify({"error": "A chunk is already being written", "received": upload['received']}), 409
+        _active_uploads.add(upload_id)
     try:
-        data = load_data()
-        categories = data.get('categories', [])
-        venues = data.get('venues', [])
+        # Re-read under the claim; another chunk may have landed meanwhile
+        received = os.path.getsize(partial_upload_paths(upload_id)[1])
+        if offset != received:
+            return jsonify({"error": "Chunk does not start at the received size", "received": received}), 409
+        with open(partial_upload_paths(upload_id)[1], 'ab') as out:
+            while True:
+                chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if received + len(chunk) > upload['size']:
+                    out.truncate(offset)
+                    return jsonify({"error": "Chunk goes past the declared size", "received": offset}), 400
+                out.write(chunk)
+                received += len(chunk)
+    finally:
+        with _active_uploads_lock:
+            _active_uploads.discard(upload_id)
+    return jsonify(partial_upload_view(upload_id, {**upload, 'received': received}))
+
+@app.route('/api/upload/resumable/<upload_id>/finalize', methods=['POST'])
+@require_auth
+def finalize_resumable_upload(upload_id):
+    """Store a completely received upload and queue its derivatives"""
+    upload = load_partial_upload(upload_id)
+    if upload is None:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload['received'] != upload['size']:
+        return jsonify({"error": "Upload is incomplete", **partial_upload_view(upload_id, upload)}), 409
+    try:
+        with open(partial_upload_paths(upload_id)[1], 'rb') as stream:
+            path = store_stream(stream, MAX_RESUMABLE_UPLOAD_SIZE)
+    except UploadRejected as e:
+        discard_partial_upload(upload_id)
+        return jsonify({"error": str(e)}), 400
+    discard_partial_upload(upload_id)
+    return jsonify(uploaded_image_response(path, upload['kind']))
+
+@app.route('/api/upload/resumable/<upload_id>', methods=['DELETE'])
+@require_auth
+def cancel_resumable_upload(upload_id):
+    """Abandon a resumable upload"""
+    if load_partial_upload(upload_id) is None:
+        return jsonify({"error": "Upload not found"}), 404
+    discard_partial_upload(upload_id)
+    return jsonify({"success": True})
 
-        # Load template
-        template_path = 'templates/map-template.html'
-        if not os.path.exists(template_path):
-            return jsonify({"error": "Template not found"}), 500
+# Template engine
+# A small compiled-template layer for the generated pages. Supported syntax:
+#   {{ a.b.c }}               value lookup, HTML-escaped
+#   {{ a.b|default:x|safe }}  filters: default:<text> for missing values, safe to skip escaping
+#   {% for x in a.b %}...{% endfor %}   with loop.index, loop.index0, loop.first, loop.last
+#   {% if [not] a.b %}...{% else %}...{% endif %}
+# A block tag on a line of its own doesn't leave the line behind in the output.
+TEMPLATE_TOKEN = re.compile(r'(\{\{.*?\}\}|\{%.*?%\})', re.S)
+
+class TemplateSyntaxError(ValueError):
+    pass
+
+def _parse_expression(expr):
+    """Split 'a.b|default:x|safe' into (path, default, safe)"""
+    parts = [p.strip() for p in expr.split('|')]
+    default = None
+    safe = False
+    for f in parts[1:]:
+        if f == 'safe':
+            safe = True
+        elif f.startswith('default:'):
+            default = f[len('default:'):]
+        else:
+            raise TemplateSyntaxError(f"Unknown filter: {f}")
+    return parts[0].split('.'), default, safe
+
+def compile_template(source):
+    """Parse template source into a render plan of nested tuples"""
+    tokens = [t for t in TEMPLATE_TOKEN.split(source)]
+    # Drop the indentation before, and the newline after, block tags
+    for i, token in enumerate(tokens):
+        if token.startswith('{%'):
+            if i > 0:
+                head, newline, tail = tokens[i - 1].rpartition('\n')
+                if (newline or i == 1) and not tail.strip():
+                    tokens[i - 1] = head + newline
+            if i + 1 < len(tokens) and tokens[i + 1].startswith('\n'):
+                tokens[i + 1] = tokens[i + 1][1:]
+
+    root = []
+    stack = [('root', root, None)]
+    for token in tokens:
+        if not token:
+            continue
+        if token.startswith('{{'):
+            stack[-1][1].append(('var',) + _parse_expression(token[2:-2]))
+        elif token.startswith('{%'):
+            words = token[2:-2].split()
+            tag = words[0] if words else ''
+            if tag == 'for':
+                if len(words) != 4 or words[2] != 'in':
+                    raise TemplateSyntaxError(f"Bad for tag: {token}")
+                node = ('for', words[1], words[3].split('.'), [])
+                stack[-1][1].append(node)
+                stack.append(('for', node[3], node))
+            elif tag == 'if':
+                negate = len(words) == 3 and words[1] == 'not'
+                if len(words) != (3 if negate else 2):
+                    raise TemplateSyntaxError(f"Bad if tag: {token}")
+                node = ('if', words[-1].split('.'), negate, [], [])
+                stack[-1][1].append(node)
+                stack.append(('if', node[3], node))
+            elif tag == 'else':
+                if stack[-1][0] != 'if':
+                    raise TemplateSyntaxError("else outside if")
+                stack[-1] = ('else', stack[-1][2][4], stack[-1][2])
+            elif tag in ('endfor', 'endif'):
+                opened = stack.pop()[0] if len(stack) > 1 else 'root'
+                if {'endfor': ('for',), 'endif': ('if', 'else')}[tag].count(opened) == 0:
+                    raise TemplateSyntaxError(f"Unexpected {tag}")
+            else:
+                raise TemplateSyntaxError(f"Unknown tag: {token}")
+        else:
+            stack[-1][1].append(('text', token))
+    if len(stack) != 1:
+        raise TemplateSyntaxError(f"Unclosed {stack[-1][0]} block")
+    return root
+
+def _resolve(context, path):
+    value = context.get(path[0])
+    for part in path[1:]:
+        if value is None:
+            return None
+        value = value.get(part) if isinstance(value, dict) else getattr(value, part, None)
+    return value
+
+def render_plan(plan, context, out):
+    """Render a compiled plan, appending output chunks to the out list"""
+    for node in plan:
+        kind = node[0]
+        if kind == 'text':
+            out.append(node[1])
+        elif kind == 'var':
+            value = _resolve(context, node[1])
+            if value is None or value == '':
+                value = node[2]
+            if value is None:
+                continue
+            out.append(str(value) if node[3] else html_escape(str(value)))
+        elif kind == 'for':
+            items = _resolve(context, node[2]) or []
+            last = len(items) - 1
+            for i, item in enumerate(items):
+                loop = {'index': i + 1, 'index0': i, 'first': i == 0, 'last': i == last}
+                render_plan(node[3], context.new_child({node[1]: item, 'loop': loop}), out)
+        elif kind == 'if':
+            if bool(_resolve(context, node[1])) != node[2]:
+                render_plan(node[3], context, out)
+            else:
+                render_plan(node[4], context, out)
+
+class Template:
+    """A compiled template"""
+
+    def __init__(self, source):
+        self.hash = hashlib.sha256(source.encode()).hexdigest()
+        self.plan = compile_template(source)
+
+    def render(self, **context):
+        out = []
+        render_plan(self.plan, ChainMap(context), out)
+        return ''.join(out)
+
+_template_cache = {}
+
+def get_template(name):
+    """Load a template from TEMPLATE_FOLDER, compiling it only when the file changed"""
+    path = os.path.join(TEMPLATE_FOLDER, name)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _template_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    with open(path, 'r') as f:
+        template = Template(f.read())
+    _template_cache[path] = (key, template)
+    return template
 
-        with open(template_path, 'r') as f:
-            template = f.read()
+# HTML Generation endpoint
+# Bump when the generated markup changes so every page is rebuilt once
+GENERATOR_VERSION = 4
+
+def content_hash(value):
+    """Stable hash of a JSON-serializable value"""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
 
-        generated_files = []
+def load_generation_manifest():
+    try:
+        with open(GENERATION_MANIFEST, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def venues_for_category(category, venues):
+    """Venues shown on a category page, in document order"""
+    category_venues = []
+    for v in venues:
+        # Support both old 'category' string and new 'categories' array
+        venue_categories = v.get('categories', [])
+        # Fallback to legacy 'category' field if 'categories' not present
+        if not venue_categories and v.get('category'):
+            venue_categories = [v.get('category')]
+        if category['id'] in venue_categories:
+            category_venues.append(v)
+    return category_venues
+
+def page_dependencies(category_venues):
+    """Ids of the venues, maps and locations a category page renders"""
+    maps = [m for v in category_venues for m in v.get('maps', [])]
+    return {
+        'venues': [v['id'] for v in category_venues],
+        'maps': [m['id'] for m in maps],
+        'locations': [loc['id'] for m in maps for loc in m.get('locations', [])],
+    }
+
+_generation_pool = None
+
+def mark_pool_worker():
+    """Pool initializer: keep workers away from the stores
+
+    Under the spawn/forkserver start methods every worker imports this
+    module afresh. Nothing is loaded at import, and with this flag set a
+    worker that touched the data or photo request store would fail
+    instead of replaying (and at exit compacting) the journal itself.
+    """
+    global _pool_worker
+    _pool_worker = True
+
+def get_generation_pool():
+    global _generation_pool
+    if _generation_pool is None:
+        _generation_pool = ProcessPoolExecutor(max_workers=GENERATION_WORKERS, initializer=mark_pool_worker)
+    return _generation_pool
+
+def render_category_page(filename, category, category_venues):
+    """Render one category page and write it atomically (runs in a pool worker)"""
+    # Generate venues HTML (empty string if no venues)
+    venues_html = generate_venues_html(category_venues) if category_venues else ''
+    html = get_template('map-template.html').render(CATEGORY_NAME=category['name'], VENUES_CONTENT=venues_html)
+    write_text_atomic(filename, html)
+    write_compressed_siblings(filename)
+    return filename
+
+def render_category_pages(tasks, progress):
+    """Render (filename, category, venues) tasks, fanned out over the process pool"""
+    global _generation_pool
+    if len(tasks) > 1 and GENERATION_WORKERS > 1:
+        try:
+            futures = [get_generation_pool().submit(render_category_page, *task) for task in tasks]
+            for future in as_completed(futures):
+                future.result()
+                progress()
+            return
+        except BrokenProcessPool:
+            print("[Generate] Process pool broke, rendering serially")
+            _generation_pool = None
+    for task in tasks:
+        render_category_page(*task)
+        progress()
+
+# Public data export
+# Viewer pages read public-data/manifest.json (categories and shard names)
+# and one minified shard per category, named by content hash so shards
+# can be cached forever. Only fields the viewer shows are exported.
+PUBLIC_VENUE_FIELDS = ('id', 'name', 'type')
+PUBLIC_MAP_FIELDS = ('id', 'label', 'subtitle', 'image')
+PUBLIC_LOCATION_FIELDS = ('id', 'number', 'name', 'description', 'fiber', 'image', 'position')
+
+def pick(entity, fields):
+    return {field: entity[field] for field in fields if field in entity}
+
+def public_venue(venue):
+    return {**pick(venue, PUBLIC_VENUE_FIELDS), 'maps': [
+        {**pick(m, PUBLIC_MAP_FIELDS), 'locations': [pick(loc, PUBLIC_LOCATION_FIELDS) for loc in m.get('locations', [])]}
+        for m in venue.get('maps', [])
+    ]}
+
+def write_public_export(data):
+    """Write the manifest and category shards; returns the shard files written"""
+    os.makedirs(PUBLIC_EXPORT_FOLDER, exist_ok=True)
+    venues = data.get('venues', [])
+    written, keep = [], {'manifest.json'}
+    categories = []
+    for category in data.get('categories', []):
+        shard = {'category': pick(category, ('id', 'name', 'slug')),
+                 'venues': [public_venue(v) for v in venues_for_category(category, venues)]}
+        body = json.dumps(shard, separators=(',', ':'))
+        name = f"{secure_filename(category['slug']) or category['id']}.{hashlib.sha256(body.encode()).hexdigest()[:12]}.json"
+        path = os.path.join(PUBLIC_EXPORT_FOLDER, name)
+        if not os.path.exists(path):
+            write_text_atomic(path, body)
+            write_compressed_siblings(path)
+            written.append(path)
+        keep.add(name)
+        categories.append({**shard['category'], 'shard': f"{PUBLIC_EXPORT_FOLDER}/{name}"})
+
+    manifest_path = os.path.join(PUBLIC_EXPORT_FOLDER, 'manifest.json')
+    write_text_atomic(manifest_path, json.dumps({'categories': categories}, separators=(',', ':')))
+    write_compressed_siblings(manifest_path)
+
+    # Drop shards (and their .gz/.br) that the new manifest no longer lists
+    for name in os.listdir(PUBLIC_EXPORT_FOLDER):
+        if name.split('.json', 1)[0] + '.json' not in keep:
+            os.remove(os.path.join(PUBLIC_EXPORT_FOLDER, name))
+    return written
+
+def generate_site(data, force=False, progress=None):
+    """Generate the category pages and index.html from a data snapshot
+
+    Only pages whose inputs (templates, category, rendered venues, or
+    landing page config) changed since the last run are rewritten.
+    progress(done, total) is called as pages finish.
+    """
+    categories = data.get('categories', [])
+    venues = data.get('venues', [])
+
+    # Load templates
+    template = get_template('map-template.html')
+    venues_template = get_template('venues-template.html')
+    index_template = get_template('index-template.html')
+    template_hash = template.hash + venues_template.hash
+
+    previous = {} if force else load_generation_manifest()
+    manifest = {}
+    tasks = []
+    skipped_files = []
+
+    for category in categories:
+        filename = f"{category['slug']}.html"
+        category_venues = venues_for_category(category, venues)
+        inputs_hash = content_hash([GENERATOR_VERSION, template_hash, category, category_venues,
+                                    variants_signature(category_venues)])
+        manifest[filename] = {'hash': inputs_hash, 'deps': page_dependencies(category_venues)}
+
+        if previous.get(filename, {}).get('hash') == inputs_hash and os.path.exists(filename):
+            skipped_files.append(filename)
+        else:
+            tasks.append((filename, category, category_venues))
+
+    # Generate index.html from landingPage config
+    landing_page = data.get('landingPage', {})
+    index_changed = False
+    if landing_page.get('cards'):
+        inputs_hash = content_hash([GENERATOR_VERSION, index_template.hash, landing_page, categories])
+        manifest['index.html'] = {'hash': inputs_hash, 'deps': {'categories': [c['id'] for c in categories]}}
+        if previous.get('index.html', {}).get('hash') == inputs_hash and os.path.exists('index.html'):
+            skipped_files.append('index.html')
+        else:
+            index_changed = True
 
-        for category in categories:
-            # Support both old 'category' string and new 'categories' array
-            category_venues = []
-            for v in venues:
-                venue_categories = v.get('categories', [])
-                # Fallback to legacy 'category' field if 'categories' not present
-                if not venue_categories and v.get('category'):
-                    venue_categories = [v.get('category')]
-                if category['id'] in venue_categories:
-                    category_venues.append(v)
+    total = len(tasks) + (1 if index_changed else 0)
+    done = [0]
 
-            # Generate venues HTML (empty string if no venues)
-            venues_html = generate_venues_html(category_venues) if category_venues else ''
+    def page_done():
+        done[0] += 1
+        if progress:
+            progress(done[0], total)
 
-            # Replace template placeholders
-            html = template.replace('{{CATEGORY_NAME}}', category['name'])
-            html = html.replace('{{VENUES_CONTENT}}', venues_html)
+    render_category_pages(tasks, page_done)
+    generated_files = [task[0] for task in tasks]
 
-            # Write to file
-            filename = f"{category['slug']}.html"
-            with open(filename, 'w') as f:
-                f.write(html)
+    if index_changed:
+        write_text_atomic('index.html', generate_index_html(landing_page, categories))
+        write_compressed_siblings('index.html')
+        generated_files.append('index.html')
+        page_done()
 
-            generated_files.append(filename)
+    write_json_atomic(GENERATION_MANIFEST, manifest)
+    exported = write_public_export(data)
+    return {"success": True, "files": generated_files + exported, "skipped": skipped_files}
 
-        # Generate index.html from landingPage config
-        landing_page = data.get('landingPage', {})
-        if landing_page.get('cards'):
-            index_html = generate_index_html(landing_page, categories)
-            with open('index.html', 'w') as f:
-                f.write(index_html)
-            generated_files.append('index.html')
+@app.route('/api/generate-html', methods=['POST'])
+@require_auth
+def generate_html():
+    """Generate HTML files from data
+
+    Unchanged pages are reported as skipped. Pass {"force": true} to
+    rebuild all, and {"async": true} to get a job id back immediately
+    and poll /api/jobs/<id> for progress.
+    """
+    body = request.get_json(silent=True) or {}
+    force = bool(body.get('force')) or request.args.get('force') in ('1', 'true')
+    run_async = bool(body.get('async')) or request.args.get('async') in ('1', 'true')
+
+    for name in ('map-template.html', 'venues-template.html', 'index-template.html'):
+        if not os.path.exists(os.path.join(TEMPLATE_FOLDER, name)):
+            return jsonify({"error": "Template not found"}), 500
 
-        return jsonify({"success": True, "files": generated_files})
+    data = data_store.snapshot()
+    if run_async:
+        job = start_job('generate-html', lambda progress: generate_site(data, force, progress), {'force': force})
+        return jsonify({"success": True, "jobId": job['id']}), 202
 
+    try:
+        return jsonify(generate_site(data, force))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -541,351 +4129,260 @@ def generate_index_html(landing_page, categories):
     visible_cards = [c for c in cards if c.get('visible', True)]
     visible_cards.sort(key=lambda x: x.get('order', 0))
 
-    cards_html = ''
+    slugs = {c['id']: c['slug'] for c in categories}
+    card_views = []
     for card in visible_cards:
         # Determine link URL
         if card.get('type') == 'custom':
             href = card.get('url', '#')
         else:
-            # Find category slug
-            category = next((c for c in categories if c['id'] == card.get('categoryId')), None)
-            href = f"{category['slug']}.html" if category else '#'
-
-        cards_html += f'''
-            <a href="{href}" class="link-card">
-                <div class="card-accent"></div>
-                <div class="link-card-content">
-                    <h3>{card.get('title', '')}</h3>
-                    <p>{card.get('description', '')}</p>
-                    <div class="link-button">
-                        <span>{card.get('buttonText', 'View')}</span>
-                        <svg width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2">
-                            <path d="M5 12h14M12 5l7 7-7 7"/>
-                        </svg>
-                    </div>
-                </div>
-            </a>
-'''
-
-    return f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <link rel="icon" href="auburn-logo.png">
-    <link rel="preconnect" href="https://fonts.googleapis.com">
-    <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-    <style>
-        :root {{
-            --primary-navy: #0C2340;
-            --primary-orange: #E87722;
-            --primary-orange-dark: #D4531B;
-            --background: #f0f2f5;
-            --surface: #ffffff;
-            --text-primary: #1f2937;
-            --text-secondary: #4b5563;
-            --border-color: #e5e7eb;
-            --shadow-md: 0 4px 6px -1px rgba(0, 0, 0, 0.1), 0 2px 4px -1px rgba(0, 0, 0, 0.06);
-            --shadow-lg: 0 10px 15px -3px rgba(0, 0, 0, 0.1), 0 4px 6px -2px rgba(0, 0, 0, 0.05);
-            --shadow-xl: 0 20px 25px -5px rgba(0, 0, 0, 0.1), 0 10px 10px -5px rgba(0, 0, 0, 0.04);
-            --radius-md: 12px;
-            --radius-lg: 16px;
-        }}
-
-        * {{
-            box-sizing: border-box;
-        }}
-
-        body {{
-            font-family: 'Inter', -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background-color: var(--background);
-            color: var(--text-primary);
-            margin: 0;
-            padding: 0;
-            display: flex;
-            flex-direction: column;
-            min-height: 100vh;
-            line-height: 1.5;
-        }}
-
-        .header {{
-            background: linear-gradient(180deg, var(--primary-navy) 0%, #0a1d33 100%);
-            color: white;
-            padding: 1.25rem 2rem;
-            display: flex;
-            align-items: center;
-            box-shadow: 0 4px 20px rgba(0, 0, 0, 0.15);
-            position: sticky;
-            top: 0;
-            z-index: 100;
-        }}
-
-        .header img {{
-            height: 50px;
-            margin-right: 1rem;
-            filter: drop-shadow(0 2px 4px rgba(0, 0, 0, 0.2));
-        }}
-
-        .header h1 {{
-            font-size: 1.75rem;
-            font-weight: 700;
-            margin: 0;
-            letter-spacing: 0.02em;
-            color: var(--primary-orange);
-            text-shadow: 0 2px 4px rgba(0, 0, 0, 0.2);
-        }}
-
-        .main-content {{
-            flex-grow: 1;
-            padding: 2.5rem 2rem;
-            max-width: 1100px;
-            margin: 0 auto;
-            width: 100%;
-        }}
-
-        .page-intro {{
-            text-align: center;
-            margin-bottom: 2.5rem;
-        }}
-
-        .page-intro h2 {{
-            color: var(--primary-navy);
-            font-size: 1.5rem;
-            font-weight: 600;
-            margin: 0 0 0.5rem 0;
-        }}
-
-        .page-intro p {{
-            color: var(--text-secondary);
-            margin: 0;
-        }}
-
-        .grid-container {{
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 1.5rem;
-        }}
-
-        .link-card {{
-            background-color: var(--surface);
-            border-radius: var(--radius-lg);
-            box-shadow: var(--shadow-md);
-            overflow: hidden;
-            transition: transform 0.25s ease, box-shadow 0.25s ease;
-            display: flex;
-            flex-direction: column;
-            border: 1px solid var(--border-color);
-            text-decoration: none;
-            position: relative;
-        }}
-
-        .link-card:hover {{
-            transform: translateY(-6px);
-            box-shadow: var(--shadow-xl);
-        }}
-
-        .card-accent {{
-            height: 4px;
-            background: linear-gradient(90deg, var(--primary-orange) 0%, var(--primary-navy) 100%);
-        }}
-
-        .link-card-content {{
-            padding: 1.75rem;
-            flex-grow: 1;
-            display: flex;
-            flex-direction: column;
-        }}
-
-        .link-card-content h3 {{
-            font-size: 1.35rem;
-            font-weight: 600;
-            margin: 0 0 0.75rem 0;
-            color: var(--primary-navy);
-        }}
-
-        .link-card-content p {{
-            font-size: 0.95rem;
-            color: var(--text-secondary);
-            margin: 0 0 1.5rem 0;
-            flex-grow: 1;
-            line-height: 1.6;
-        }}
-
-        .link-button {{
-            display: inline-flex;
-            align-items: center;
-            justify-content: center;
-            gap: 0.5rem;
-            background: linear-gradient(135deg, var(--primary-orange) 0%, var(--primary-orange-dark) 100%);
-            color: white;
-            padding: 0.875rem 1.5rem;
-            border-radius: var(--radius-md);
-            font-weight: 600;
-            font-size: 0.9rem;
-            transition: all 0.2s ease;
-            text-transform: uppercase;
-            letter-spacing: 0.05em;
-            box-shadow: 0 2px 8px rgba(232, 119, 34, 0.3);
-        }}
-
-        .link-card:hover .link-button {{
-            background: linear-gradient(135deg, var(--primary-orange-dark) 0%, #c45a15 100%);
-            box-shadow: 0 4px 12px rgba(232, 119, 34, 0.4);
-        }}
-
-        .link-button svg {{
-            transition: transform 0.2s ease;
-        }}
-
-        .link-card:hover .link-button svg {{
-            transform: translateX(4px);
-        }}
-
-        .footer {{
-            background: linear-gradient(180deg, var(--primary-navy) 0%, #0a1d33 100%);
-            color: #9ca3af;
-            text-align: center;
-            padding: 1.5rem;
-            font-size: 0.875rem;
-            margin-top: auto;
-        }}
-
-        .footer p {{
-            margin: 0;
-        }}
-
-        @media (max-width: 768px) {{
-            .header {{
-                padding: 1rem 1.25rem;
-            }}
-
-            .header h1 {{
-                font-size: 1.35rem;
-            }}
-
-            .header img {{
-                height: 40px;
-            }}
-
-            .main-content {{
-                padding: 1.5rem 1rem;
-            }}
-
-            .grid-container {{
-                grid-template-columns: 1fr;
-            }}
-        }}
-    </style>
-</head>
-<body>
-
-    <header class="header">
-        <img src="auburn-logo.png" alt="Auburn Logo">
-        <h1>{title}</h1>
-    </header>
-
-    <main class="main-content">
-        <div class="page-intro">
-            <h2>Welcome to Auburn Athletics</h2>
-            <p>Select a category below to view venue information and maps</p>
-        </div>
-        <div class="grid-container">
-{cards_html}
-        </div>
-    </main>
-
-    <footer class="footer">
-        <p>&copy; <span id="currentYear"></span> Auburn Athletics Department. All rights reserved.</p>
-    </footer>
-
-    <script>
-        document.getElementById('currentYear').textContent = new Date().getFullYear();
-    </script>
-
-</body>
-</html>
-'''
+            slug = slugs.get(card.get('categoryId'))
+            href = f"{slug}.html" if slug else '#'
+        card_views.append({**card, 'href': href, 'buttonText': card.get('buttonText', 'View')})
+
+    return get_template('index-template.html').render(title=title, cards=card_views)
+
+MAP_IMAGE_SIZES = '(max-width: 768px) 100vw, 1024px'
+
+def srcset(descriptor, fmt):
+    return ', '.join(f"{size['files'][fmt]} {size['width']}w"
+                     for size in sorted(descriptor['sizes'].values(), key=lambda size: size['width'])
+                     if fmt in size['files'])
+
+def variant_file(descriptor, name, formats):
+    """Path of the first available encoding of a derivative size"""
+    size = (descriptor or {}).get('sizes', {}).get(name)
+    if not size:
+        return ''
+    return next((size['files'][fmt] for fmt in formats if fmt in size['files']), '')
+
+def picture_view(image_path):
+    """<picture> sources for a map image, or None if it has no derivatives"""
+    descriptor = image_variants(image_path)
+    if not descriptor or not descriptor.get('sizes'):
+        return None
+    fallback, modern = descriptor['formats'][0], descriptor['formats'][1:]
+    return {
+        'sources': [{'type': IMAGE_MIME_TYPES[fmt], 'srcset': srcset(descriptor, fmt)} for fmt in modern],
+        'srcset': srcset(descriptor, fallback),
+        'sizes': MAP_IMAGE_SIZES,
+    }
+
+def tiles_view(image_path):
+    """Tile pyramid info for a tiled map panel, or None"""
+    tiles = map_tiles(image_path)
+    if not tiles:
+        return None
+    return {
+        # The single level-0 tile stands in for the image until tiles load
+        'preview': tiles['url'].replace('{z}', '0').replace('{x}', '0').replace('{y}', '0'),
+        'json': json.dumps({key: tiles[key] for key in ('width', 'height', 'tileSize', 'url', 'levels')},
+                           separators=(',', ':')),
+    }
+
+def venue_view(venue):
+    """Venue with image derivative info attached, for venues-template.html"""
+    maps = []
+    for m in venue.get('maps', []):
+        locations = []
+        for loc in m.get('locations', []):
+            descriptor = image_variants(loc.get('image'))
+            locations.append({
+                **loc,
+                'thumb': variant_file(descriptor, 'thumb', ('webp', 'jpg', 'png')),
+                'imageMedium': variant_file(descriptor, 'medium', ('webp', 'jpg', 'png')),
+            })
+        # Large maps leave their markers out; script.js loads the visible ones
+        lazy = len(locations) > MARKER_LAZY_THRESHOLD
+        maps.append({**m, 'picture': picture_view(m.get('image')), 'tiles': tiles_view(m.get('image')),
+                     'lazyMarkers': lazy, 'locations': [] if lazy else locations})
+    return {**venue, 'maps': maps}
+
+def variants_signature(category_venues):
+    """Descriptor mtimes of the images a page uses, so new derivatives trigger a rebuild"""
+    signature = []
+    for path in entity_image_paths('venue', {'maps': [m for v in category_venues for m in v.get('maps', [])]}):
+        for descriptor in ('variants.json', 'tiles.json'):
+            try:
+                signature.append(os.stat(os.path.join(variant_dir(path), descriptor)).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+    return signature
 
 def generate_venues_html(venues):
     """Generate HTML for venues"""
-    html_parts = []
-
-    for venue in venues:
-        venue_html = f'''
-        <section class="venue" id="{venue['id']}">
-            <h2 class="venue-title">{venue['name']}</h2>
-            <div class="map-tabs">
-        '''
-
-        # Add map tabs
-        for i, m in enumerate(venue.get('maps', [])):
-            active = 'active' if i == 0 else ''
-            venue_html += f'''
-                <button class="map-tab {active}" data-map="{m['id']}">{m['label']}</button>
-            '''
-
-        venue_html += '</div><div class="maps-container">'
-
-        # Add maps
-        for i, m in enumerate(venue.get('maps', [])):
-            active = 'active' if i == 0 else ''
-            venue_html += f'''
-            <div class="map-panel {active}" id="{m['id']}">
-                <div class="map-container">
-                    <img src="{m['image']}" alt="{m['label']}" class="map-image">
-            '''
-
-            # Add location markers with full data attributes
-            for loc in m.get('locations', []):
-                pos = loc.get('position', {})
-                top = pos.get('top', '0%')
-                left = pos.get('left', '0%')
-                name = html_escape(loc.get('name', ''))
-                description = html_escape(loc.get('description', ''))
-                fiber = html_escape(loc.get('fiber', ''))
-                image = loc.get('image', '')
-                number = loc.get('number', '')
-                map_label = html_escape(m.get('label', ''))
-                venue_name = html_escape(venue.get('name', ''))
-                venue_html += f'''
-                    <div class="location-marker" style="top: {top}; left: {left};"
-                         data-location-id="{loc['id']}"
-                         data-venue-id="{venue['id']}"
-                         data-map-id="{m['id']}"
-                         data-name="{name}"
-                         data-description="{description}"
-                         data-fiber="{fiber}"
-                         data-image="{image}"
-                         data-number="{number}"
-                         data-venue-name="{venue_name}"
-                         data-map-label="{map_label}">
-                        <span class="marker-number">{number}</span>
-                    </div>
-                '''
-
-            venue_html += '''
-                </div>
-            </div>
-            '''
-
-        venue_html += '</div></section>'
-        html_parts.append(venue_html)
-
-    return '\n'.join(html_parts)
+    return get_template('venues-template.html').render(venues=[venue_view(v) for v in venues])
+
+# Background jobs
+class JobScheduler:
+    """Runs long admin operations on a bounded thread pool
+
+    Job records (status, progress, result, error) live in JOBS_FILE, which
+    every server process shares: a process merges its own jobs into the
+    file under a file lock whenever one changes state (and every
+    JOB_PROGRESS_SAVE_INTERVAL while it runs), and reads other processes'
+    jobs from it, so any worker can answer for any job. Queued or running
+    jobs whose process is gone (or is this one, restarted with the same
+    pid, and no longer running them) are reported and saved as failed.
+    """
+
+    def __init__(self, path, workers):
+        self.path = path
+        self.lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}  # id -> record of the unfinished jobs this process runs
+
+    def _read(self):
+        """Job records in the shared file, with orphaned jobs marked failed"""
+        try:
+            with open(self.path, 'r') as f:
+                records = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        with self.lock:
+            running = set(self._jobs)
+        for record in records:
+            if record['status'] in ('queued', 'running') and record['id'] not in running and (
+                    record.get('pid') == os.getpid() or not process_alive(record.get('pid'))):
+                record['status'] = 'failed'
+                record['error'] = 'Interrupted by server restart'
+        return records
+
+    def _merge(self, job):
+        """Write job into the shared file, saving orphaned jobs as failed"""
+        try:
+            with file_lock(self.path):
+                records = {j['id']: j for j in self._read()}
+                records[job['id']] = dict(job)
+                records = sorted(records.values(), key=lambda j: j['created'])
+                finished = [j for j in records if j['status'] in ('done', 'failed')]
+                dropped = {j['id'] for j in finished[:max(0, len(finished) - JOB_HISTORY)]}
+                write_json_atomic(self.path, [j for j in records if j['id'] not in dropped])
+        except Exception as e:
+            print(f"[Jobs] Failed to save job records: {e}")
+
+    def submit(self, kind, target, params=None):
+        """Queue target(progress) as a job and return its record
+
+        target receives a progress(done, total) callback; its return value
+        becomes the job result.
+        """
+        job = {
+            'id': generate_id(),
+            'kind': kind,
+            'params': params or {},
+            'status': 'queued',
+            'progress': {'done': 0, 'total': None},
+            'result': None,
+            'error': None,
+            'created': datetime.now().isoformat(),
+            'started': None,
+            'finished': None,
+            'pid': os.getpid(),
+        }
+        saved_at = [0.0]
+
+        def progress(done, total):
+            job['progress'] = {'done': done, 'total': total}
+            if time.monotonic() - saved_at[0] >= JOB_PROGRESS_SAVE_INTERVAL:
+                saved_at[0] = time.monotonic()
+                self._merge(job)
+
+        def run():
+            job['status'] = 'running'
+            job['started'] = datetime.now().isoformat()
+            self._merge(job)
+            try:
+                job['result'] = target(progress)
+                job['status'] = 'done'
+            except Exception as e:
+                print(f"[Jobs] {kind} job {job['id']} failed: {e}")
+                job['error'] = str(e)
+                job['status'] = 'failed'
+            job['finished'] = datetime.now().isoformat()
+            self._merge(job)
+            with self.lock:
+                self._jobs.pop(job['id'], None)
+
+        with self.lock:
+            self._jobs[job['id']] = job
+        self._merge(job)
+        self._executor.submit(run)
+        return job
+
+    def _records(self):
+        """All jobs by id: the shared file, with this process's running jobs up to date"""
+        records = {j['id']: j for j in self._read()}
+        with self.lock:
+            records.update((job_id, dict(job)) for job_id, job in self._jobs.items())
+        return records
+
+    def get(self, job_id):
+        return self._records().get(job_id)
+
+    def list(self, kind=None, status=None):
+        """Jobs newest first, optionally filtered by kind and status"""
+        records = self._records().values()
+        records = [j for j in records
+                   if (kind is None or j['kind'] == kind) and (status is None or j['status'] == status)]
+        return sorted(records, key=lambda j: j['created'], reverse=True)
+
+def process_alive(pid):
+    """Whether a process with this id is running on this machine"""
+    if not pid:
+        return False
+    if os.name != 'posix':  # Signal 0 is only a liveness check on POSIX
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+job_scheduler = JobScheduler(JOBS_FILE, JOB_WORKERS)
+
+def start_job(kind, target, params=None):
+    """Queue a background job (see JobScheduler.submit)"""
+    return job_scheduler.submit(kind, target, params)
+
+def start_image_cleanup(kind, entity):
+    """Delete a removed venue's or map's images in a background job"""
+    paths = entity_image_paths(kind, entity)
+    if not paths:
+        return None
+
+    def run(progress):
+        for i, path in enumerate(paths):
+            delete_image_file(path)
+            progress(i + 1, len(paths))
+        return {'deleted': len(paths)}
+
+    return start_job('delete-images', run, {'kind': kind, 'id': entity.get('id')})
+
+@app.route('/api/jobs', methods=['GET'])
+@require_auth
+def list_jobs():
+    """List background jobs, newest first (?kind=&status=&limit=)"""
+    limit = request.args.get('limit', 50, type=int)
+    records = job_scheduler.list(request.args.get('kind'), request.args.get('status'))
+    return jsonify(records[:max(0, limit)])
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_job(job_id):
+    """Get the status, progress and result of a background job"""
+    job = job_scheduler.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 # Photo Request endpoints
 @app.route('/api/photo-requests', methods=['POST'])
 def create_photo_request():
     """Submit a photo request (public - no auth required)"""
     try:
-        data = load_data()
-
-        # Initialize photoRequests if not exists
-        if 'photoRequests' not in data:
-            data['photoRequests'] = []
-
         # Get form data
         location_id = request.form.get('locationId', '')
         location_name = request.form.get('locationName', 'Unknown')
@@ -912,112 +4409,88 @@ def create_photo_request():
         if 'photo' in request.files:
             file = request.files['photo']
             if file and file.filename != '' and allowed_file(file.filename):
-                ext = file.filename.rsplit('.', 1)[1].lower()
-                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                filename = f"request-{timestamp}-{secrets.token_hex(4)}.{ext}"
-                filepath = os.path.join(UPLOAD_FOLDER, 'photo-requests', filename)
-                file.save(filepath)
-                photo_request['uploadedPhoto'] = f"uploads/photo-requests/{filename}"
-
-        data['photoRequests'].append(photo_request)
-        save_data(data)
+                # Derivatives wait for approval so anonymous uploads cost no resizing
+                photo_request['uploadedPhoto'] = store_upload(file)
+
+        photo_requests.insert(photo_request)
 
         return jsonify({"success": True, "request": photo_request}), 201
+    except UploadRejected as e:
+        return jsonify({"error": str(e)}), 400
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/photo-requests', methods=['GET'])
 @require_auth
 def get_photo_requests():
-    """Get all pending photo requests (admin only)"""
-    data = load_data()
-    requests = data.get('photoRequests', [])
-    # Filter to only pending requests
-    pending = [r for r in requests if r.get('status') == 'pending']
-    return jsonify(pending)
+    """List photo requests, oldest first (admin only)
+
+    Query parameters: status (pending by default, or 'all'), venueId,
+    mapId and locationId filters, page (from 1) and perPage.
+    """
+    status = request.args.get('status', 'pending')
+    if status != 'all' and status not in PHOTO_REQUEST_STATUSES:
+        return jsonify({"error": f"status must be all or one of {', '.join(PHOTO_REQUEST_STATUSES)}"}), 400
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(max(1, request.args.get('perPage', PHOTO_REQUEST_PAGE_SIZE, type=int)), 4 * PHOTO_REQUEST_PAGE_SIZE)
+    filters = {key: request.args[key] for key in ('venueId', 'mapId', 'locationId') if request.args.get(key)}
+    with photo_requests.lock:
+        total, page_requests = photo_requests.query(None if status == 'all' else status, filters,
+                                                    (page - 1) * per_page, per_page)
+        etag = photo_requests.version_token()
+        modified_at = photo_requests.modified_at
+    # Polled by the admin page, so answer 304 until a request changes
+    response = jsonify({"requests": page_requests, "total": total, "page": page, "perPage": per_page})
+    response.set_etag(etag)
+    response.last_modified = modified_at
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/photo-requests/<request_id>', methods=['DELETE'])
 @require_auth
 def dismiss_photo_request(request_id):
-    """Dismiss/delete a photo request (admin only)"""
-    data = load_data()
-
-    if 'photoRequests' not in data:
-        return jsonify({"error": "Request not found"}), 404
-
-    # Find and remove the request
-    original_count = len(data['photoRequests'])
-    data['photoRequests'] = [r for r in data['photoRequests'] if r['id'] != request_id]
-
-    if len(data['photoRequests']) == original_count:
-        return jsonify({"error": "Request not found"}), 404
-
-    save_data(data)
+    """Dismiss a photo request and delete its photo (admin only)"""
+    with photo_requests.lock:
+        photo_request = photo_requests.find(request_id)
+        if photo_request is None:
+            return jsonify({"error": "Request not found"}), 404
+        if photo_request.get('status') != 'pending':
+            return jsonify({"error": f"Request is already {photo_request.get('status')}"}), 409
+        photo_requests.update(request_id, {'status': 'dismissed', 'resolvedAt': datetime.now().isoformat(),
+                                           'uploadedPhoto': None})
+    delete_entity_images('photoRequest', photo_request)
     return jsonify({"success": True})
 
 @app.route('/api/photo-requests/<request_id>/approve', methods=['POST'])
 @require_auth
 def approve_photo_request(request_id):
     """Approve a photo request and add the photo to the location (admin only)"""
-    data = load_data()
-
-    if 'photoRequests' not in data:
-        return jsonify({"error": "Request not found"}), 404
-
-    # Find the request
-    photo_request = None
-    for r in data['photoRequests']:
-        if r['id'] == request_id:
-            photo_request = r
-            break
+    with photo_requests.lock:
+        photo_request = photo_requests.find(request_id)
+        if not photo_request:
+            return jsonify({"error": "Request not found"}), 404
+        if photo_request.get('status') != 'pending':
+            return jsonify({"error": f"Request is already {photo_request.get('status')}"}), 409
 
-    if not photo_request:
-        return jsonify({"error": "Request not found"}), 404
+        if not photo_request.get('uploadedPhoto'):
+            return jsonify({"error": "No photo to approve"}), 400
 
-    if not photo_request.get('uploadedPhoto'):
-        return jsonify({"error": "No photo to approve"}), 400
+        # Find the location and update its image
+        venue_id = photo_request.get('venueId')
+        map_id = photo_request.get('mapId')
+        location_id = photo_request.get('locationId')
 
-    # Find the location and update its image
-    venue_id = photo_request.get('venueId')
-    map_id = photo_request.get('mapId')
-    location_id = photo_request.get('locationId')
+        if data_store.find('location', location_id, (venue_id, map_id)) is None:
+            return jsonify({"error": "Location not found"}), 404
 
-    location_found = False
-    for venue in data.get('venues', []):
-        if venue['id'] == venue_id:
-            for m in venue.get('maps', []):
-                if m['id'] == map_id:
-                    for loc in m.get('locations', []):
-                        if loc['id'] == location_id:
-                            # Move the uploaded photo to regular uploads folder
-                            old_path = photo_request['uploadedPhoto']
-                            if old_path.startswith('uploads/photo-requests/'):
-                                # Generate new filename
-                                ext = old_path.rsplit('.', 1)[1].lower()
-                                timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-                                new_filename = f"location-{timestamp}-{secrets.token_hex(4)}.{ext}"
-                                old_filepath = os.path.join('.', old_path)
-                                new_filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-
-                                # Move file
-                                if os.path.exists(old_filepath):
-                                    os.rename(old_filepath, new_filepath)
-                                    loc['image'] = f"uploads/{new_filename}"
-                                else:
-                                    loc['image'] = old_path
-                            else:
-                                loc['image'] = old_path
-
-                            location_found = True
-                            break
-
-    if not location_found:
-        return jsonify({"error": "Location not found"}), 404
+        # The location references the uploaded file directly; no move needed
+        data_store.update('location', location_id, {'image': photo_request['uploadedPhoto']}, (venue_id, map_id))
 
-    # Remove the request from photoRequests
-    data['photoRequests'] = [r for r in data['photoRequests'] if r['id'] != request_id]
+        photo_requests.update(request_id, {'status': 'approved', 'resolvedAt': datetime.now().isoformat()})
 
-    save_data(data)
+    queue_image_variants(photo_request['uploadedPhoto'])
     return jsonify({"success": True, "message": "Photo added to location"})
 
 
@@ -1030,49 +4503,74 @@ def track_pageview():
         session_id = secrets.token_hex(16)
 
     page = request.json.get('page', '/') if request.is_json else '/'
-    track_visit(session_id)
+    track_visit(session_id, page)
 
     response = jsonify({"success": True})
     # Set cookie for 1 year
     response.set_cookie('visitor_id', session_id, max_age=365*24*60*60, httponly=True, samesite='Lax')
     return response
 
+def parse_analytics_time(value, default):
+    """Parse a YYYY-MM, YYYY-MM-DD or YYYY-MM-DDTHH query parameter"""
+    if not value:
+        return default
+    for fmt in ('%Y-%m-%dT%H', '%Y-%m-%d', '%Y-%m'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value}")
+
 # Get analytics data (admin only)
 @app.route('/api/analytics', methods=['GET'])
 @require_auth
 def get_analytics():
-    """Get analytics data"""
-    analytics = load_analytics()
-
-    # Get last 30 days
+    """Get analytics data
+
+    With start/end/granularity query parameters, returns that range of
+    buckets (granularity is hour, day or month; end defaults to now and
+    start to 30 buckets before end). Without them, returns the totals
+    and last-30-days summary used by the dashboard.
+    """
+    analytics = analytics_buffer.snapshot()
     today = datetime.now()
-    last_30_days = []
-    for i in range(30):
-        date = (today - timedelta(days=i)).strftime('%Y-%m-%d')
-        if date in analytics['daily']:
-            last_30_days.append({
-                'date': date,
-                'sessions': analytics['daily'][date]['sessions'],
-                'pageviews': analytics['daily'][date]['pageviews']
-            })
-        else:
-            last_30_days.append({
-                'date': date,
-                'sessions': 0,
-                'pageviews': 0
-            })
+
+    if any(key in request.args for key in ('start', 'end', 'granularity')):
+        granularity = request.args.get('granularity', 'day')
+        if granularity not in ANALYTICS_GRANULARITIES:
+            return jsonify({"error": "granularity must be hour, day or month"}), 400
+        step = {'hour': timedelta(hours=29), 'day': timedelta(days=29), 'month': timedelta(days=29 * 31)}[granularity]
+        try:
+            end = parse_analytics_time(request.args.get('end'), today)
+            start = parse_analytics_time(request.args.get('start'), end - step)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if start > end:
+            return jsonify({"error": "start must be before end"}), 400
+        span = {'hour': 3600, 'day': 86400, 'month': 28 * 86400}[granularity]
+        if (end - start).total_seconds() / span > ANALYTICS_MAX_BUCKETS:
+            return jsonify({"error": f"Range too large (max {ANALYTICS_MAX_BUCKETS} buckets)"}), 400
+        return jsonify(query_analytics(analytics, start, end, granularity))
+
+    # Get last 30 days, newest first
+    last_30 = query_analytics(analytics, today - timedelta(days=29), today, 'day')
+    last_30_days = [
+        {'date': b['bucket'], 'sessions': b['sessions'], 'pageviews': b['pageviews']}
+        for b in reversed(last_30['buckets'])
+    ]
+    today_stats = analytics['daily'].get(today.strftime('%Y-%m-%d'), {})
 
     return jsonify({
         'total_sessions': analytics['total_sessions'],
         'total_pageviews': analytics['total_pageviews'],
         'last_30_days': last_30_days,
-        'today': analytics['daily'].get(today.strftime('%Y-%m-%d'), {'sessions': 0, 'pageviews': 0})
+        'today': {'sessions': today_stats.get('sessions', 0), 'pageviews': today_stats.get('pageviews', 0)}
     })
 
 # Error handlers
 @app.errorhandler(413)
 def too_large(e):
-    return jsonify({"error": "File too large. Maximum size is 5MB."}), 413
+    return jsonify({"error": f"File too large. Maximum size is {MAX_CONTENT_LENGTH // (1024 * 1024)}MB."}), 413
 
 @app.errorhandler(404)
 def not_found(e):
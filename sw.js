@@ -3,26 +3,15 @@
  * Provides offline support and aggressive caching for fast loading
  */
 
-const CACHE_VERSION = 'v4';
+// Filled in by the server with the current fingerprinted asset manifest
+// (see /asset-manifest.json); these defaults only apply to static hosting.
+const ASSET_MANIFEST = {"version": "dev", "assets": {}, "precache": ["/", "/index.html", "/style.css", "/script.js"]};
+
+const CACHE_VERSION = ASSET_MANIFEST.version;
 const STATIC_CACHE = `wep-static-${CACHE_VERSION}`;
-const IMAGE_CACHE = `wep-images-${CACHE_VERSION}`;
-
-const STATIC_ASSETS = [
-  '/',
-  '/index.html',
-  '/Fiber.html',
-  '/ESPN.html',
-  '/camera_positions.html',
-  '/test-category.html',
-  '/style.css',
-  '/script.js',
-  '/header.js',
-  '/nav.js',
-  '/search.js',
-  '/data.json',
-  '/print.css',
-  '/manifest.json'
-];
+const IMAGE_CACHE = 'wep-images'; // Fingerprinted image URLs change with their content
+
+const STATIC_ASSETS = ASSET_MANIFEST.precache;
 
 // Install event - cache static assets immediately
 self.addEventListener('install', (event) => {
@@ -65,6 +54,12 @@ self.addEventListener('fetch', (event) => {
   // Skip external requests
   if (url.origin !== location.origin) return;
 
+  // Fingerprinted assets never change - no background revalidation
+  if (url.searchParams.has('v')) {
+    event.respondWith(cacheFirst(request, isImageRequest(request) ? IMAGE_CACHE : STATIC_CACHE));
+    return;
+  }
+
   // Handle images - cache first, very aggressive
   if (isImageRequest(request)) {
     event.respondWith(cacheFirstImage(request));
@@ -129,6 +124,21 @@ async function updateImageCache(request, cache) {
   }
 }
 
+// Cache-first for immutable (fingerprinted) responses
+async function cacheFirst(request, cacheName) {
+  const cache = await caches.open(cacheName);
+  const cachedResponse = await cache.match(request);
+  if (cachedResponse) {
+    return cachedResponse;
+  }
+
+  const response = await fetch(request);
+  if (response.ok) {
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
 // Cache-first with background update for static assets
 async function cacheFirstWithUpdate(request, cacheName) {
   const cache = await caches.open(cacheName);
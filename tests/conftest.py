@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SAMPLE_DATA = {
+    "categories": [],
+    "venues": [{
+        "id": "v1",
+        "name": "Stadium",
+        "maps": [{
+            "id": "m1",
+            "label": "Field Level",
+            "locations": [
+                {"id": "l1", "number": 1, "name": "North Gate", "position": {"top": "10%", "left": "20%"}},
+                {"id": "l2", "number": 2, "name": "Press Box", "position": {"top": "50%", "left": "60%"}},
+            ],
+        }],
+    }],
+    "landingPage": {"title": "Hub", "cards": []},
+}
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """The server module, working out of an empty directory holding SAMPLE_DATA
+
+    server.py keeps its files at paths relative to the working directory,
+    so it is imported (and its stores pointed at the new files) only once
+    the test has moved into tmp_path.
+    """
+    monkeypatch.chdir(tmp_path)
+    with open('data.json', 'w') as f:
+        json.dump(SAMPLE_DATA, f)
+    import server as module
+    for folder in (module.UPLOAD_FOLDER, os.path.join(module.UPLOAD_FOLDER, 'maps'),
+                   os.path.join(module.UPLOAD_FOLDER, 'photo-requests'), module.VISITORS_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+    module.data_store._data = None
+    module.photo_requests._requests = None
+    # Absolute, and left in place: background jobs may still be saving after the test
+    module.job_scheduler.path = str(tmp_path / module.JOBS_FILE)
+    yield module
+    # Leave nothing for the exit-time compaction to write into another directory
+    module.data_store._data = None
+
+@pytest.fixture
+def client(server):
+    """A test client logged in as admin"""
+    client = server.app.test_client()
+    token = client.post('/api/auth/login', json={'password': 'VideoProd2020!'}).get_json()['token']
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return client
@@ -0,0 +1,27 @@
+import threading
+import time
+from datetime import datetime
+
+
+def test_flushes_from_two_workers_both_count(server, monkeypatch):
+    load_analytics = server.load_analytics
+
+    def slow_load():
+        analytics = load_analytics()
+        time.sleep(0.05)  # Widen the gap between reading and writing the file
+        return analytics
+
+    monkeypatch.setattr(server, 'load_analytics', slow_load)
+    buffers = [server.AnalyticsBuffer(server.ExactVisitorCounter(server.VISITORS_FOLDER)) for _ in range(2)]
+    now = datetime.now()
+    for buffer in buffers:
+        # What record() buffers, without starting its flush thread
+        server.add_to_bucket(buffer._pending['hourly'], now.strftime('%Y-%m-%dT%H'), {'pageviews': 3})
+
+    threads = [threading.Thread(target=buffer.flush) for buffer in buffers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert load_analytics()['daily'][now.strftime('%Y-%m-%d')]['pageviews'] == 6
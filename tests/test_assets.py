@@ -0,0 +1,54 @@
+import hashlib
+
+import pytest
+
+
+@pytest.fixture
+def assets(server, monkeypatch):
+    """The server with a fresh asset manifest over the test directory"""
+    with open('style.css', 'w') as f:
+        f.write('body { color: red; }\n')
+    with open('page.html', 'w') as f:
+        f.write('<link rel="stylesheet" href="style.css"><script src="/missing.js"></script>\n')
+    with open('sw.js', 'w') as f:
+        f.write('const ASSET_MANIFEST = {};\nself.addEventListener("install", () => {});\n')
+    monkeypatch.setattr(server, 'asset_manifest', server.AssetManifest())
+    monkeypatch.setattr(server, '_page_cache', {})
+    return server
+
+def css_fingerprint():
+    with open('style.css', 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def test_pages_point_at_fingerprinted_assets(assets):
+    body = assets.app.test_client().get('/page.html').get_data(as_text=True)
+    assert f'href="style.css?v={css_fingerprint()}"' in body
+    assert 'src="/missing.js"' in body
+
+def test_current_fingerprint_is_cached_for_good(assets):
+    client = assets.app.test_client()
+    fresh = client.get(f'/style.css?v={css_fingerprint()}')
+    assert fresh.cache_control.immutable and fresh.cache_control.max_age == assets.ASSET_MAX_AGE
+    stale = client.get('/style.css?v=000000000000')
+    assert stale.status_code == 200 and not stale.cache_control.immutable
+    assert stale.cache_control.no_cache
+
+def test_changed_asset_gets_new_fingerprint(assets, monkeypatch):
+    monkeypatch.setattr(assets, 'ASSET_SCAN_INTERVAL', 0)
+    before = assets.asset_manifest.fingerprint('style.css')
+    version = assets.asset_manifest.version
+    with open('style.css', 'a') as f:
+        f.write('p { margin: 0; }\n')
+
+    assert assets.asset_manifest.fingerprint('style.css') == css_fingerprint() != before
+    assert assets.asset_manifest.version != version
+    body = assets.app.test_client().get('/page.html').get_data(as_text=True)
+    assert f'style.css?v={css_fingerprint()}' in body
+
+def test_service_worker_gets_the_manifest(assets):
+    body = assets.app.test_client().get('/sw.js').get_data(as_text=True)
+    manifest = assets.asset_manifest.to_dict()
+    assert manifest['assets']['style.css'] == f'/style.css?v={css_fingerprint()}'
+    assert f'/style.css?v={css_fingerprint()}' in manifest['precache']
+    assert body.startswith('const ASSET_MANIFEST = {"version": "' + manifest['version'])
@@ -0,0 +1,59 @@
+def current_version(client):
+    return client.get('/api/changes').get_json()['version']
+
+def patch(client, *ops):
+    response = client.patch('/api/data', json={'ops': list(ops)})
+    return response.status_code, response.get_json()
+
+
+def test_batch_applies_all_ops(client, server):
+    version = current_version(client)
+    status, body = patch(client,
+                         {'op': 'insert', 'kind': 'location', 'parents': ['v1', 'm1'], 'entity': {'id': 'l3', 'name': 'Tunnel'}},
+                         {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {'name': 'Main Gate'}, 'version': version})
+    assert status == 200
+    assert [result['id'] for result in body['results']] == ['l3', 'l1']
+    assert server.data_store.find('location', 'l3', ('v1', 'm1'))['name'] == 'Tunnel'
+    assert server.data_store.find('location', 'l1')['name'] == 'Main Gate'
+
+def test_stale_version_conflicts_and_applies_nothing(client, server):
+    version = current_version(client)
+    assert patch(client, {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {'name': 'A'}, 'version': version})[0] == 200
+
+    status, body = patch(client,
+                         {'op': 'update', 'kind': 'location', 'id': 'l2', 'fields': {'name': 'B'}, 'version': version},
+                         {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {'name': 'C'}, 'version': version})
+    assert status == 409
+    assert [(c['kind'], c['id']) for c in body['conflicts']] == [('location', 'l1')]
+    assert server.data_store.find('location', 'l1')['name'] == 'A'
+    assert server.data_store.find('location', 'l2')['name'] == 'Press Box'
+
+def test_version_from_response_allows_next_save(client):
+    status, body = patch(client, {'op': 'set', 'key': 'landingPage', 'value': {'cards': []}, 'version': current_version(client)})
+    assert status == 200
+    status, _ = patch(client, {'op': 'set', 'key': 'landingPage', 'value': {'cards': [{'id': 'x'}]}, 'version': body['version']})
+    assert status == 200
+
+def test_reorder_conflicts_with_stale_location_edit(client):
+    version = current_version(client)
+    response = client.patch('/api/venues/v1/maps/m1/locations', json={'order': ['l2', 'l1'], 'renumber': True})
+    assert response.status_code == 200
+
+    status, _ = patch(client, {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {'name': 'X'}, 'version': version})
+    assert status == 409
+
+def test_insert_of_existing_id_conflicts(client, server):
+    status, body = patch(client, {'op': 'insert', 'kind': 'location', 'parents': ['v1', 'm1'],
+                                  'entity': {'id': 'l1', 'name': 'Duplicate'}})
+    assert status == 409
+    assert body['id'] == 'l1'
+    assert server.data_store.find('location', 'l1')['name'] == 'North Gate'
+
+def test_malformed_ops_are_rejected(client):
+    for op in (5,
+               {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': ['name']},
+               {'op': 'update', 'kind': 'location', 'id': ['l1'], 'fields': {}},
+               {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {}, 'version': 3},
+               {'op': 'insert', 'kind': 'map', 'parents': 'v1', 'entity': {}},
+               {'op': 'rename', 'kind': 'location', 'id': 'l1'}):
+        assert patch(client, op)[0] == 400, op
@@ -0,0 +1,75 @@
+import gzip
+import os
+
+import pytest
+
+TEXT = 'console.log("hello");\n' * 200
+
+
+@pytest.fixture
+def static(server, monkeypatch):
+    with open('app.js', 'w') as f:
+        f.write(TEXT)
+    # send_from_directory() resolves '.' against the app root, which is the working directory when deployed
+    monkeypatch.setattr(server.app, 'root_path', os.getcwd())
+    monkeypatch.setattr(server, 'compression_cache', server.CompressionCache(server.COMPRESSION_CACHE_BYTES))
+    monkeypatch.setattr(server, 'asset_manifest', server.AssetManifest())
+    return server
+
+def get(server, path, accept):
+    return server.app.test_client().get(path, headers={'Accept-Encoding': accept})
+
+
+def test_gzip_when_accepted(static):
+    response = get(static, '/app.js', 'gzip, deflate')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.get_data()).decode() == TEXT
+    assert response.get_etag()[0].endswith('-gzip')
+
+def test_identity_when_not_accepted_or_small(static):
+    for accept in ('identity', 'gzip;q=0', ''):
+        response = get(static, '/app.js', accept)
+        assert 'Content-Encoding' not in response.headers, accept
+        assert response.get_data(as_text=True) == TEXT
+    with open('small.js', 'w') as f:
+        f.write('1;')
+    assert 'Content-Encoding' not in get(static, '/small.js', 'gzip').headers
+
+def test_negotiation_prefers_highest_quality(static):
+    with static.app.test_request_context(headers={'Accept-Encoding': 'gzip;q=0.5, br;q=1'}):
+        assert static.negotiate_encoding() == ('br' if static.brotli else 'gzip')
+    with static.app.test_request_context(headers={'Accept-Encoding': 'br;q=0.2, gzip;q=0.8'}):
+        assert static.negotiate_encoding() == 'gzip'
+    with static.app.test_request_context(headers={'Accept-Encoding': 'deflate'}):
+        assert static.negotiate_encoding() is None
+
+def test_fresh_sibling_is_sent_as_is(static):
+    static.write_compressed_siblings('app.js')
+    with open('app.js.gz', 'wb') as f:
+        f.write(gzip.compress(b'precompressed'))
+    assert gzip.decompress(get(static, '/app.js', 'gzip').get_data()) == b'precompressed'
+
+    # An edit newer than the sibling is compressed on the fly instead
+    with open('app.js', 'a') as f:
+        f.write('// edited\n')
+    stat = os.stat('app.js.gz')
+    os.utime('app.js', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert gzip.decompress(get(static, '/app.js', 'gzip').get_data()).decode() == TEXT + '// edited\n'
+
+def test_siblings_follow_available_encodings(static):
+    static.write_compressed_siblings('app.js')
+    assert os.path.exists('app.js.gz')
+    assert os.path.exists('app.js.br') == (static.brotli is not None)
+
+@pytest.mark.skipif('not __import__("server").brotli')
+def test_brotli_when_available(static):
+    response = get(static, '/app.js', 'gzip, br')
+    assert response.headers['Content-Encoding'] == 'br'
+    assert static.brotli.decompress(response.get_data()).decode() == TEXT
+
+def test_compression_cache_is_bounded(server):
+    cache = server.CompressionCache(200)
+    for i in range(10):
+        cache.get(i, 'gzip', lambda: os.urandom(100))
+    assert cache.size <= 200
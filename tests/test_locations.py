@@ -0,0 +1,62 @@
+import pytest
+
+
+def batch(client, body):
+    response = client.patch('/api/venues/v1/maps/m1/locations', json=body)
+    return response.status_code, response.get_json()
+
+def location_ids(server):
+    return [loc['id'] for loc in server.data_store.find('map', 'm1')['locations']]
+
+
+@pytest.mark.parametrize('body', [
+    {'create': {'name': 'Tunnel'}},
+    {'create': [5]},
+    {'update': ['l1']},
+    {'update': [{'name': 'No id'}]},
+    {'update': [{'id': ['l1']}]},
+    {'delete': 'l1'},
+    {'delete': [['l1']]},
+    {'order': [1, 2]},
+    {'order': 'l2'},
+])
+def test_malformed_batch_is_rejected(client, server, body):
+    status, _ = batch(client, body)
+    assert status == 400
+    assert location_ids(server) == ['l1', 'l2']
+
+def test_batch_is_one_change(client, server):
+    client.get('/api/changes')
+    version = server.data_store.version
+    status, body = batch(client, {'create': [{'name': 'Tunnel'}], 'update': [{'id': 'l1', 'name': 'Main Gate'}],
+                                  'delete': ['l2']})
+    assert status == 200
+    new_id = body['created'][0]['id']
+    assert location_ids(server) == ['l1', new_id]
+    assert server.data_store.version == version + 1
+    assert body['deleted'] == ['l2']
+
+def test_batch_reorders_and_renumbers(client, server):
+    status, body = batch(client, {'order': ['l2'], 'renumber': True})
+    assert status == 200
+    assert [(loc['id'], loc['number']) for loc in body['locations']] == [('l2', 1), ('l1', 2)]
+    assert location_ids(server) == ['l2', 'l1']
+
+def test_batch_with_missing_location_changes_nothing(client, server):
+    status, body = batch(client, {'update': [{'id': 'l1', 'name': 'Main Gate'}], 'delete': ['missing']})
+    assert status == 404
+    assert body['id'] == 'missing'
+    assert server.data_store.find('location', 'l1')['name'] == 'North Gate'
+    assert batch(client, {'order': ['l1', 'l1']})[0] == 400
+    assert client.patch('/api/venues/v1/maps/missing/locations', json={}).status_code == 404
+
+def test_new_locations_are_numbered_past_numeric_strings(client, server):
+    server.data_store.update('location', 'l1', {'number': '7'})
+    server.data_store.update('location', 'l2', {'number': 'A'})
+
+    response = client.post('/api/venues/v1/maps/m1/locations', json={'name': 'Tunnel'})
+    assert response.status_code == 201
+    assert response.get_json()['number'] == 8
+    status, body = batch(client, {'create': [{'name': 'Ramp'}, {'name': 'Dock'}]})
+    assert status == 200
+    assert [loc['number'] for loc in body['created']] == [9, 10]
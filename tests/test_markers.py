@@ -0,0 +1,40 @@
+import pytest
+
+
+def test_marker_box_defaults_to_whole_map(server):
+    assert server.parse_marker_box({}) == (0.0, 0.0, 100.0, 100.0)
+
+def test_marker_box_from_bbox_is_normalized(server):
+    assert server.parse_marker_box({'bbox': '60,40,10,5'}) == (10.0, 5.0, 60.0, 40.0)
+
+def test_marker_box_from_tile(server):
+    assert server.parse_marker_box({'tile': '0/0/0'}) == (0.0, 0.0, 100.0, 100.0)
+    assert server.parse_marker_box({'tile': '1/1/0'}) == (50.0, 0.0, 100.0, 50.0)
+
+@pytest.mark.parametrize('args', [
+    {'bbox': '1,2,3'},
+    {'bbox': 'a,b,c,d'},
+    {'bbox': '0,0,inf,100'},
+    {'bbox': 'nan,0,10,10'},
+    {'tile': '1/2/0'},
+    {'tile': '21/0/0'},
+    {'tile': '1/0'},
+])
+def test_invalid_marker_box_raises(server, args):
+    with pytest.raises(ValueError):
+        server.parse_marker_box(args)
+
+def test_markers_endpoint(server):
+    client = server.app.test_client()
+    response = client.get('/api/maps/m1/markers?bbox=0,0,30,30')
+    assert response.status_code == 200
+    assert [marker['id'] for marker in response.get_json()['markers']] == ['l1']
+    assert client.get('/api/maps/m1/markers?bbox=0,0,inf,100').status_code == 400
+    assert client.get('/api/maps/missing/markers').status_code == 404
+
+def test_nearest_markers_rejects_non_finite_points(server):
+    client = server.app.test_client()
+    response = client.get('/api/maps/m1/markers/nearest?x=55&y=45&k=1')
+    assert [marker['id'] for marker in response.get_json()['markers']] == ['l2']
+    assert client.get('/api/maps/m1/markers/nearest?x=nan&y=1').status_code == 400
+    assert client.get('/api/maps/m1/markers/nearest?x=1&y=inf').status_code == 400
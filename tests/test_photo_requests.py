@@ -0,0 +1,100 @@
+import os
+
+
+def test_log_and_server_state_are_not_served(server):
+    server.photo_requests.insert({'id': 'req-1', 'status': 'pending', 'email': 'visitor@example.com'})
+    for name in ('analytics.json', 'jobs.json', '.generated.json', 'data.journal'):
+        with open(name, 'w') as f:
+            f.write('{}')
+    with open('photo-requests.jsonl', 'w') as f:
+        f.write('{}\n')
+
+    client = server.app.test_client()
+    assert os.path.exists(server.PHOTO_REQUESTS_FILE)
+    for path in (server.PHOTO_REQUESTS_FILE, 'photo-requests.jsonl', 'analytics.json', 'jobs.json',
+                 '.generated.json', 'data.journal'):
+        assert client.get('/' + path).status_code == 404, path
+    assert client.get('/data.json').status_code == 200
+
+def test_log_is_moved_out_of_the_app_root(server, tmp_path):
+    line = '{"op":"put","request":{"id":"req-1","status":"pending"}}\n'
+    with open(server.LEGACY_PHOTO_REQUESTS_FILE, 'w') as f:
+        f.write(line)
+
+    store = server.PhotoRequestStore(str(tmp_path / server.PHOTO_REQUESTS_FILE), server.data_store,
+                                     server.LEGACY_PHOTO_REQUESTS_FILE)
+    assert [r['id'] for r in store.all()] == ['req-1']
+    assert not os.path.exists(server.LEGACY_PHOTO_REQUESTS_FILE)
+
+def two_stores(server, tmp_path, monkeypatch):
+    """Two stores on one log, as in two server processes"""
+    monkeypatch.setattr(server, 'DATA_RELOAD_INTERVAL', 0)
+    path = str(tmp_path / server.PHOTO_REQUESTS_FILE)
+    return server.PhotoRequestStore(path, server.data_store), server.PhotoRequestStore(path, server.data_store)
+
+def test_updates_are_replayed_from_the_log(server):
+    server.photo_requests.insert({'id': 'req-1', 'status': 'pending', 'venueId': 'v1'})
+    server.photo_requests.insert({'id': 'req-2', 'status': 'pending', 'venueId': 'v2'})
+    server.photo_requests.update('req-1', {'status': 'sent'})
+
+    store = server.PhotoRequestStore(server.PHOTO_REQUESTS_FILE, server.data_store)
+    assert store.find('req-1')['status'] == 'sent'
+    assert store.query('pending')[0] == 1
+    assert [r['id'] for r in store.query(filters={'venueId': 'v1'})[1]] == ['req-1']
+    assert store.update('missing', {'status': 'sent'}) is None
+
+def test_stores_see_each_others_writes(server, tmp_path, monkeypatch):
+    first, second = two_stores(server, tmp_path, monkeypatch)
+    first.insert({'id': 'req-1', 'status': 'pending'})
+    second.insert({'id': 'req-2', 'status': 'pending'})
+    first.update('req-2', {'status': 'sent'})
+
+    assert [r['id'] for r in first.all()] == ['req-1', 'req-2']
+    assert second.find('req-2')['status'] == 'sent'
+    assert second.query('pending')[0] == 1
+
+def test_compaction_keeps_other_stores_appends(server, tmp_path, monkeypatch):
+    first, second = two_stores(server, tmp_path, monkeypatch)
+    first.insert({'id': 'req-1', 'status': 'pending'})
+    second.insert({'id': 'req-2', 'status': 'pending'})
+    first.compact()
+    second.insert({'id': 'req-3', 'status': 'pending'})
+
+    for store in (first, second, server.PhotoRequestStore(first.path, server.data_store)):
+        assert [r['id'] for r in store.all()] == ['req-1', 'req-2', 'req-3']
+
+def test_torn_final_line_is_dropped(server, tmp_path):
+    path = str(tmp_path / 'requests.jsonl')
+    with open(path, 'w') as f:
+        f.write('{"op":"put","request":{"id":"req-1","status":"pending"}}\n{"op":"put","req')
+
+    store = server.PhotoRequestStore(path, server.data_store)
+    store.insert({'id': 'req-2', 'status': 'pending'})
+    assert [r['id'] for r in server.PhotoRequestStore(path, server.data_store).all()] == ['req-1', 'req-2']
+
+def test_requests_endpoint_lists_and_dismisses(client, server):
+    created = client.post('/api/photo-requests', data={'locationId': 'l1', 'venueId': 'v1', 'mapId': 'm1'})
+    assert created.status_code == 201
+    request_id = created.get_json()['request']['id']
+
+    listed = client.get('/api/photo-requests?venueId=v1')
+    assert [r['id'] for r in listed.get_json()['requests']] == [request_id]
+    assert client.get('/api/photo-requests', headers={'If-None-Match': listed.headers['ETag']}).status_code == 304
+
+    assert client.delete(f'/api/photo-requests/{request_id}').status_code == 200
+    assert client.delete(f'/api/photo-requests/{request_id}').status_code == 409
+    assert client.get('/api/photo-requests').get_json()['total'] == 0
+    assert client.get('/api/photo-requests?status=dismissed').get_json()['total'] == 1
+    assert client.get('/api/photo-requests?status=lost').status_code == 400
+
+def test_compaction_drops_old_resolved_requests(server):
+    old = '2020-01-01T00:00:00'
+    server.photo_requests.insert({'id': 'req-1', 'status': 'pending', 'requestedAt': old})
+    server.photo_requests.insert({'id': 'req-2', 'status': 'dismissed', 'requestedAt': old, 'resolvedAt': old})
+    server.photo_requests.update('req-1', {'venueId': 'v1'})
+    server.photo_requests.compact()
+
+    with open(server.PHOTO_REQUESTS_FILE) as f:
+        assert len(f.readlines()) == 1
+    store = server.PhotoRequestStore(server.PHOTO_REQUESTS_FILE, server.data_store)
+    assert [(r['id'], r['venueId']) for r in store.all()] == [('req-1', 'v1')]
@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'sessions.sqlite3')
+
+def test_sessions_are_shared_between_workers(server, store_path):
+    first, second = server.SqliteSessionStore(store_path), server.SqliteSessionStore(store_path)
+    token = first.create()
+    assert second.check(token) == 'valid'
+    assert second.check('not-a-token') is None
+    assert second.check('') is None
+
+    second.revoke(token)
+    assert first.check(token) is None
+
+def test_only_token_digests_are_stored(server, store_path):
+    token = server.SqliteSessionStore(store_path).create()
+    keys = [key for (key,) in sqlite3.connect(store_path).execute('SELECT key FROM sessions')]
+    assert keys == [server.SessionStore._key(token)] and token not in keys
+
+def test_expired_sessions_are_refused_then_swept(server, store_path, monkeypatch):
+    store = server.SqliteSessionStore(store_path)
+    lifetime = server.SESSION_LIFETIME
+    monkeypatch.setattr(server, 'SESSION_LIFETIME', -1)
+    expired = store.create()
+    monkeypatch.setattr(server, 'SESSION_LIFETIME', lifetime)
+    valid = store.create()
+
+    assert store.check(expired) == 'expired'
+    assert store.sweep() == 1
+    assert store.check(expired) is None
+    assert store.check(valid) == 'valid'
+
+def test_each_thread_gets_its_own_connection(server, store_path):
+    store = server.SqliteSessionStore(store_path)
+    token = store.create()
+    results = []
+    thread = threading.Thread(target=lambda: results.append((store.check(token), store._db())))
+    thread.start()
+    thread.join()
+    assert results[0][0] == 'valid'
+    assert results[0][1] is not store._db()
+
+def test_login_through_sqlite_store(server, store_path, monkeypatch):
+    monkeypatch.setattr(server, 'sessions', server.SqliteSessionStore(store_path))
+    client = server.app.test_client()
+    token = client.post('/api/auth/login', json={'password': 'VideoProd2020!'}).get_json()['token']
+
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/api/changes', headers=headers).status_code == 200
+    assert server.SqliteSessionStore(store_path).check(token) == 'valid'
+    assert client.get('/api/changes', headers={'Authorization': 'Bearer nope'}).status_code == 401
@@ -0,0 +1,101 @@
+import json
+import os
+import stat
+
+
+def open_store(server, tmp_path):
+    return server.DataStore(server.JsonStorage(str(tmp_path / 'data.json'), str(tmp_path / 'data.journal')))
+
+def category_ids(store):
+    return [c['id'] for c in store.get()['categories']]
+
+
+def test_journal_is_replayed_on_load(server, tmp_path):
+    store = open_store(server, tmp_path)
+    store.insert('category', {'id': 'c1', 'name': 'One'})
+    store.update('location', 'l1', {'name': 'Main Gate'})
+    store.delete('location', 'l2')
+
+    # data.json itself is untouched until compaction
+    assert json.load(open(tmp_path / 'data.json'))['categories'] == []
+    reopened = open_store(server, tmp_path)
+    assert category_ids(reopened) == ['c1']
+    assert reopened.find('location', 'l1')['name'] == 'Main Gate'
+    assert reopened.find('location', 'l2') is None
+
+def test_compaction_folds_journal_into_snapshot(server, tmp_path):
+    store = open_store(server, tmp_path)
+    store.insert('category', {'id': 'c1'})
+    store.storage.compact(store)
+
+    assert not (tmp_path / 'data.journal').exists()
+    assert [c['id'] for c in json.load(open(tmp_path / 'data.json'))['categories']] == ['c1']
+    store.insert('category', {'id': 'c2'})
+    assert category_ids(open_store(server, tmp_path)) == ['c1', 'c2']
+
+def test_compaction_keeps_records_appended_by_another_process(server, tmp_path):
+    store = open_store(server, tmp_path)
+    store.insert('category', {'id': 'c1'})
+    other = open_store(server, tmp_path)
+    other.insert('category', {'id': 'c2'})
+
+    store.storage.compact(store)
+    assert category_ids(open_store(server, tmp_path)) == ['c1', 'c2']
+    # The compacting store hadn't seen c2 yet and picks it up from the kept tail
+    assert store.storage.changed()
+
+def test_torn_record_is_dropped_and_next_append_survives(server, tmp_path):
+    store = open_store(server, tmp_path)
+    store.insert('category', {'id': 'c1'})
+    with open(tmp_path / 'data.journal', 'ab') as f:
+        f.write(b'{"op":"insert","kind":"category","ent')
+
+    reopened = open_store(server, tmp_path)
+    assert category_ids(reopened) == ['c1']
+    reopened.insert('category', {'id': 'c2'})
+    assert category_ids(open_store(server, tmp_path)) == ['c1', 'c2']
+
+def test_mutation_applies_on_top_of_another_process_writes(server, tmp_path):
+    store = open_store(server, tmp_path)
+    other = open_store(server, tmp_path)
+    store.get()
+    other.insert('category', {'id': 'c1'})
+
+    store.insert('category', {'id': 'c2'})
+    assert category_ids(store) == ['c1', 'c2']
+    assert category_ids(open_store(server, tmp_path)) == ['c1', 'c2']
+
+def test_batch_is_one_record_and_one_version(server, tmp_path):
+    store = open_store(server, tmp_path)
+    store.get()
+    version = store.version
+    store.batch([{'op': 'insert', 'kind': 'category', 'entity': {'id': 'c1'}},
+                 {'op': 'update', 'kind': 'location', 'id': 'l1', 'fields': {'name': 'Main Gate'}},
+                 {'op': 'delete', 'kind': 'location', 'id': 'l2'}])
+
+    assert store.version == version + 1
+    assert len(open(tmp_path / 'data.journal').readlines()) == 1
+    reopened = open_store(server, tmp_path)
+    assert category_ids(reopened) == ['c1']
+    assert reopened.find('location', 'l1')['name'] == 'Main Gate'
+    assert reopened.find('location', 'l2') is None
+
+def test_batch_in_sqlite(server, tmp_path):
+    path = str(tmp_path / 'data.sqlite3')
+    store = server.DataStore(server.SqliteStorage(path, str(tmp_path / 'data.json')))
+    store.batch([{'op': 'delete', 'kind': 'location', 'id': 'l1'},
+                 {'op': 'insert', 'kind': 'location', 'parents': ['v1', 'm1'], 'entity': {'id': 'l3'}},
+                 {'op': 'update', 'kind': 'location', 'id': 'l2', 'fields': {'name': 'Booth'}}])
+
+    reopened = server.DataStore(server.SqliteStorage(path))
+    assert [loc['id'] for loc in reopened.find('map', 'm1')['locations']] == ['l2', 'l3']
+    assert reopened.find('location', 'l2')['name'] == 'Booth'
+
+def test_atomic_writes_keep_file_mode(server, tmp_path):
+    path = str(tmp_path / 'page.html')
+    server.write_text_atomic(path, 'new')
+    assert stat.S_IMODE(os.stat(path).st_mode) == server.NEW_FILE_MODE
+
+    os.chmod(path, 0o640)
+    server.write_text_atomic(path, 'newer')
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
@@ -0,0 +1,133 @@
+import os
+from html.parser import HTMLParser
+
+import pytest
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+VENUES = [{
+    'id': 'v1', 'name': 'Stadium',
+    'maps': [
+        {'id': 'm1', 'label': 'Field Level', 'image': 'uploads/maps/field.png', 'locations': [
+            {'id': 'l1', 'number': 1, 'name': 'North <Gate>', 'description': 'By the "ramp"',
+             'fiber': 'F1', 'image': 'uploads/l1.jpg', 'position': {'top': '10%', 'left': '20%'}},
+            {'id': 'l2', 'number': 2, 'name': 'Press Box'},
+        ]},
+        {'id': 'm2', 'label': 'Concourse', 'image': 'uploads/maps/concourse.png', 'locations': []},
+    ],
+}, {'id': 'v2', 'name': 'Arena', 'maps': []}]
+
+
+def old_venues_html(venues, html_escape):
+    """generate_venues_html as it was before the template engine"""
+    html_parts = []
+    for venue in venues:
+        venue_html = f'''
+        <section class="venue" id="{venue['id']}">
+            <h2 class="venue-title">{venue['name']}</h2>
+            <div class="map-tabs">
+        '''
+        for i, m in enumerate(venue.get('maps', [])):
+            active = 'active' if i == 0 else ''
+            venue_html += f'''
+                <button class="map-tab {active}" data-map="{m['id']}">{m['label']}</button>
+            '''
+        venue_html += '</div><div class="maps-container">'
+        for i, m in enumerate(venue.get('maps', [])):
+            active = 'active' if i == 0 else ''
+            venue_html += f'''
+            <div class="map-panel {active}" id="{m['id']}">
+                <div class="map-container">
+                    <img src="{m['image']}" alt="{m['label']}" class="map-image">
+            '''
+            for loc in m.get('locations', []):
+                pos = loc.get('position', {})
+                venue_html += f'''
+                    <div class="location-marker" style="top: {pos.get('top', '0%')}; left: {pos.get('left', '0%')};"
+                         data-location-id="{loc['id']}"
+                         data-venue-id="{venue['id']}"
+                         data-map-id="{m['id']}"
+                         data-name="{html_escape(loc.get('name', ''))}"
+                         data-description="{html_escape(loc.get('description', ''))}"
+                         data-fiber="{html_escape(loc.get('fiber', ''))}"
+                         data-image="{loc.get('image', '')}"
+                         data-number="{loc.get('number', '')}"
+                         data-venue-name="{html_escape(venue.get('name', ''))}"
+                         data-map-label="{html_escape(m.get('label', ''))}">
+                        <span class="marker-number">{loc.get('number', '')}</span>
+                    </div>
+                '''
+            venue_html += '''
+                </div>
+            </div>
+            '''
+        venue_html += '</div></section>'
+        html_parts.append(venue_html)
+    return '\n'.join(html_parts)
+
+class Markup(HTMLParser):
+    """Tags, attributes and text of a page, ignoring whitespace"""
+
+    # Added since the template engine, for image derivatives
+    NEW_ATTRIBUTES = {'data-image-medium', 'data-thumb'}
+
+    def __init__(self, html):
+        super().__init__()
+        self.items = []
+        self.feed(html)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {name: ' '.join((value or '').split()) for name, value in attrs if name not in self.NEW_ATTRIBUTES}
+        self.items.append(('start', tag, sorted(attrs.items())))
+
+    def handle_endtag(self, tag):
+        self.items.append(('end', tag))
+
+    def handle_data(self, data):
+        if data.strip():
+            self.items.append(('text', data.strip()))
+
+
+@pytest.fixture
+def templates(server, monkeypatch):
+    monkeypatch.setattr(server, 'TEMPLATE_FOLDER', TEMPLATES)
+    return server
+
+def test_venues_page_matches_old_output(templates):
+    new = templates.generate_venues_html(VENUES)
+    assert Markup(new).items == Markup(old_venues_html(VENUES, templates.html_escape)).items
+
+def test_category_page_matches_old_placeholder_replacement(templates):
+    with open(os.path.join(TEMPLATES, 'map-template.html')) as f:
+        source = f.read()
+    content = '<section class="venue" id="v1"></section>'
+    old = source.replace('{{ CATEGORY_NAME }}', 'Track & Field').replace('{{ VENUES_CONTENT|safe }}', content)
+    new = templates.get_template('map-template.html').render(CATEGORY_NAME='Track & Field', VENUES_CONTENT=content)
+    assert new == old.replace('Track & Field', 'Track &amp; Field')
+
+def test_values_are_escaped_unless_safe(server):
+    template = server.Template('{{ a }}|{{ a|safe }}|{{ missing|default:none }}|{{ b.c }}')
+    assert template.render(a='<b>', b={'c': 3}) == '&lt;b&gt;|<b>|none|3'
+
+def test_loops_and_conditions(server):
+    template = server.Template(
+        '<ul>\n'
+        '  {% for item in items %}\n'
+        '  <li{% if loop.first %} class="first"{% endif %}>{{ loop.index }}. {{ item }}</li>\n'
+        '  {% endfor %}\n'
+        '</ul>\n'
+        '{% if not items %}\nnone\n{% else %}\nsome\n{% endif %}\n')
+    assert template.render(items=['a', 'b']) == '<ul>\n  <li class="first">1. a</li>\n  <li>2. b</li>\n</ul>\nsome\n'
+    assert template.render(items=[]) == '<ul>\n</ul>\nnone\n'
+
+@pytest.mark.parametrize('source', [
+    '{% for x %}{% endfor %}',
+    '{% if a %}',
+    '{% endif %}',
+    '{% else %}',
+    '{% while a %}',
+    '{{ a|upper }}',
+])
+def test_invalid_templates_are_rejected(server, source):
+    with pytest.raises(server.TemplateSyntaxError):
+        server.Template(source)
@@ -0,0 +1,97 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), (200, 30, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def start(client, data, filename='photo.png'):
+    response = client.post('/api/upload/resumable', json={'filename': filename, 'size': len(data), 'kind': 'image'})
+    assert response.status_code == 201
+    return response.get_json()['uploadId']
+
+def put(client, upload_id, offset, chunk):
+    return client.put(f'/api/upload/resumable/{upload_id}?offset={offset}', data=chunk)
+
+
+def test_resumable_upload_in_chunks(client, server):
+    data = png_bytes()
+    upload_id = start(client, data)
+    half = len(data) // 2
+
+    assert put(client, upload_id, 0, data[:half]).get_json()['received'] == half
+    # A client that lost track asks how far it got, then resumes from there
+    assert client.get(f'/api/upload/resumable/{upload_id}').get_json()['received'] == half
+    assert put(client, upload_id, half, data[half:]).status_code == 200
+
+    response = client.post(f'/api/upload/resumable/{upload_id}/finalize')
+    assert response.status_code == 200
+    path = response.get_json()['filename']
+    assert path.startswith(server.BLOB_FOLDER) and path.endswith('.png')
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert client.get(f'/api/upload/resumable/{upload_id}').status_code == 404
+
+def test_chunk_at_wrong_offset_conflicts(client):
+    data = png_bytes()
+    upload_id = start(client, data)
+    put(client, upload_id, 0, data[:10])
+
+    response = put(client, upload_id, 5, data[5:20])
+    assert response.status_code == 409
+    assert response.get_json()['received'] == 10
+
+def test_chunk_past_declared_size_is_refused(client):
+    data = png_bytes()
+    upload_id = start(client, data)
+
+    assert put(client, upload_id, 0, data + b'extra').status_code == 400
+    assert client.get(f'/api/upload/resumable/{upload_id}').get_json()['received'] == 0
+
+def test_incomplete_upload_cannot_be_finalized(client):
+    data = png_bytes()
+    upload_id = start(client, data)
+    put(client, upload_id, 0, data[:10])
+
+    assert client.post(f'/api/upload/resumable/{upload_id}/finalize').status_code == 409
+
+def test_non_image_is_rejected_on_finalize(client, server):
+    data = b'GIF90a not really an image'
+    upload_id = start(client, data, 'fake.gif')
+    put(client, upload_id, 0, data)
+
+    assert client.post(f'/api/upload/resumable/{upload_id}/finalize').status_code == 400
+    assert os.listdir(server.PARTIAL_UPLOAD_FOLDER) == []
+
+def test_cancel_discards_partial_upload(client, server):
+    upload_id = start(client, png_bytes())
+
+    assert client.delete(f'/api/upload/resumable/{upload_id}').status_code == 200
+    assert os.listdir(server.PARTIAL_UPLOAD_FOLDER) == []
+
+def test_type_is_sniffed_from_whole_header_despite_short_reads(server):
+    class Trickle(io.RawIOBase):
+        def __init__(self, data):
+            self.data = data
+
+        def read(self, size=-1):
+            chunk, self.data = self.data[:3], self.data[3:]
+            return chunk
+
+    webp = b'RIFF\x24\x00\x00\x00WEBPVP8 ' + bytes(32)
+    assert server.store_stream(Trickle(webp), 1024).endswith('.webp')
+
+def test_image_is_saved_through_a_private_temp_file(server):
+    os.makedirs('variants')
+    path = os.path.join('variants', 'medium.webp')
+    server.save_image_atomic(Image.new('RGB', (8, 8)), path, 'webp')
+    assert Image.open(path).size == (8, 8)
+
+    with pytest.raises(KeyError):
+        server.save_image_atomic(Image.new('RGB', (8, 8)), path, 'nonsense')
+    assert os.listdir('variants') == ['medium.webp']
@@ -0,0 +1,53 @@
+import pytest
+
+DAY = '2026-01-02'
+
+
+@pytest.fixture(params=['exact', 'hll'])
+def counter_class(server, request):
+    return server.VISITOR_COUNTERS[request.param]
+
+def test_counts_unique_visitors(counter_class, tmp_path):
+    counter = counter_class(str(tmp_path))
+    for session_id in ('a', 'b', 'a', 'c', 'b'):
+        counter.add(DAY, session_id)
+    counter.sync({DAY})
+    assert counter.count(DAY) == 3
+
+def test_counts_merge_across_workers_and_restarts(counter_class, tmp_path):
+    first, second = counter_class(str(tmp_path)), counter_class(str(tmp_path))
+    for session_id in ('a', 'b', 'c'):
+        first.add(DAY, session_id)
+    for session_id in ('c', 'd'):
+        second.add(DAY, session_id)
+    first.sync({DAY})
+    second.sync({DAY})
+    first.sync({DAY})
+
+    assert first.count(DAY) == second.count(DAY) == 4
+    assert counter_class(str(tmp_path)).count(DAY) == 4
+    assert counter_class(str(tmp_path)).count('2026-01-03') == 0
+
+def test_hyperloglog_estimate_is_close(server, tmp_path):
+    counter = server.HyperLogLogVisitorCounter(str(tmp_path))
+    for i in range(20000):
+        counter.add(DAY, f'session-{i}')
+    counter.sync({DAY})
+    # Standard error is 1.04 / sqrt(4096), about 1.6%
+    assert abs(counter.count(DAY) - 20000) < 20000 * 0.05
+    assert (tmp_path / f'{DAY}.hll').stat().st_size == counter.REGISTERS
+
+def test_exact_counter_keeps_only_digests(server, tmp_path):
+    counter = server.ExactVisitorCounter(str(tmp_path))
+    counter.add(DAY, 'secret-session-token')
+    counter.sync({DAY})
+    data = (tmp_path / f'{DAY}.ids').read_bytes()
+    assert len(data) == 8 and b'secret' not in data
+
+def test_counter_must_implement_every_method(server):
+    class Partial(server.VisitorCounter):
+        def add(self, day, session_id):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial('visitors')